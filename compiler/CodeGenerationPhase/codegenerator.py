@@ -1,83 +1,166 @@
+import re
+from instrumentation import span
+from SyntacticPhase.ast_nodes import Program, Assign, Literal, Name
 from .optimization import optimize
-def process_ast(ast):
-    layers = []
-    assert ast[0] == 'Program'
-    for module_ast in ast[1:]:
-        layer = {}
-        # Extract module name and type
-        module_name = module_ast[0]
-        # Extract module type and index
-        import re
-        match = re.match(r'([a-zA-Z][a-zA-Z0-9]*?)(\d+)$', module_name)
-        if match:
-            module_type = match.group(1)
-            module_index = match.group(2)
-        else:
-            module_type = module_name  # Use full name if no index
-            module_index = ''
-        layer['type'] = module_type.lower()  # Normalize to lowercase
-        layer['name'] = f'{module_type}{module_index}'
-        assignments = {}
-        for assignment_ast in module_ast[1:]:
-            # Extract variable name
-            assert assignment_ast[0] == 'A'
-            var_name_token = assignment_ast[1][0]
-            var_name = var_name_token[len('<IDENTIFIER, '):-1]
-            if not isinstance(var_name, str):
-                return None
+from .shapes import ShapeError, UnknownShapeError, infer_shapes, format_shape
+from .fusion import find_fusions, inplace_activations
 
-            # Extract and process the value
-            value_ast = assignment_ast[3]
-            if value_ast[0] == '<EXPRESSION>':
-                # Process an expression recursively
-                value = parse_expression(value_ast[1:])
-            else:
-                return None
-            assignments[var_name] = value
+# Parameters of the layers that can be defined in the code module
+CODE_PARAMS = ['dim_in', 'dim_out', 'in_channels', 'out_channels', 'kernel_size', 'num_features', 'stride', 'padding', 'start_dim', 'end_dim', 'p', 'inplace']
 
-        layer['assignments'] = assignments
+def process_ast(ast):
+    layers = []
+    assert isinstance(ast, Program)
+    for module_ast in ast.modules:
+        layer = process_module(module_ast)
+        # Control flow is not supported in modules
+        if layer is None:
+            return None
         layers.append(layer)
     return layers
 
-def parse_expression(expression_tokens):
+def process_module(module_ast):
+    """Returns the layer of a module as a dict of its type, name and assignments or None if it contains control flow."""
+    layer = {}
+    # Extract module name and type
+    module_name = module_ast.name
+    # Extract module type and index
+    match = re.match(r'([a-zA-Z][a-zA-Z0-9]*?)(\d+)$', module_name)
+    if match:
+        module_type = match.group(1)
+        module_index = match.group(2)
+    else:
+        module_type = module_name  # Use full name if no index
+        module_index = ''
+    layer['type'] = module_type.lower()  # Normalize to lowercase
+    layer['name'] = f'{module_type}{module_index}'
+    assignments = {}
+    for assignment_ast in module_ast.body:
+        # Control flow is not supported in modules
+        if not isinstance(assignment_ast, Assign):
+            return None
+        # Process the expression
+        assignments[assignment_ast.target] = parse_expression(assignment_ast.value)
+
+    layer['assignments'] = assignments
+    return layer
+
+def parse_expression(expression):
     """
-    Recursively parse the tokens in an expression and reconstruct as a Python string.
+    Reconstruct an expression as a Python string.
     """
     result = []
-    for token in expression_tokens:
-        if token.startswith('<FLOAT, '):
-            result.append(token[len('<FLOAT, '):-1])
-        elif token.startswith('<INTEGER, '):
-            result.append(token[len('<INTEGER, '):-1])
-        elif token.startswith('<LITERAL_STRING, "'):
-            value = token[len('<LITERAL_STRING, "'):-2]
-            result.append(f'"{value}"')  # Keep quotes around string literals
-        elif token.startswith('<IDENTIFIER, '):
-            result.append(token[len('<IDENTIFIER, '):-1])
-        elif token.startswith('<OP_'):
-            # Extract operator symbols (e.g., *, +, -)
-            operator = token.split(', ')[1][:-1]
-            result.append(operator)
+    for part in expression.parts:
+        if isinstance(part, str):
+            # Operator symbols (e.g., *, +, -)
+            result.append(part)
+        elif isinstance(part, Literal):
+            # Literals are kept as written, strings with their quotes
+            result.append(part.text)
+        elif isinstance(part, Name):
+            result.append(part.id)
         else:
-            # Handle unexpected token types gracefully
-            # raise ValueError(f"Unexpected token: {token}")
+            # Lists are not supported as parameter values
             return None
 
     # Join tokens to construct the Python expression
     return ' '.join(result)
 
-def generate_code(ast):
+def generate_code(ast, input_shape=None, fuse=False, inplace=False, sequential=False):
+    """
+    Generates the PyTorch code of a network.
+
+    If the shape of the input is known, either from input_shape or from an
+    input module, it is propagated through the layers: parameters that only
+    depend on the input shape (dim_in, in_channels and num_features) can be
+    omitted and the shapes of the layers are checked at compile time.
+
+    If fuse is set, the code is generated for inference: batchnorms that follow
+    a conv2d or linear layer are folded into its weights by the fuse method of
+    the network, which has to be called after the weights were loaded. Until
+    then the network runs all layers, so it can still be trained. The network
+    keeps the layers of the unfused network, so it loads the same state dicts.
+
+    If sequential is set, the network is a subclass of nn.Sequential, whose
+    forward pass calls the layers without looking them up by name. The names of
+    the layers and the state dict are the same. If a name is used by several
+    layers the network cannot be an nn.Sequential, instead its forward method is
+    annotated with types for TorchScript.
+
+    Args:
+        ast: The AST of the program.
+        input_shape: Shape of a single input without the batch dimension, e.g. (3, 224, 224).
+        fuse: Generate the fused inference network, implies inplace.
+        inplace: Run ReLUs in place if their input is not used afterwards (see inplace_activations).
+        sequential: Generate an nn.Sequential.
+
+    Returns:
+        The code as a string or None if the program is invalid.
+    """
+    with span("generate_code", "codegen") as args:
+        code = emit_code(ast, input_shape, fuse, inplace, sequential)
+        if args is not None:
+            args["modules"] = len(ast.modules)
+            args["lines"] = code.count("\n") if code is not None else 0
+    return code
+
+def emit_code(ast, input_shape, fuse, inplace, sequential):
+    """The body of generate_code."""
     layers = process_ast(ast)
     if layers is None:
         return None
+    return emit_layers(layers, input_shape, fuse, inplace, sequential)
+
+def emit_layers(layers, input_shape=None, fuse=False, inplace=False, sequential=False, optimize_code=None):
+    """
+    Generates the code of the layers returned by process_ast, see generate_code.
+
+    optimize_code: Function that returns the optimized assignments of the code
+    module, by default they are optimized by optimize.
+    """
+    try:
+        shapes = infer_shapes(layers, input_shape)
+    except UnknownShapeError as error:
+        # The code is generated without shapes
+        print(f"Warning: the shapes are not known, {error}")
+        shapes = None
+    except ShapeError as error:
+        print(f"Shape error in layer {error}")
+        return None
+    # The shape of every layer by its index in modules, code and input modules do not have one
+    modules = [layer for layer in layers if layer['type'] not in ('code', 'input')]
+    layer_shapes = shapes if shapes is not None else [None] * len(modules)
+    # Maps the fused batchnorms to the layer they are folded into
+    fusions = {}
+    if fuse:
+        fusions = find_fusions(modules, layer_shapes)
+    inplace_layers = set()
+    if fuse or inplace:
+        inplace_layers = inplace_activations(modules, fusions)
+    names = [layer['name'] for layer in modules]
+    unique_names = len(set(names)) == len(names)
+    annotate = sequential and not unique_names
+    sequential = sequential and unique_names
+
     code_lines = []
     code_lines.append('import torch')
     code_lines.append('import torch.nn as nn')
+    if sequential:
+        code_lines.append('from collections import OrderedDict')
+    if fusions:
+        functions = sorted({function for _, function in fusions.values()})
+        code_lines.append(f'from torch.nn.utils.fusion import {", ".join(functions)}')
     code_lines.append('')
-    code_lines.append('class Network(nn.Module):')
-    code_lines.append('    def __init__(self):')
-    code_lines.append('        super(Network, self).__init__()')
-    code_lines.append('        # Define layers')
+    if sequential:
+        # The layers are passed to the constructor of nn.Sequential after the code module
+        code_lines.append('class Network(nn.Sequential):')
+        code_lines.append('    def __init__(self):')
+    else:
+        code_lines.append('class Network(nn.Module):')
+        code_lines.append('    def __init__(self):')
+        code_lines.append('        super(Network, self).__init__()')
+        code_lines.append('        # Define layers')
+    sequential_lines = []
 
     # Mapping from module types to PyTorch classes
     module_mapping = {
@@ -92,6 +175,7 @@ def generate_code(ast):
         'tanh': 'nn.Tanh',
         'sigmoid': 'nn.Sigmoid',
         'code': '*',
+        'input': '*',
         # Add more mappings here
     }
     # Parameters required for each module type
@@ -121,6 +205,7 @@ def generate_code(ast):
     }
 
     global_params = {}
+    index = 0 # index of the layer in modules
 
     for layer in layers:
         module_type = layer['type']
@@ -131,12 +216,22 @@ def generate_code(ast):
 
         assignments = layer['assignments']
         if (module_type == 'code'):
-            global_params = assignments
-            global_params = optimize(global_params, ['dim_in', 'dim_out', 'in_channels', 'out_channels', 'kernel_size', 'num_features', 'stride', 'padding', 'start_dim', 'end_dim', 'p', 'inplace']
-)
+            if optimize_code is not None:
+                global_params = optimize_code(assignments)
+            else:
+                global_params = optimize(assignments, CODE_PARAMS)
             for key, item in global_params.items():
                 code_lines.append(f'        {key} = {item}')
             continue
+        if module_type == 'input':
+            # The input module only declares the shape of the input
+            continue
+        shape = layer_shapes[index]
+        index += 1
+        # Parameters computed from the input shape
+        if shape is not None:
+            for param, value in shape.inferred.items():
+                assignments = {**assignments, param: str(value)}
         params = []
         required_params = module_params.get(module_type, [])
 
@@ -161,15 +256,66 @@ def generate_code(ast):
                 value = assignments.get(param)
                 if value:
                     params.append(f'{param}={value}')
+        if layer['name'] in inplace_layers:
+            params.append('inplace=True')
 
         param_str = ', '.join(params)
-        code_lines.append(f'        self.{layer["name"]} = {module_class}({param_str})')
+        if sequential:
+            line = f'            (\'{layer["name"]}\', {module_class}({param_str})),'
+            if shape is not None:
+                line += f' # {format_shape(shape.output_shape)}'
+            sequential_lines.append(line)
+        else:
+            code_lines.append(f'        self.{layer["name"]} = {module_class}({param_str})')
+
+    if sequential:
+        code_lines.append('        # Define layers')
+        code_lines.append('        super(Network, self).__init__(OrderedDict([')
+        code_lines.extend(sequential_lines)
+        code_lines.append('        ]))')
+    if fusions:
+        code_lines.append('        self.fused = False')
+        code_lines.append('')
+        code_lines.append('    def fuse(self):')
+        code_lines.append('        # Fold the batchnorms into the weights of the previous layers, afterwards the network is only valid in inference mode')
+        code_lines.append('        self.eval()')
+        for name, (target, function) in fusions.items():
+            code_lines.append(f'        self.{target} = {function}(self.{target}, self.{name})')
+            code_lines.append(f'        del self.{name}')
+        code_lines.append('        self.fused = True')
+        code_lines.append('        return self')
+
+    if sequential:
+        # nn.Sequential only calls the layers that exist, i.e. the batchnorms until fuse deletes them
+        code_lines.append('')
+        return '\n'.join(code_lines)
 
     code_lines.append('')
-    code_lines.append('    def forward(self, x):')
-    for layer in layers:
-        if layer['type'] != 'code':
-            code_lines.append(f'        x = self.{layer["name"]}(x)')
-    code_lines.append('        return x')
+    if annotate:
+        code_lines.append('    def forward(self, x: torch.Tensor) -> torch.Tensor:')
+    else:
+        code_lines.append('    def forward(self, x):')
+    if fusions:
+        # Until fuse is called the network runs all layers, e.g. for training
+        code_lines.append('        if not self.fused:')
+        code_lines.extend('    ' + line for line in forward_lines(modules, layer_shapes))
+    code_lines.extend(forward_lines(modules, layer_shapes, fusions))
     code_lines.append('')
-    return '\n'.join(code_lines)
\ No newline at end of file
+    return '\n'.join(code_lines)
+
+def forward_lines(modules, layer_shapes, fusions=None):
+    """The body of the forward method, the layers of fused batchnorms are not called."""
+    fusions = fusions or {}
+    lines = []
+    for layer, shape in zip(modules, layer_shapes):
+        if layer['name'] in fusions:
+            continue
+        comments = [f'fused with {name}' for name, (target, _) in fusions.items() if target == layer['name']]
+        if shape is not None:
+            comments.append(format_shape(shape.output_shape))
+        if comments:
+            lines.append(f'        x = self.{layer["name"]}(x) # {", ".join(comments)}')
+        else:
+            lines.append(f'        x = self.{layer["name"]}(x)')
+    lines.append('        return x')
+    return lines
\ No newline at end of file
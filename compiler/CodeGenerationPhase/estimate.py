@@ -0,0 +1,119 @@
+from collections import namedtuple
+from .shapes import ShapeError, infer_shapes, elements, format_shape
+
+# Static cost of a layer for a whole batch. macs counts multiply-accumulates of the
+# linear and convolutional layers, flops counts a multiply-accumulate as 2 operations
+# plus the elementwise operations of the other layers. activation_bytes is the size of
+# the output of the layer.
+LayerCost = namedtuple("LayerCost", ["name", "type", "output_shape", "params", "macs", "flops", "activation_bytes"])
+
+# Total cost of a network. peak_activation_bytes is the largest amount of activation
+# memory alive at once: the input and the output of a layer during its forward pass.
+NetworkCost = namedtuple("NetworkCost", ["layers", "params", "macs", "flops", "peak_activation_bytes", "batch_size"])
+
+def linear_cost(layer):
+    dim_in, dim_out = layer.params["dim_in"], layer.params["dim_out"]
+    macs = elements(layer.output_shape) * dim_in
+    # weights and bias
+    return dim_in * dim_out + dim_out, macs, 2 * macs
+
+def conv2d_cost(layer):
+    in_channels, kernel_size = layer.params["in_channels"], layer.params["kernel_size"]
+    out_channels = layer.params["out_channels"]
+    macs = elements(layer.output_shape) * in_channels * kernel_size * kernel_size
+    return out_channels * in_channels * kernel_size * kernel_size + out_channels, macs, 2 * macs
+
+def maxpool2d_cost(layer):
+    # one comparison per element of the window
+    kernel_size = layer.params["kernel_size"]
+    return 0, 0, elements(layer.output_shape) * kernel_size * kernel_size
+
+def batchnorm_cost(layer):
+    # weight and bias, in inference mode every element is scaled and shifted
+    return 2 * layer.params["num_features"], 0, 2 * elements(layer.output_shape)
+
+def elementwise_cost(layer):
+    return 0, 0, elements(layer.output_shape)
+
+def free_cost(layer):
+    return 0, 0, 0
+
+# Computes the number of parameters, MACs and FLOPs of a single input of a layer
+COST_FUNCTIONS = {
+    'linear': linear_cost,
+    'conv2d': conv2d_cost,
+    'maxpool2d': maxpool2d_cost,
+    'flatten': free_cost,
+    'batchnorm2d': batchnorm_cost,
+    'batchnorm1d': batchnorm_cost,
+    # dropout is the identity in inference mode
+    'dropout': free_cost,
+    'relu': elementwise_cost,
+    'tanh': elementwise_cost,
+    'sigmoid': elementwise_cost,
+}
+
+def estimate_cost(layers, input_shape=None, batch_size=1, dtype_bytes=4):
+    """
+    Estimates the cost of the forward pass of a network from its specification,
+    without building the network.
+
+    Args:
+        layers: List of layers as returned by process_ast.
+        input_shape: Shape of a single input without the batch dimension, e.g. (3, 224, 224).
+            If it is not given, it is taken from the input module.
+        batch_size: Number of inputs in a batch.
+        dtype_bytes: Size of an element of the activations in bytes.
+
+    Returns:
+        A NetworkCost or None if the input shape is not known.
+
+    Raises:
+        ShapeError: If the shapes of the layers do not match or are not constant.
+    """
+    shapes = infer_shapes(layers, input_shape)
+    if shapes is None:
+        return None
+    if shapes and not all(isinstance(size, int) for size in shapes[0].input_shape):
+        raise ShapeError(f"the input shape {format_shape(shapes[0].input_shape)} has to be constant")
+
+    costs = []
+    peak = 0
+    for layer in shapes:
+        if not all(isinstance(layer.params[param], int) for param in layer.params):
+            raise ShapeError(f"{layer.name}: the parameters have to be constant")
+        params, macs, flops = COST_FUNCTIONS[layer.type](layer)
+        input_bytes = batch_size * elements(layer.input_shape) * dtype_bytes
+        output_bytes = batch_size * elements(layer.output_shape) * dtype_bytes
+        peak = max(peak, input_bytes + output_bytes)
+        costs.append(LayerCost(layer.name, layer.type, layer.output_shape, params, batch_size * macs, batch_size * flops, output_bytes))
+    return NetworkCost(
+        costs,
+        sum(cost.params for cost in costs),
+        sum(cost.macs for cost in costs),
+        sum(cost.flops for cost in costs),
+        peak,
+        batch_size,
+    )
+
+def format_bytes(size):
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+# PyTorch creates the parameters of the layers as float32
+PARAM_BYTES = 4
+
+def format_cost(cost):
+    """Formats the cost of every layer and the total cost as a table."""
+    lines = [f"{'layer':<16}{'output shape':<20}{'params':>12}{'MACs':>16}{'FLOPs':>16}{'activations':>14}"]
+    for layer in cost.layers:
+        lines.append(
+            f"{layer.name:<16}{format_shape(layer.output_shape):<20}{layer.params:>12,}"
+            f"{layer.macs:>16,}{layer.flops:>16,}{format_bytes(layer.activation_bytes):>14}"
+        )
+    lines.append(f"{'total':<36}{cost.params:>12,}{cost.macs:>16,}{cost.flops:>16,}")
+    lines.append(f"batch size {cost.batch_size}, parameters {format_bytes(PARAM_BYTES * cost.params)}, peak activations {format_bytes(cost.peak_activation_bytes)}")
+    return "\n".join(lines)
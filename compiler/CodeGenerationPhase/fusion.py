@@ -0,0 +1,70 @@
+# Batchnorms that can be folded into the weights of the layer before them and the
+# functions of torch.nn.utils.fusion that fold them
+FUSIBLE_LAYERS = {
+    ('conv2d', 'batchnorm2d'): 'fuse_conv_bn_eval',
+    ('linear', 'batchnorm1d'): 'fuse_linear_bn_eval',
+}
+
+# Layers that return their input or a view of it instead of a new tensor
+VIEW_LAYERS = {'flatten', 'dropout'}
+
+# Layers whose output is saved for their backward pass
+SAVED_OUTPUT_LAYERS = {'relu', 'tanh', 'sigmoid'}
+
+def find_fusions(modules, layer_shapes=None):
+    """
+    Finds the batchnorms that directly follow a conv2d or linear layer.
+
+    A linear layer followed by a batchnorm1d is only fused if the output of the
+    linear layer is not known to have more than 1 dimension, batchnorm1d
+    normalizes the second dimension of 3 dimensional inputs.
+
+    Args:
+        modules: The layers in the order of the forward pass, without code and input modules.
+        layer_shapes: Optional list of the LayerShape (or None) of every layer in modules.
+
+    Returns:
+        A dict mapping the name of every fused batchnorm to a tuple of the name
+        of the layer it is folded into and the name of the fusion function.
+    """
+    layer_shapes = layer_shapes or [None] * len(modules)
+    fusions = {}
+    for layer, next_layer, shape in zip(modules, modules[1:], layer_shapes):
+        function = FUSIBLE_LAYERS.get((layer['type'], next_layer['type']))
+        if function is None:
+            continue
+        if layer['type'] == 'linear' and shape is not None and len(shape.output_shape) != 1:
+            continue
+        fusions[next_layer['name']] = (layer['name'], function)
+    return fusions
+
+def inplace_activations(modules, skipped=()):
+    """
+    Finds the ReLUs that can run in place.
+
+    Since the layers form a chain, the input of a layer is dead after the layer,
+    unless it is the input of the network, which belongs to the caller, or it is
+    saved for the backward pass of the layer that computed it. Flatten and
+    dropout (in inference mode) return their input or a view of it, so the
+    tensor they return is live if their input is.
+
+    Args:
+        modules: The layers in the order of the forward pass, without code and input modules.
+        skipped: Names of layers that are not called in the forward pass.
+
+    Returns:
+        The set of names of the ReLUs that can run in place.
+    """
+    result = set()
+    # The current tensor is dead after the next layer
+    dead = False
+    for layer in modules:
+        if layer['name'] in skipped:
+            continue
+        if layer['type'] == 'relu' and dead and not layer['assignments'].get('inplace'):
+            result.add(layer['name'])
+        if layer['type'] in SAVED_OUTPUT_LAYERS:
+            dead = False
+        elif layer['type'] not in VIEW_LAYERS:
+            dead = True
+    return result
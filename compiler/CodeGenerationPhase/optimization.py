@@ -1,5 +1,11 @@
 import ast
+import copy
 import operator
+import time
+from collections import deque
+from instrumentation import active, span
+
+MAX_ITERATIONS = 10 # default maximum number of times the optimizer passes are run
 
 # Allowed operators for safe evaluation
 ALLOWED_OPERATORS = {
@@ -15,7 +21,8 @@ ALLOWED_OPERATORS = {
 def safe_eval(node, values):
     """
     Safely evaluate an AST node if it consists entirely of constants or known values.
-    Returns (is_constant, value_or_expr_node).
+    Returns (is_constant, value_or_expr_node). A node that can not be simplified
+    is returned as is.
     """
     if isinstance(node, ast.Constant):
         if isinstance(node.value, (int, float)):
@@ -35,8 +42,10 @@ def safe_eval(node, values):
             return True, ALLOWED_OPERATORS[type(node.op)](left_val, right_val)
         else:
             # If not fully constant, reconstruct partially simplified node
-            new_left = left_val if isinstance(left_val, ast.expr) else ast.Constant(value=left_val)
-            new_right = right_val if isinstance(right_val, ast.expr) else ast.Constant(value=right_val)
+            new_left = left_val if isinstance(left_val, ast.expr) else constant_node(node.left, left_val)
+            new_right = right_val if isinstance(right_val, ast.expr) else constant_node(node.right, right_val)
+            if new_left is node.left and new_right is node.right:
+                return False, node
             new_node = ast.BinOp(
                 left=new_left,
                 op=node.op,
@@ -46,59 +55,112 @@ def safe_eval(node, values):
     else:
         return False, node
 
+def constant_node(node, value):
+    """Returns node if it already is the constant value, else a new constant node."""
+    if isinstance(node, ast.Constant) and type(node.value) is type(value) and node.value == value:
+        return node
+    return ast.Constant(value=value)
+
 def parse_expr(expr):
     return ast.parse(expr, mode='eval').body
 
 def expr_to_str(node):
     return ast.unparse(node)
 
-def propagate_constants(definitions):
+def propagate_constants(definitions, dirty=None, graph=None):
     """
-    Attempt to propagate constants through all definitions until no more changes occur.
+    Propagate constants through all definitions.
+
+    Definitions are evaluated in topological order of the dependency graph, so
+    a definition is evaluated after all definitions it uses. A definition is
+    only evaluated again if one of the definitions it uses becomes constant
+    afterwards, which only happens for definitions on a cycle.
+
+    Args:
+        definitions: Dictionary mapping variable names to expression nodes.
+        dirty: Variables whose definitions are evaluated, all if None. The
+            users of a variable that becomes constant are always evaluated.
+        graph: DependencyGraph that is up to date with definitions.
     """
-    changed = True
     values = {}
     # Initialize known constants
-    for k, v in definitions.items():
-        try:
-            val = float(v)
+    for k, node in definitions.items():
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            val = float(node.value)
             if val.is_integer():
                 values[k] = int(val)
             else:
                 values[k] = val
-        except ValueError:
-            pass
-
-    while changed:
-        changed = False
-        for k, v in list(definitions.items()):
-            node = parse_expr(v)
-            is_const, result = safe_eval(node, values)
-            if is_const:
-                old_val = values.get(k, None)
-                if old_val != result:
-                    values[k] = result
-                    definitions[k] = str(result)
-                    changed = True
-            else:
-                # If partially constant, update with simplified expr
-                if isinstance(result, ast.AST):
-                    new_expr = expr_to_str(result)
-                    if new_expr != v:
-                        definitions[k] = new_expr
-                        changed = True
+
+    if dirty is None:
+        dirty = definitions.keys()
+    if graph is None:
+        deps = build_dependency_graph(definitions)
+        users = reverse_graph(deps)
+    else:
+        deps = graph.deps
+        users = graph.users
+    order = topological_order({k: {dep for dep in deps[k] if dep in dirty} for k in definitions if k in dirty})
+    worklist = deque(order)
+    queued = set(worklist)
+    while worklist:
+        k = worklist.popleft()
+        queued.discard(k)
+        node = definitions[k]
+        is_const, result = safe_eval(node, values)
+        if is_const:
+            old_val = values.get(k, None)
+            if old_val != result:
+                values[k] = result
+                definitions[k] = ast.Constant(value=result)
+                # Users of k have to be evaluated with its new value
+                for user in users.get(k, ()):
+                    if user not in queued:
+                        worklist.append(user)
+                        queued.add(user)
+        else:
+            # If partially constant, update with simplified expr
+            if result is not node:
+                definitions[k] = result
     return definitions
 
+def used_names(node):
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
 def build_dependency_graph(definitions):
-    graph = {k: set() for k in definitions}
-    for k, v in definitions.items():
-        node = parse_expr(v)
-        for n in ast.walk(node):
-            if isinstance(n, ast.Name):
-                if n.id in definitions:
-                    graph[k].add(n.id)
+    graph = {}
+    for k, node in definitions.items():
+        graph[k] = {name for name in used_names(node) if name in definitions}
     return graph
 
+def reverse_graph(graph):
+    """Maps every variable to the variables that depend on it."""
+    users = {k: set() for k in graph}
+    for k, deps in graph.items():
+        for dep in deps:
+            users[dep].add(k)
+    return users
+
+def topological_order(graph):
+    """
+    Orders the variables of a dependency graph such that every variable comes
+    after the variables it depends on. Variables on a cycle (and variables
+    depending on them) are appended in the order of the graph.
+    """
+    users = reverse_graph(graph)
+    pending = {k: len(deps) for k, deps in graph.items()}
+    order = [k for k in graph if pending[k] == 0]
+    idx = 0
+    while idx < len(order):
+        for user in users[order[idx]]:
+            pending[user] -= 1
+            if pending[user] == 0:
+                order.append(user)
+        idx += 1
+    if len(order) < len(graph):
+        order += [k for k in graph if pending[k] > 0]
+    return order
+
 def get_needed_variables(graph, needed):
     needed = set(needed)
     to_visit = list(needed)
@@ -113,96 +175,443 @@ def get_needed_variables(graph, needed):
                         to_visit.append(dep)
     return required
 
-def eliminate_dead_code(definitions, needed):
-    graph = build_dependency_graph(definitions)
-    required = get_needed_variables(graph, needed)
-    # Filter definitions to only required
-    return {k: v for k, v in definitions.items() if k in required}
+class DependencyGraph:
+    def __init__(self, definitions, needed):
+        """
+        Dependency graph of the definitions of a code module that is kept up to
+        date while the passes rewrite the definitions.
+
+        A variable is live if it is needed or used by the definition of a live
+        variable. When a definition changes, only the variables whose liveness
+        changes are visited. Variables on a cycle keep each other live until
+        the graph is built again.
+
+        definitions: Dictionary mapping variable names to expression nodes.
+        needed: Names of the variables that are used outside of the code module.
+        """
+        self.needed = set(needed)
+        self.nodes = {} # the expression of every definition the graph was last updated with
+        self.deps = {} # names used by the definition of each variable
+        self.users = {} # variables whose definition uses a name
+        for k, node in definitions.items():
+            self.nodes[k] = node
+            self.deps[k] = used_names(node)
+            for dep in self.deps[k]:
+                self.users.setdefault(dep, set()).add(k)
+        self.live = get_needed_variables(self.deps, self.needed)
+        self.dead = {k for k in definitions if k not in self.live} # defined variables that are not live
+
+    def update(self, definitions, keys=None):
+        """
+        Updates the graph to the current definitions. Definitions are compared by
+        identity, so only the definitions a pass replaced are walked.
+
+        keys: Variables whose definitions may have changed, all if None.
+        """
+        if keys is None:
+            keys = self.nodes.keys() | definitions.keys()
+        for k in keys:
+            if k not in definitions:
+                if k in self.nodes:
+                    self.remove(k)
+            elif self.nodes.get(k) is not definitions[k]:
+                self.set(k, definitions[k])
+
+    def set(self, k, node):
+        """Adds or replaces the definition of k."""
+        old_deps = self.deps.get(k, set())
+        new_deps = used_names(node)
+        self.nodes[k] = node
+        self.deps[k] = new_deps
+        for dep in old_deps - new_deps:
+            self.users[dep].discard(k)
+        for dep in new_deps - old_deps:
+            self.users.setdefault(dep, set()).add(k)
+        if k in self.live:
+            self.mark_live(new_deps - old_deps)
+            self.mark_dead(old_deps - new_deps)
+        else:
+            self.dead.add(k)
+
+    def remove(self, k):
+        """Removes the definition of k."""
+        deps = self.deps.pop(k)
+        del self.nodes[k]
+        self.dead.discard(k)
+        for dep in deps:
+            self.users[dep].discard(k)
+        if k in self.live:
+            self.mark_dead(deps | {k})
+
+    def mark_live(self, names):
+        """Marks names and everything they use as live."""
+        stack = [name for name in names if name not in self.live]
+        while stack:
+            name = stack.pop()
+            if name in self.live:
+                continue
+            self.live.add(name)
+            self.dead.discard(name)
+            stack.extend(dep for dep in self.deps.get(name, ()) if dep not in self.live)
 
-def common_subexpression_elimination(definitions):
+    def mark_dead(self, names):
+        """Marks names that lost a user as dead if no live variable uses them anymore."""
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in self.live or name in self.needed:
+                continue
+            if any(user in self.live for user in self.users.get(name, ())):
+                continue
+            self.live.discard(name)
+            if name in self.nodes:
+                self.dead.add(name)
+            stack.extend(self.deps.get(name, ()))
+
+def eliminate_dead_code(definitions, needed, graph=None):
     """
-    Very naive CSE placeholder. For a full CSE, more complex analysis is needed.
-    Here we just return definitions as is.
+    Removes the definitions of all variables that are not live.
+
+    Args:
+        definitions: Dictionary mapping variable names to expression nodes.
+        needed: Names of the variables that are used outside of the code module.
+        graph: DependencyGraph that is up to date with definitions. Only the
+            variables that became dead since the last call are removed.
+
+    Returns:
+        The definitions without dead code.
     """
+    if graph is None:
+        graph = DependencyGraph(definitions, needed)
+    for k in list(graph.dead):
+        del definitions[k]
+        graph.remove(k)
     return definitions
 
-def is_copy_assignment(expr):
+def value_number(node, table, numbers, nodes, children, names):
     """
-    Check if expr is simply 'var = other_var'.
+    Hash-conses the subtrees of node: structurally equal subtrees get the same
+    value number. The key of a subtree only contains the value numbers of its
+    children, so every node is hashed in constant time.
+
+    Value numbers are assigned in post-order, so the value number of a node is
+    larger than the value numbers of its children.
+
+    Args:
+        table: Dictionary mapping keys of subtrees to their value number.
+        numbers: Dictionary mapping id(subtree) to its value number.
+        nodes: One subtree for every value number.
+        children: The value numbers of the children for every value number.
+        names: Set of all variable names, extended by the names used in node.
+    """
+    key = [type(node)]
+    child_numbers = []
+    for field, value in ast.iter_fields(node):
+        if isinstance(value, ast.AST):
+            vn = value_number(value, table, numbers, nodes, children, names)
+            child_numbers.append(vn)
+            key.append(vn)
+        elif isinstance(value, list):
+            items = []
+            for item in value:
+                if isinstance(item, ast.AST):
+                    vn = value_number(item, table, numbers, nodes, children, names)
+                    child_numbers.append(vn)
+                    items.append(vn)
+                else:
+                    items.append(item)
+            key.append(tuple(items))
+        else:
+            # the type distinguishes e.g. the constants 2, 2.0 and True
+            key.append((type(value), value))
+    if isinstance(node, ast.Name):
+        names.add(node.id)
+    key = tuple(key)
+    vn = table.get(key)
+    if vn is None:
+        vn = len(nodes)
+        table[key] = vn
+        nodes.append(node)
+        children.append(child_numbers)
+    numbers[id(node)] = vn
+    return vn
+
+def common_subexpression_elimination(definitions, prefix='cse', names=(), numbering=None):
+    """
+    Computes every operation that appears more than once in the definitions
+    only once.
+
+    Repeated operations are found by value numbering all subtrees. An operation
+    that is used at least twice (counting the uses of an enclosing repeated
+    operation only once) is assigned to a temporary variable which is defined
+    right before its first use. If the operation is the whole expression of a
+    definition that comes first, that variable is reused instead.
+
+    Args:
+        definitions: Dictionary mapping variable names to expression nodes.
+        prefix: Prefix of the names of the temporary variables.
+        names: Other names the temporary variables must not use.
+        numbering: Optional (numbers, nodes, children) of the definitions
+            numbered before (see value_number), names has to contain the names
+            they use.
+
+    Returns:
+        Dictionary mapping variable names to expression nodes.
+    """
+    reserved = names
+    names = set(definitions)
+    if numbering is None:
+        table, numbers, nodes, children = {}, {}, [], []
+        roots = {k: value_number(node, table, numbers, nodes, children, names) for k, node in definitions.items()}
+        order = reversed(range(len(nodes)))
+    else:
+        numbers, nodes, children = numbering
+        roots = {k: numbers[id(node)] for k, node in definitions.items()}
+        order = sorted(set(numbers.values()), reverse=True)
+
+    # Count the uses of every value number, parents before children
+    uses = dict.fromkeys(numbers.values(), 0)
+    for vn in roots.values():
+        uses[vn] += 1
+    shared = {}
+    for vn in order:
+        shared[vn] = uses[vn] >= 2 and isinstance(nodes[vn], ast.BinOp)
+        # the children of a shared operation are only computed once
+        weight = 1 if shared[vn] else uses[vn]
+        for child in children[vn]:
+            uses[child] += weight
+
+    result = {}
+    variables = {}
+    temporaries = 0
+
+    def rewrite(node):
+        nonlocal temporaries
+        vn = numbers[id(node)]
+        if not shared[vn]:
+            return transform(node, rewrite)
+        if vn not in variables:
+            # temporaries used by the operation are defined first
+            expression = transform(node, rewrite)
+            name = f"{prefix}{temporaries}"
+            while name in names or name in reserved:
+                temporaries += 1
+                name = f"{prefix}{temporaries}"
+            temporaries += 1
+            variables[vn] = name
+            result[name] = expression
+        return ast.Name(id=variables[vn], ctx=ast.Load())
+
+    for k, node in definitions.items():
+        vn = roots[k]
+        if shared[vn] and vn not in variables:
+            variables[vn] = k
+            result[k] = transform(node, rewrite)
+        else:
+            result[k] = rewrite(node)
+    return result
+
+class CommonSubexpressions:
+    def __init__(self, prefix='cse'):
+        """
+        Common subexpression elimination that only looks at the definitions
+        that changed since its last run.
+
+        After a run an operation only appears twice in the definitions if the
+        run rewrote one of them, so every repeated operation is contained in a
+        definition that changed or was rewritten by the last run. Every
+        definition is value numbered once, its value numbers are kept with an
+        index of the definitions that contain each operation. A run eliminates
+        the common subexpressions of these definitions and of the definitions
+        that share an operation with them, the other definitions are not visited.
+
+        prefix: Prefix of the names of the temporary variables.
+        """
+        self.prefix = prefix
+        # value numbers shared by all runs, keys only contain the value numbers of children
+        self.table, self.nodes, self.children = {}, [], []
+        self.numbered = {} # the expression of every definition when it was numbered
+        self.numbers = {} # value numbers of the subtrees of every definition by id
+        self.operations = {} # value numbers of the operations of every definition
+        self.containing = {} # definitions that contain each operation
+        self.names = {} # the variable and the names used by every definition
+        self.used = {} # number of definitions that define or use each name, temporaries must not use them
+        self.rewritten = set() # definitions rewritten by the last run
+
+    def __call__(self, definitions, dirty=None):
+        """
+        Eliminates the common subexpressions of definitions, see common_subexpression_elimination.
+
+        dirty: Variables whose definitions changed since the last run, all if None.
+        """
+        if dirty is None:
+            dirty = definitions.keys()
+        for k in [k for k in self.numbered if k not in definitions]:
+            self.forget(k)
+        for k, node in definitions.items():
+            if self.numbered.get(k) is not node:
+                self.number(k, node)
+        changed = {k for k in definitions if k in dirty or k in self.rewritten}
+        affected = set(changed)
+        for k in changed:
+            for vn in self.operations[k]:
+                affected |= self.containing[vn]
+        selected = {k: node for k, node in definitions.items() if k in affected}
+        numbers = {}
+        for k in selected:
+            numbers.update(self.numbers[k])
+        rewritten = common_subexpression_elimination(selected, self.prefix, self.used, (numbers, self.nodes, self.children))
+
+        # the temporaries are defined right before the definition that first uses them
+        result = {}
+        items = iter(rewritten.items())
+        for k, node in definitions.items():
+            if k not in affected:
+                result[k] = node
+                continue
+            for name, expression in items:
+                result[name] = expression
+                if name == k:
+                    break
+        self.rewritten = {k for k, node in rewritten.items() if definitions.get(k) is not node}
+        return result
+
+    def number(self, k, node):
+        """Value numbers the definition of k."""
+        if k in self.numbered:
+            self.forget(k)
+        numbers, names = {}, {k}
+        value_number(node, self.table, numbers, self.nodes, self.children, names)
+        self.numbered[k] = node
+        self.numbers[k] = numbers
+        self.operations[k] = {vn for vn in numbers.values() if isinstance(self.nodes[vn], ast.BinOp)}
+        for vn in self.operations[k]:
+            self.containing.setdefault(vn, set()).add(k)
+        self.names[k] = names
+        for name in names:
+            self.used[name] = self.used.get(name, 0) + 1
+
+    def forget(self, k):
+        del self.numbered[k]
+        del self.numbers[k]
+        for name in self.names.pop(k):
+            self.used[name] -= 1
+            if not self.used[name]:
+                del self.used[name]
+        for vn in self.operations.pop(k):
+            self.containing[vn].discard(k)
+
+def is_copy_assignment(node):
+    """
+    Check if node is simply 'var = other_var'.
     Returns the other_var name if it is a simple copy, else None.
     """
-    node = parse_expr(expr)
     if isinstance(node, ast.Name):
         return node.id
     return None
 
-def replace_name(node, old_name, new_name):
+def transform(node, function):
     """
-    Recursively replace all occurrences of old_name with new_name in the AST.
+    Applies function to all children of node. Nodes are never modified in
+    place: node is copied if any of its children changed, otherwise node
+    itself is returned, so callers can detect changes by identity.
     """
-    if isinstance(node, ast.Name) and node.id == old_name:
-        return ast.Name(id=new_name, ctx=node.ctx)
+    changes = {}
     for field, value in ast.iter_fields(node):
         if isinstance(value, ast.AST):
-            setattr(node, field, replace_name(value, old_name, new_name))
+            new_value = function(value)
+            if new_value is not value:
+                changes[field] = new_value
         elif isinstance(value, list):
-            new_list = []
-            for item in value:
-                if isinstance(item, ast.AST):
-                    new_list.append(replace_name(item, old_name, new_name))
-                else:
-                    new_list.append(item)
-            setattr(node, field, new_list)
-    return node
+            new_list = [function(item) if isinstance(item, ast.AST) else item for item in value]
+            if any(new is not old for new, old in zip(new_list, value)):
+                changes[field] = new_list
+    if not changes:
+        return node
+    new_node = copy.copy(node)
+    for field, value in changes.items():
+        setattr(new_node, field, value)
+    return new_node
 
-def appears_in_definitions(var, definitions):
+def replace_names(node, names):
     """
-    Check if 'var' appears in any definition's expression.
+    Recursively replace all occurrences of the names in the dictionary names
+    with the names they map to in the AST.
     """
-    for k, expr in definitions.items():
-        node = parse_expr(expr)
-        for n in ast.walk(node):
-            if isinstance(n, ast.Name) and n.id == var:
-                return True
-    return False
-
-def copy_propagation(definitions):
-    changed = True
-    while changed:
-        changed = False
-        copy_map = {}
-        
-        # Identify copy assignments: var = other_var
-        for var, expr in definitions.items():
-            target = is_copy_assignment(expr)
-            if target is not None:
-                copy_map[var] = target
-
-        if not copy_map:
-            # No copy assignments found
-            break
-
-        # Apply copy propagation
-        # Replace occurrences of var with target in all expressions
-        for var, target in copy_map.items():
-            if var in definitions:
-                for k, v in list(definitions.items()):
-                    if k == var:
-                        continue
-                    node = parse_expr(v)
-                    new_node = replace_name(node, var, target)
-                    new_expr = expr_to_str(new_node)
-                    if new_expr != v:
-                        definitions[k] = new_expr
-                        changed = True
-
-        # After propagation, if var is no longer needed, remove it.
-        for var, target in list(copy_map.items()):
-            if var in definitions:
-                if not appears_in_definitions(var, definitions):
-                    del definitions[var]
-                    changed = True
+    if isinstance(node, ast.Name) and node.id in names:
+        return ast.Name(id=names[node.id], ctx=node.ctx)
+    return transform(node, lambda child: replace_names(child, names))
+
+def replace_name(node, old_name, new_name):
+    """
+    Recursively replace all occurrences of old_name with new_name in the AST.
+    """
+    return replace_names(node, {old_name: new_name})
+
+def resolve_copies(definitions):
+    """
+    Maps every variable that is a copy of another variable to the variable at
+    the end of its chain of copies, e.g. a = b; b = c maps a and b to c.
+
+    Chains are resolved with path compression: the variables on a chain are
+    mapped to its end when the chain is first followed, so every variable is
+    visited once. Variables on a cycle of copies are not mapped, variables
+    leading into a cycle are mapped to the first variable on the cycle.
+    """
+    copies = {}
+    for var, node in definitions.items():
+        target = is_copy_assignment(node)
+        if target is not None:
+            copies[var] = target
 
+    resolved = {}
+    for var in copies:
+        path = []
+        on_path = set()
+        end = var
+        while end in copies and end not in resolved and end not in on_path:
+            path.append(end)
+            on_path.add(end)
+            end = copies[end]
+        if end in on_path:
+            # the chain runs into a cycle starting at end
+            cycle = path.index(end)
+            for v in path[cycle:]:
+                resolved[v] = v
+            path = path[:cycle]
+        else:
+            end = resolved.get(end, end)
+        for v in path:
+            resolved[v] = end
+    return {var: end for var, end in resolved.items() if end != var}
+
+def copy_propagation(definitions, dirty=None, graph=None):
+    """
+    Replaces the uses of variables that are copies of other variables by the
+    copied variables. The copies themselves are removed by dead code
+    elimination once they are not used anymore (and not needed).
+
+    All chains of copies are resolved at once (see resolve_copies), so every
+    definition is traversed at most once.
+
+    Args:
+        definitions: Dictionary mapping variable names to expression nodes.
+        dirty: Unused, every use of a copy is replaced.
+        graph: DependencyGraph that is up to date with definitions, only the
+            definitions that use a copy are traversed if given.
+    """
+    aliases = resolve_copies(definitions)
+    if not aliases:
+        return definitions
+    if graph is None:
+        users = list(definitions)
+    else:
+        users = {user for var in aliases for user in graph.users.get(var, ())}
+    for k in users:
+        node = definitions[k]
+        new_node = replace_names(node, aliases)
+        if new_node is not node:
+            definitions[k] = new_node
     return definitions
 
 def is_power_of_two(n):
@@ -245,48 +654,116 @@ def optimize_multiplications_by_powers_of_two(node):
                 return ast.BinOp(left=left, op=ast.LShift(), right=ast.Constant(value=exponent))
 
     # Recurse into children
-    for field, value in ast.iter_fields(node):
-        if isinstance(value, ast.AST):
-            new_val = optimize_multiplications_by_powers_of_two(value)
-            setattr(node, field, new_val)
-        elif isinstance(value, list):
-            new_list = []
-            for item in value:
-                if isinstance(item, ast.AST):
-                    new_item = optimize_multiplications_by_powers_of_two(item)
-                    new_list.append(new_item)
-                else:
-                    new_list.append(item)
-            setattr(node, field, new_list)
-    return node
+    return transform(node, optimize_multiplications_by_powers_of_two)
 
-def algebraic_optimizations(definitions):
+def algebraic_optimizations(definitions, dirty=None):
     """
     Optimize algebraic operations, for example turning x * 2^n into x << n.
+    Only the definitions of the variables in dirty are optimized (all if None).
     """
-    for k, v in list(definitions.items()):
-        node = parse_expr(v)
-        new_node = optimize_multiplications_by_powers_of_two(node)
-        new_expr = expr_to_str(new_node)
-        if new_expr != v:
-            definitions[k] = new_expr
+    for k in list(definitions if dirty is None else dirty):
+        definitions[k] = optimize_multiplications_by_powers_of_two(definitions[k])
     return definitions
 
+class PassManager:
+    def __init__(self, passes, max_iterations=MAX_ITERATIONS):
+        """
+        Runs optimization passes until none of them changes a definition.
 
-def optimize(definitions, needed):
-    # 1. Constant Propagation
-    definitions = propagate_constants(definitions)
+        A pass only runs if a definition changed since its last run and only
+        gets the variables whose definitions changed. Every pass runs on all
+        definitions in the first iteration.
 
-    # 2. Copy Propagation
-    definitions = copy_propagation(definitions)
+        passes: List of (name, function) pairs. function(definitions, dirty, graph)
+            optimizes definitions and returns the optimized definitions, dirty
+            is the set of variables whose definitions changed since the pass
+            ran last and graph the DependencyGraph of the definitions.
+        max_iterations: Maximum number of times the passes are run.
+        """
+        self.passes = passes
+        self.max_iterations = max_iterations
+        self.iterations = 0
+        # number of runs, number of changed definitions and total time of every pass
+        self.stats = {name: {"runs": 0, "changes": 0, "time": 0.0} for name, _ in passes}
 
-    # 3. Algebraic Optimizations (for shifts)
-    definitions = algebraic_optimizations(definitions)
+    def run(self, definitions, graph):
+        """Optimizes definitions, graph has to be up to date with definitions."""
+        profiler = active()
+        dirty = {name: set(definitions) for name, _ in self.passes}
+        while self.iterations < self.max_iterations and any(dirty.values()):
+            self.iterations += 1
+            for name, function in self.passes:
+                pending = {k for k in dirty[name] if k in definitions}
+                dirty[name] = set()
+                if not pending:
+                    continue
+                before = dict(definitions)
+                start = time.perf_counter()
+                definitions = function(definitions, pending, graph)
+                elapsed = time.perf_counter() - start
+                stats = self.stats[name]
+                stats["time"] += elapsed
+                stats["runs"] += 1
 
-    # 4. Common Subexpression Elimination (simplistic)
-    definitions = common_subexpression_elimination(definitions)
-    
-    # 5. Dead Code Elimination
-    definitions = eliminate_dead_code(definitions, needed)
-    
-    return definitions
+                changed = {k for k, node in definitions.items() if before.get(k) is not node}
+                changed.update(k for k in before if k not in definitions)
+                stats["changes"] += len(changed)
+                if profiler is not None:
+                    profiler.add(name, "optimizer", start, elapsed, {"pending": len(pending), "changes": len(changed)})
+                graph.update(definitions, changed)
+                for other in dirty:
+                    if other != name:
+                        dirty[other] |= changed
+        return definitions
+
+
+def optimize(definitions, needed, max_iterations=MAX_ITERATIONS, stats=None):
+    """
+    Optimizes the definitions of a code module.
+
+    Every expression is parsed once, all passes work on the parsed ast.expr
+    nodes which are unparsed at the end.
+
+    Args:
+        definitions: Dictionary mapping variable names to expression strings.
+        needed: Names of the variables that are used outside of the code module.
+        max_iterations: Maximum number of times the passes are run.
+        stats: Optional dictionary that is filled with the statistics of every
+            pass, see PassManager.
+
+    Returns:
+        Dictionary mapping the remaining variable names to expression strings.
+    """
+    with span("optimize", "optimizer") as args:
+        result = run_passes(definitions, needed, max_iterations, stats, args)
+    return result
+
+def run_passes(definitions, needed, max_iterations, stats, args):
+    """The body of optimize, args are the counters of the profiler span or None."""
+    definitions = {k: parse_expr(v) for k, v in definitions.items()}
+    graph = DependencyGraph(definitions, needed)
+    eliminate_common_subexpressions = CommonSubexpressions()
+    passes = [
+        # 1. Constant Propagation
+        ("constant propagation", propagate_constants),
+        # 2. Copy Propagation
+        ("copy propagation", copy_propagation),
+        # 3. Algebraic Optimizations (for shifts)
+        ("algebraic optimizations", lambda definitions, dirty, graph: algebraic_optimizations(definitions, dirty)),
+        # 4. Common Subexpression Elimination
+        ("common subexpression elimination", lambda definitions, dirty, graph: eliminate_common_subexpressions(definitions, dirty)),
+        # 5. Dead Code Elimination
+        ("dead code elimination", lambda definitions, dirty, graph: eliminate_dead_code(definitions, needed, graph)),
+    ]
+    manager = PassManager(passes, max_iterations)
+    if args is not None:
+        args["definitions"] = len(definitions)
+    definitions = manager.run(definitions, graph)
+    if stats is not None:
+        stats.update(manager.stats)
+    if args is not None:
+        args["iterations"] = manager.iterations
+        args["rewrites"] = sum(pass_stats["changes"] for pass_stats in manager.stats.values())
+        args["remaining"] = len(definitions)
+
+    return {k: expr_to_str(node) for k, node in definitions.items()}
@@ -0,0 +1,242 @@
+import ast
+from collections import namedtuple
+from .optimization import parse_expr, expr_to_str, safe_eval, propagate_constants
+
+class ShapeError(ValueError):
+    """Raised if the input of a layer does not have the shape the layer expects."""
+
+class UnknownShapeError(ShapeError):
+    """Raised if a shape parameter is not a number, e.g. 2 / 0 or "same", so the shapes can not be inferred."""
+
+# Shape of the input of a layer and of its output. Shapes do not include the batch
+# dimension, every dimension is an int or an expression (str) if it is not constant.
+# params are the evaluated shape parameters of the layer including the inferred ones,
+# inferred maps parameters that were not given to the values computed from the input shape.
+LayerShape = namedtuple("LayerShape", ["name", "type", "input_shape", "output_shape", "params", "inferred"])
+
+# Parameters of the input module, e.g. input: { channels = 3; height = 224; width = 224; }
+INPUT_DIMS = [
+    ("channels", "height", "width"),
+    ("channels", "length"),
+    ("features",),
+]
+
+def evaluate(expression, values):
+    """
+    Evaluates an expression with the values of the variables in values.
+
+    Returns:
+        An int if the expression is constant and integral, otherwise the
+        simplified expression as a string.
+    """
+    if isinstance(expression, int):
+        return expression
+    try:
+        is_const, result = safe_eval(parse_expr(str(expression)), values)
+        if is_const:
+            float(result)
+    except (ArithmeticError, SyntaxError) as error:
+        raise UnknownShapeError(f"{expression} can not be evaluated: {error}") from None
+    if is_const:
+        if float(result).is_integer():
+            return int(result)
+        raise ShapeError(f"{expression} is not an integer")
+    if any(isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)) for node in ast.walk(result)):
+        raise UnknownShapeError(f"{expression} is not a number")
+    return expr_to_str(result)
+
+def dim(expression, **dims):
+    """Evaluates an expression of dimensions, e.g. dim("a * b", a=2, b="x")."""
+    return evaluate(expression.format(**{name: f"({value})" for name, value in dims.items()}), {})
+
+def elements(shape):
+    """Number of elements of a tensor of the given shape."""
+    result = 1
+    for size in shape:
+        result = dim("{a} * {b}", a=result, b=size)
+    return result
+
+def check(name, expected, actual):
+    """Raises a ShapeError if the constant dimensions expected and actual differ."""
+    if isinstance(expected, int) and isinstance(actual, int) and expected != actual:
+        raise ShapeError(f"{name} is {expected} but the input has {actual}")
+
+def check_positive(shape):
+    for size in shape:
+        if isinstance(size, int) and size <= 0:
+            raise ShapeError(f"output shape {format_shape(shape)} is empty")
+
+def check_rank(shape, ranks):
+    if len(shape) not in ranks:
+        expected = " or ".join(str(rank) for rank in ranks)
+        raise ShapeError(f"expected an input with {expected} dimensions, got {format_shape(shape)}")
+
+def linear_shape(shape, params):
+    if not shape:
+        raise ShapeError("expected an input with at least 1 dimension")
+    inferred = {}
+    if params.get("dim_in") is None:
+        inferred["dim_in"] = shape[-1]
+    else:
+        check("dim_in", params["dim_in"], shape[-1])
+    return shape[:-1] + (params["dim_out"],), inferred
+
+def conv2d_shape(shape, params):
+    check_rank(shape, [3])
+    channels, height, width = shape
+    inferred = {}
+    if params.get("in_channels") is None:
+        inferred["in_channels"] = channels
+    else:
+        check("in_channels", params["in_channels"], channels)
+    sizes = {"k": params["kernel_size"], "s": params.get("stride", 1), "p": params.get("padding", 0)}
+    height = dim("({h} + 2 * {p} - {k}) // {s} + 1", h=height, **sizes)
+    width = dim("({w} + 2 * {p} - {k}) // {s} + 1", w=width, **sizes)
+    return (params["out_channels"], height, width), inferred
+
+def maxpool2d_shape(shape, params):
+    check_rank(shape, [3])
+    channels, height, width = shape
+    # the stride defaults to the kernel size
+    sizes = {"k": params["kernel_size"], "s": params.get("stride", params["kernel_size"]), "p": params.get("padding", 0)}
+    height = dim("({h} + 2 * {p} - {k}) // {s} + 1", h=height, **sizes)
+    width = dim("({w} + 2 * {p} - {k}) // {s} + 1", w=width, **sizes)
+    return (channels, height, width), {}
+
+def flatten_shape(shape, params):
+    # start_dim and end_dim count the batch dimension
+    rank = len(shape) + 1
+    start = params.get("start_dim", 1) % rank
+    end = params.get("end_dim", -1) % rank
+    if start == 0:
+        raise ShapeError("flattening the batch dimension is not supported")
+    if start > end:
+        return shape, {}
+    return shape[:start - 1] + (elements(shape[start - 1:end]),) + shape[end:], {}
+
+def batchnorm_shape(ranks):
+    def shape_function(shape, params):
+        check_rank(shape, ranks)
+        inferred = {}
+        if params.get("num_features") is None:
+            inferred["num_features"] = shape[0]
+        else:
+            check("num_features", params["num_features"], shape[0])
+        return shape, inferred
+    return shape_function
+
+def same_shape(shape, params):
+    return shape, {}
+
+# Computes the output shape of a layer and the inferred parameters from its input shape
+SHAPE_FUNCTIONS = {
+    'linear': linear_shape,
+    'conv2d': conv2d_shape,
+    'maxpool2d': maxpool2d_shape,
+    'flatten': flatten_shape,
+    'batchnorm2d': batchnorm_shape([3]),
+    'batchnorm1d': batchnorm_shape([1, 2]),
+    'dropout': same_shape,
+    'relu': same_shape,
+    'tanh': same_shape,
+    'sigmoid': same_shape,
+}
+
+# Parameters that determine the shapes, all of them are integers
+SHAPE_PARAMS = {'dim_in', 'dim_out', 'in_channels', 'out_channels', 'kernel_size', 'stride', 'padding', 'num_features', 'start_dim', 'end_dim'}
+
+# Parameters that are looked up in the code module if a layer does not define them
+GLOBAL_PARAMS = {
+    'linear': ['dim_in', 'dim_out'],
+    'conv2d': ['in_channels', 'out_channels', 'kernel_size'],
+    'maxpool2d': ['kernel_size'],
+    'batchnorm2d': ['num_features'],
+    'batchnorm1d': ['num_features'],
+}
+
+def code_values(assignments):
+    """Values of the constant variables of a code module."""
+    definitions = {k: parse_expr(v) for k, v in assignments.items() if v}
+    definitions = propagate_constants(definitions)
+    return {k: node.value for k, node in definitions.items() if isinstance(node, ast.Constant) and isinstance(node.value, (int, float))}
+
+def input_shape_of(layer, values):
+    """Returns the shape declared by an input module."""
+    assignments = layer['assignments']
+    for dims in INPUT_DIMS:
+        if all(assignments.get(name) for name in dims):
+            return tuple(evaluate(assignments[name], values) for name in dims)
+    expected = ", ".join(" and ".join(dims) for dims in INPUT_DIMS)
+    raise ShapeError(f"the input module has to define {expected}")
+
+def infer_shapes(layers, input_shape=None):
+    """
+    Propagates the shape of the input through the layers returned by process_ast.
+
+    The input shape is either given or declared by an input module. Parameters
+    of the layers are evaluated with the constants of the code module.
+
+    Args:
+        layers: List of layers as returned by process_ast.
+        input_shape: Shape of a single input without the batch dimension, e.g. (3, 224, 224).
+
+    Returns:
+        A LayerShape for every layer except code and input modules or None if
+        the input shape is not known.
+
+    Raises:
+        ShapeError: If the input of a layer does not match its parameters.
+    """
+    shape = tuple(input_shape) if input_shape is not None else None
+    global_params = {}
+    values = {}
+    result = []
+    seen_layer = False
+    for layer in layers:
+        module_type = layer['type']
+        assignments = layer['assignments']
+        if module_type == 'code':
+            global_params = assignments
+            values = code_values(assignments)
+            continue
+        if module_type == 'input':
+            if seen_layer:
+                raise ShapeError(f"{layer['name']}: the input module has to come before the first layer")
+            if input_shape is None:
+                shape = input_shape_of(layer, values)
+            continue
+        seen_layer = True
+        if shape is None:
+            continue
+        if module_type not in SHAPE_FUNCTIONS:
+            raise ShapeError(f"{layer['name']}: unsupported module type {module_type}")
+
+        try:
+            params = {}
+            for param, value in assignments.items():
+                if value and param in SHAPE_PARAMS:
+                    params[param] = evaluate(value, values)
+            for param in GLOBAL_PARAMS.get(module_type, []):
+                if param not in params and global_params.get(param):
+                    params[param] = evaluate(global_params[param], values)
+            output_shape, inferred = SHAPE_FUNCTIONS[module_type](shape, params)
+            check_positive(output_shape)
+        except ShapeError as error:
+            raise type(error)(f"{layer['name']}: {error}") from None
+        except KeyError as error:
+            raise ShapeError(f"{layer['name']}: missing parameter {error}") from None
+        result.append(LayerShape(layer['name'], module_type, shape, output_shape, {**params, **inferred}, inferred))
+        shape = output_shape
+    if shape is None:
+        return None
+    return result
+
+def format_shape(shape):
+    return "(" + ", ".join(str(size) for size in shape) + ")"
+
+def format_shapes(shapes):
+    """Formats the output shape and the activation size of every layer as a table."""
+    lines = [f"{'layer':<16}{'output shape':<24}{'activations':>12}"]
+    for layer in shapes:
+        lines.append(f"{layer.name:<16}{format_shape(layer.output_shape):<24}{str(elements(layer.output_shape)):>12}")
+    return "\n".join(lines)
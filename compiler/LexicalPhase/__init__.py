@@ -1,2 +1,4 @@
 from .dfa import DFA, load_dfas
+from .scanner import Scanner
+from .tokens import Token, TokenKind, legacy_token_stream
 from .lexer import Lexer
\ No newline at end of file
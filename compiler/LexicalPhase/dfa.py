@@ -1,6 +1,67 @@
+from array import array
 from keyword import kwlist
 
+REJ = 0 # id of the rejecting state in every DFA
+
+# DFAs recognizing single chars
+SYMBOLS = {
+    "SYMBOL_COLON": ':',
+    "SYMBOL_SEMICOLON": ';',
+    "SYMBOL_LBRACE": '{',
+    "SYMBOL_RBRACE": '}',
+    "SYMBOL_LBRACKET": '[',
+    "SYMBOL_RBRACKET": ']',
+    "SYMBOL_LPAREN": '(',
+    "SYMBOL_RPAREN": ')',
+    "SYMBOL_COMMA": ',',
+    "SYMBOL_DOT": '.'
+}
+
+OPS = {
+    # Arithmetic Operators
+    "OP_PLUS": '+',
+    "OP_MINUS": '-',
+    "OP_MULTIPLY": '*',
+    "OP_DIVIDE": '/',
+    "OP_MODULO": '%',
+    "OP_EXPONENT": '**',
+    "OP_FLOOR_DIVIDE": '//',
+    
+    # Assignment Operators
+    "OP_EQUAL": '=',
+    "OP_PLUS_EQUAL": '+=',
+    "OP_MINUS_EQUAL": '-=',
+    "OP_MULTIPLY_EQUAL": '*=',
+    "OP_DIVIDE_EQUAL": '/=',
+    "OP_MODULO_EQUAL": '%=',
+    "OP_EXPONENT_EQUAL": '**=',
+    "OP_FLOOR_DIVIDE_EQUAL": '//=',
+    
+    # Comparison Operators
+    "OP_EQUAL_EQUAL": '==',
+    "OP_NOT_EQUAL": '!=',
+    "OP_GREATER_THAN": '>',
+    "OP_LESS_THAN": '<',
+    "OP_GREATER_EQUAL": '>=',
+    "OP_LESS_EQUAL": '<=',
+    
+    # Logical Operators
+    "OP_AND": 'and',
+    "OP_OR": 'or',
+    "OP_NOT": 'not',
+    
+    # Bitwise Operators
+    "OP_BITWISE_AND": '&',
+    "OP_BITWISE_OR": '|',
+    "OP_BITWISE_NOT": '~',
+    "OP_BITWISE_XOR": '^',
+    "OP_LEFT_SHIFT": '<<',
+    "OP_RIGHT_SHIFT": '>>'
+}
+
 class DFA:
+    __slots__ = ("name", "state_names", "state_ids", "classes", "num_classes", "table", "status_codes", "start", "current")
+
     def __init__(self, name, states, transitions, start_state, accept_states):
         """
         name: Name of the recognized token
@@ -8,14 +69,39 @@ class DFA:
         transitions: A dictionary mapping (state, string of characters) -> next state.
         start_state: The state in which the automaton begins.
         accept_states: A set of accepting states.
+
+        Internally states are interned to small integers (the rejecting state
+        "rej" is REJ), characters are mapped to character classes (class 0 for
+        characters without any transition) and the transitions are stored in a
+        flat array indexed by state * num_classes + char class.
         """
         self.name = name
-        self.states = states
-        self.states.add("rej")
-        self.transitions = self.expand_transitions(transitions)
-        self.start_state = start_state
-        self.accept_states = accept_states
-        self.current_state = start_state
+        self.state_names = ["rej"] + sorted(set(states) - {"rej"})
+        self.state_ids = {state: i for i, state in enumerate(self.state_names)}
+
+        expanded_transitions = self.expand_transitions(transitions)
+
+        # characters with the same transitions from every state share a class
+        signatures = {}
+        self.classes = {}
+        for char in sorted({char for (_, char) in expanded_transitions}):
+            signature = tuple(expanded_transitions.get((state, char)) for state in self.state_names)
+            if signature not in signatures:
+                signatures[signature] = len(signatures) + 1
+            self.classes[char] = signatures[signature]
+        self.num_classes = len(signatures) + 1
+
+        self.table = array("H", [REJ] * (len(self.state_names) * self.num_classes))
+        for (state, char), next_state in expanded_transitions.items():
+            self.table[self.state_ids[state] * self.num_classes + self.classes[char]] = self.state_ids[next_state]
+
+        self.status_codes = array("b", [0] * len(self.state_names))
+        self.status_codes[REJ] = -1
+        for state in accept_states:
+            self.status_codes[self.state_ids[state]] = 1
+
+        self.start = self.state_ids[start_state]
+        self.current = self.start
 
     def expand_transitions(self, transitions):
         """Expand transitions to handle multiple characters in the transition key."""
@@ -25,27 +111,50 @@ class DFA:
                 expanded_transitions[(state, char)] = next_state
         return expanded_transitions
 
+    @property
+    def states(self):
+        return set(self.state_names)
+
+    @property
+    def start_state(self):
+        return self.state_names[self.start]
+
+    @property
+    def accept_states(self):
+        return {state for i, state in enumerate(self.state_names) if self.status_codes[i] == 1}
+
+    @property
+    def current_state(self):
+        return self.state_names[self.current]
+
+    @property
+    def transitions(self):
+        """Dictionary mapping (state, char) -> next state, without transitions into "rej"."""
+        transitions = {}
+        for char, char_class in self.classes.items():
+            for state, name in enumerate(self.state_names):
+                next_state = self.table[state * self.num_classes + char_class]
+                if next_state != REJ:
+                    transitions[(name, char)] = self.state_names[next_state]
+        return transitions
+
+    def step(self, state, char):
+        """Returns the id of the state reached from the state with id state on input char."""
+        return self.table[state * self.num_classes + self.classes.get(char, 0)]
+
     def reset(self):
         """Reset the automaton to the start state."""
-        self.current_state = self.start_state
+        self.current = self.start
     
     # Does the actual transition
     def __call__(self, char):
         """Make a transition based on the current state and input character."""
-        if (self.current_state, char) in self.transitions:
-            self.current_state = self.transitions[(self.current_state, char)]
-        else:
-            self.current_state = "rej"
-        return self.status()
+        self.current = self.table[self.current * self.num_classes + self.classes.get(char, 0)]
+        return self.status_codes[self.current]
     
     def status(self):
         """Check the status of the current state."""
-        if self.current_state in self.accept_states:
-            return 1  # Accepted state
-        elif self.current_state == "rej":
-            return -1  # Rejected state
-        else:
-            return 0  # Neither accepted nor rejected
+        return self.status_codes[self.current] # 1: accepted, -1: rejected, 0: neither
 
 def single_char_dfa(name, ch):
     return DFA(name=name, states={"q0", "q1"}, transitions={('q0', ch): 'q1'}, start_state="q0", accept_states={"q1"})
@@ -140,68 +249,9 @@ def load_dfas():
         for kw in kwlist:
             dfas.append(kw_dfa(kw))
         
-        # get DFAs recognizing single chars
-        SYMBOLS = {
-            "SYMBOL_COLON": ':',
-            "SYMBOL_SEMICOLON": ';',
-            "SYMBOL_LBRACE": '{',
-            "SYMBOL_RBRACE": '}',
-            "SYMBOL_LBRACKET": '[',
-            "SYMBOL_RBRACKET": ']',
-            "SYMBOL_LPAREN": '(',
-            "SYMBOL_RPAREN": ')',
-            "SYMBOL_COMMA": ',',
-            "SYMBOL_DOT": '.'
-        }
-
         for name, sym in SYMBOLS.items():
             dfas.append(single_char_dfa(name, sym))
         
-        # get DFAs recognizing single chars
-
-        OPS = {
-            # Arithmetic Operators
-            "OP_PLUS": '+',
-            "OP_MINUS": '-',
-            "OP_MULTIPLY": '*',
-            "OP_DIVIDE": '/',
-            "OP_MODULO": '%',
-            "OP_EXPONENT": '**',
-            "OP_FLOOR_DIVIDE": '//',
-            
-            # Assignment Operators
-            "OP_EQUAL": '=',
-            "OP_PLUS_EQUAL": '+=',
-            "OP_MINUS_EQUAL": '-=',
-            "OP_MULTIPLY_EQUAL": '*=',
-            "OP_DIVIDE_EQUAL": '/=',
-            "OP_MODULO_EQUAL": '%=',
-            "OP_EXPONENT_EQUAL": '**=',
-            "OP_FLOOR_DIVIDE_EQUAL": '//=',
-            
-            # Comparison Operators
-            "OP_EQUAL_EQUAL": '==',
-            "OP_NOT_EQUAL": '!=',
-            "OP_GREATER_THAN": '>',
-            "OP_LESS_THAN": '<',
-            "OP_GREATER_EQUAL": '>=',
-            "OP_LESS_EQUAL": '<=',
-            
-            # Logical Operators
-            "OP_AND": 'and',
-            "OP_OR": 'or',
-            "OP_NOT": 'not',
-            
-            # Bitwise Operators
-            "OP_BITWISE_AND": '&',
-            "OP_BITWISE_OR": '|',
-            "OP_BITWISE_NOT": '~',
-            "OP_BITWISE_XOR": '^',
-            "OP_LEFT_SHIFT": '<<',
-            "OP_RIGHT_SHIFT": '>>'
-       }
-
-
         for name, op in OPS.items():
             dfas.append(op_dfa(name, op))
         
@@ -1,68 +1,253 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from LexicalPhase import load_dfas
+from instrumentation import span
+from .scanner import DEAD, START
+from .split import MIN_CHUNK_SIZE, split_source
+from .tables import load_scanner
+from .tokens import Token, TokenKind
+
+CHUNK_SIZE = 1 << 16 # number of characters read from a file at once
+
+def read_chunks(source, chunk_size=CHUNK_SIZE):
+    """Yields the text of source, which can be a string, a file object or an iterator over strings."""
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, "read"):
+        chunk = source.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = source.read(chunk_size)
+    else:
+        yield from source
+
+def count_tokens(tokens, args):
+    """Counts the tokens and their characters while profiling."""
+    args["tokens"] = 0
+    args["token_chars"] = 0
+    for token in tokens:
+        args["tokens"] += 1
+        args["token_chars"] += len(token.lexeme)
+        yield token
+
+# Token kinds by value, the workers send kind.value instead of the enum member
+KINDS = list(TokenKind)
+
+# Lexers of the current worker process by panic mode
+_worker_lexers = {}
+
+def lex_chunk(job):
+    """
+    Lexes a chunk of a program in a worker process.
+
+    Args:
+        job: Tuple of the chunk and the panic mode.
+
+    Returns:
+        The tokens as (kind value, lexeme, start, line, column) tuples relative
+        to the chunk and everything the lexer printed.
+    """
+    text, panic_mode = job
+    lexer = _worker_lexers.get(panic_mode)
+    if lexer is None:
+        lexer = _worker_lexers[panic_mode] = Lexer(panic_mode)
+    messages = io.StringIO()
+    with redirect_stdout(messages):
+        tokens = [(token.kind.value, *token[1:]) for token in lexer.iter_tokens(text)]
+    return tokens, messages.getvalue()
 
 class Lexer():
-    def __init__(self, panic_mode=False):
-        """Setup DFA for each tokenclass"""
+    def __init__(self, panic_mode=False, jobs=1, min_chunk_size=MIN_CHUNK_SIZE):
+        """
+        Setup DFA for each tokenclass
+
+        panic_mode: Ignore invalid tokens instead of stopping.
+        jobs: Number of worker processes that lex the modules of a program in
+        parallel, os.cpu_count() if None. With 1 the input is lexed serially.
+        min_chunk_size: Smallest number of characters lexed by a worker.
+        """
         self.panic_mode = panic_mode
-        self.dfas = load_dfas()
+        self.jobs = jobs
+        self.min_chunk_size = min_chunk_size
+        # all DFAs combined into a single table driven DFA, shared by all lexers
+        self.scanner = load_scanner()
+        self._dfas = None
+        self.kinds = [TokenKind[name] if name else None for name in self.scanner.accept]
         
         # storing the input and the token stream
         self.input_stream = ""
         self.token_stream = []
 
+    @property
+    def dfas(self):
+        """The DFA of every token class, only built when they are used."""
+        if self._dfas is None:
+            self._dfas = load_dfas()
+        return self._dfas
+
     def __call__(self, input_stream):
         # TODO: careful with end of file
         self.input_stream = input_stream
-        idx = 0
-        while(idx < len(self.input_stream)):
-            if(self.input_stream[idx].isspace()):
-                idx += 1
-            else:
-                idx = self.munch(idx)
-                if idx == -1:
+        with span("lex", "lexer") as args:
+            tokens = self.iter_tokens(input_stream) if self.jobs == 1 else iter(self.parallel_tokens(input_stream))
+            if args is not None:
+                tokens = count_tokens(tokens, args)
+            for token in tokens:
+                if token.kind is TokenKind.INVALID_TOKEN:
+                    self.token_stream = [str(token)]
                     print(f"Error during lexical phase\n{self.token_stream}")
-                    return 
- 
-    def munch(self, start_idx):
-        # Reset DFAs
-        for dfa in self.dfas:
-            dfa.reset()
-
-        idx = start_idx
-
-        cur = [0 for _ in range(len(self.dfas))]
-        next = [None for _ in range(len(self.dfas))]
-
-        sq = 0 # in single quotes
-        dq = 0 # in double quotes
-
-        while idx != len(self.input_stream) and (not self.input_stream[idx].isspace() or sq or dq):
-            if self.input_stream[idx] == '"':
-                dq = (dq + 1) % 2
-            if self.input_stream[idx] == "'":
-                sq = (sq + 1) % 2
-
-            for i, dfa in enumerate(self.dfas):
-                next[i] = dfa(self.input_stream[idx])
-            # No DFA can match the next input token
-            if max(next) == -1:
-                break
-            else:
-                cur = next[:]
-                idx += 1
+                    return
+                self.token_stream.append(str(token))
+
+    def iter_tokens(self, source, chunk_size=CHUNK_SIZE):
+        """
+        Lexes source and yields the recognized tokens one by one.
+
+        source: A string, a file object or an iterator over strings. Files are
+        read in chunks of chunk_size characters, so only the current chunk
+        and the token that is being recognized are kept in memory.
 
-        # Could not match token
-        if max(cur) <= 0:
-            if self.panic_mode:
-                print(f"Warning: found and ignored invalid token \"{self.input_stream[start_idx: idx+1]}\"")
+        If the lexer is not in panic mode, an invalid token is yielded as a
+        token of kind INVALID_TOKEN and lexing stops.
+        """
+        table = self.scanner.table
+        classes = self.scanner.classes
+        num_classes = self.scanner.num_classes
+        kinds = self.kinds
+
+        chunks = read_chunks(source, chunk_size)
+        buffer = ""
+        offset = 0 # offset of buffer[0] in the input
+        idx = 0 # current position in the buffer
+        scanned = 0 # newlines in buffer[:scanned] are already counted
+        line = 1
+        line_start = 0 # offset of the first char of the current line
+
+        def fill():
+            """Appends the next chunk to the buffer, returns False at the end of the input."""
+            nonlocal buffer
+            for chunk in chunks:
+                if chunk:
+                    buffer += chunk
+                    return True
+            return False
+
+        while True:
+            # skip whitespaces
+            while True:
+                if idx >= len(buffer) and not fill():
+                    return
+                if not buffer[idx].isspace():
+                    break
                 idx += 1
+
+            # drop the part of the buffer that was already lexed
+            if idx >= chunk_size:
+                newlines = buffer.count("\n", scanned, idx)
+                if newlines:
+                    line += newlines
+                    line_start = offset + buffer.rindex("\n", scanned, idx) + 1
+                buffer = buffer[idx:]
+                offset += idx
+                idx = 0
+                scanned = 0
+
+            # munch
+            start_idx = idx
+            state = START
+
+            sq = 0 # in single quotes
+            dq = 0 # in double quotes
+
+            while idx < len(buffer) or fill():
+                char = buffer[idx]
+                if char.isspace() and not sq and not dq:
+                    break
+                if char == '"':
+                    dq = (dq + 1) % 2
+                if char == "'":
+                    sq = (sq + 1) % 2
+
+                next_state = table[state * num_classes + classes.get(char, 0)]
+                # No DFA can match the next input token
+                if next_state == DEAD:
+                    break
+                else:
+                    state = next_state
+                    idx += 1
+
+            newlines = buffer.count("\n", scanned, start_idx)
+            if newlines:
+                line += newlines
+                line_start = offset + buffer.rindex("\n", scanned, start_idx) + 1
+            scanned = start_idx
+            start = offset + start_idx
+
+            kind = kinds[state] if idx != start_idx else None
+
+            # Could not match token
+            if kind is None:
+                if self.panic_mode:
+                    print(f"Warning: found and ignored invalid token \"{buffer[start_idx: idx+1]}\"")
+                    idx += 1
+                else:
+                    yield Token(TokenKind.INVALID_TOKEN, buffer[start_idx: idx+1], start, line, start - line_start + 1)
+                    return
             else:
-                self.token_stream = [f"<INVALID_TOKEN, {self.input_stream[start_idx: idx+1]}>"]
-                return -1
-        else:
-            self.token_stream += [f"<{self.dfas[cur.index(1)].name}, {self.input_stream[start_idx: idx]}>"]
+                yield Token(kind, buffer[start_idx: idx], start, line, start - line_start + 1)
+
+    def parallel_tokens(self, source):
+        """
+        Lexes a program in parallel and returns the same tokens as iter_tokens.
+
+        The program is split after top-level commas into chunks that are lexed
+        by a pool of worker processes. The positions of the tokens of a chunk
+        are shifted by the position of the chunk in the program. A split is
+        only correct if the serial lexer also ends a token with that comma,
+        which fails e.g. after an unterminated string literal; then the rest
+        of the program is lexed serially.
+
+        source: A string, a file object or an iterator over strings.
+        """
+        if not isinstance(source, str):
+            source = "".join(read_chunks(source))
+        jobs = self.jobs or os.cpu_count() or 1
+        chunks = split_source(source, 2 * jobs, self.min_chunk_size)
+        if jobs == 1 or len(chunks) == 1:
+            return list(self.iter_tokens(source))
+
+        tokens = []
+        line = 1 # position of the current chunk
+        line_start = 0
+        previous = 0
+        with ProcessPoolExecutor(max_workers=min(jobs, len(chunks))) as executor:
+            results = executor.map(lex_chunk, [(source[start:end], self.panic_mode) for start, end in chunks])
+            for (start, end), (chunk_tokens, messages) in zip(chunks, results):
+                newlines = source.count("\n", previous, start)
+                if newlines:
+                    line += newlines
+                    line_start = source.rindex("\n", previous, start) + 1
+                previous = start
+                column = start - line_start + 1
+
+                last = chunk_tokens[-1] if chunk_tokens else None
+                stop = last is not None and last[0] == TokenKind.INVALID_TOKEN.value
+                if end < len(source) and not stop and (last is None or last[0] != TokenKind.SYMBOL_COMMA.value or last[2] != end - start - 1):
+                    # the serial lexer does not end a token at the split
+                    chunk_tokens = [(token.kind.value, *token[1:]) for token in self.iter_tokens(source[start:])]
+                    messages = ""
+                    stop = True
 
-        return idx
+                print(messages, end="")
+                for kind, lexeme, token_start, token_line, token_column in chunk_tokens:
+                    if token_line == 1:
+                        token_column += column - 1
+                    tokens.append(Token(KINDS[kind - 1], lexeme, token_start + start, token_line + line - 1, token_column))
+                if stop:
+                    break
+        return tokens
 
 if __name__ == "__main__":
     lexer = Lexer(panic_mode=True)
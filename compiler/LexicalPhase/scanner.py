@@ -0,0 +1,144 @@
+from .dfa import REJ
+
+DEAD = 0 # state id of the state in which every DFA has rejected
+START = 1 # state id of the start state
+
+class Scanner:
+    def __init__(self, dfas):
+        """
+        Combines a list of token DFAs into a single minimized DFA.
+
+        Running the combined DFA on a string is equivalent to running all of
+        the DFAs in lockstep: a state of the combined DFA accepts the name of
+        the first DFA (in the order of the list) that is in an accepting
+        state, and the DFA is in the DEAD state once all DFAs rejected.
+
+        dfas: List of DFAs ordered by priority.
+        """
+        self.classes, class_chars = self.char_classes(dfas)
+        self.num_classes = len(class_chars)
+
+        states, transitions, labels = self.product(dfas, class_chars)
+        self.table, self.accept = self.minimize(states, transitions, labels, dfas)
+
+    @classmethod
+    def from_tables(cls, tables):
+        """Creates a scanner from the tables returned by Scanner.tables without building the DFAs."""
+        scanner = cls.__new__(cls)
+        scanner.classes = tables["classes"]
+        scanner.num_classes = tables["num_classes"]
+        scanner.table = tables["table"]
+        scanner.accept = tables["accept"]
+        return scanner
+
+    def tables(self):
+        """Returns the tables of the combined DFA as a dictionary of builtin types."""
+        return {"classes": self.classes, "num_classes": self.num_classes, "table": self.table, "accept": self.accept}
+
+    def char_classes(self, dfas):
+        """
+        Groups all characters that cause the same transitions in every DFA
+        into one character class. Class 0 contains all characters that do not
+        appear in any DFA.
+
+        Returns a dictionary mapping each character to its class and a list
+        containing one representative character for each class.
+        """
+        alphabet = sorted({char for dfa in dfas for char in dfa.classes})
+        signatures = {}
+        classes = {}
+        class_chars = [None]
+        for char in alphabet:
+            signature = tuple(dfa.classes.get(char, 0) for dfa in dfas)
+            if signature not in signatures:
+                signatures[signature] = len(class_chars)
+                class_chars.append(char)
+            classes[char] = signatures[signature]
+        return classes, class_chars
+
+    def product(self, dfas, class_chars):
+        """
+        Subset construction over the current states of all DFAs. A product
+        state is the tuple of (index, state id) pairs of the DFAs that did not
+        reject yet, so the dead state is the empty tuple.
+
+        Returns the list of reachable product states, their transitions as a
+        list of rows (one entry per character class) and the accept label of
+        every state (index of the first accepting DFA or None).
+        """
+        start = tuple((i, dfa.start) for i, dfa in enumerate(dfas))
+        dead = ()
+
+        ids = {dead: DEAD, start: START}
+        states = [dead, start]
+        transitions = []
+        idx = 0
+        while idx < len(states):
+            state = states[idx]
+            row = [DEAD]
+            for char in class_chars[1:]:
+                next_state = []
+                for i, s in state:
+                    t = dfas[i].step(s, char)
+                    if t != REJ:
+                        next_state.append((i, t))
+                next_state = tuple(next_state)
+                if next_state not in ids:
+                    ids[next_state] = len(states)
+                    states.append(next_state)
+                row.append(ids[next_state])
+            transitions.append(row)
+            idx += 1
+
+        labels = []
+        for state in states:
+            label = None
+            for i, s in state:
+                if dfas[i].status_codes[s] == 1:
+                    label = i
+                    break
+            labels.append(label)
+        return states, transitions, labels
+
+    def minimize(self, states, transitions, labels, dfas):
+        """
+        Merges equivalent states by refining the partition of the states
+        (Moore's algorithm). States are initially split by their accept label,
+        the dead state is kept in a block of its own.
+
+        Returns the flat transition table of the minimized DFA, indexed by
+        state * num_classes + char class, and the token name accepted in each
+        state (None for non-accepting states).
+        """
+        block = [("dead",) if i == DEAD else labels[i] for i in range(len(states))]
+        num_blocks = None
+        while True:
+            signatures = [(block[i],) + tuple(block[t] for t in transitions[i]) for i in range(len(states))]
+            ids = {}
+            for signature in signatures:
+                if signature not in ids:
+                    ids[signature] = len(ids)
+            block = [ids[signature] for signature in signatures]
+            if len(ids) == num_blocks:
+                break
+            num_blocks = len(ids)
+
+        # renumber the blocks so that the dead and start state keep their ids
+        order = {block[DEAD]: DEAD, block[START]: START}
+        for i in range(len(states)):
+            if block[i] not in order:
+                order[block[i]] = len(order)
+
+        table = [DEAD] * (num_blocks * self.num_classes)
+        accept = [None] * num_blocks
+        for i in range(len(states)):
+            state = order[block[i]]
+            for char_class, next_state in enumerate(transitions[i]):
+                table[state * self.num_classes + char_class] = order[block[next_state]]
+            if labels[i] is not None:
+                accept[state] = dfas[labels[i]].name
+        return table, accept
+
+    def step(self, state, char):
+        """Returns the state reached from state on input char."""
+        return self.table[state * self.num_classes + self.classes.get(char, 0)]
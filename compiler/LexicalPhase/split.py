@@ -0,0 +1,54 @@
+import re
+
+MIN_CHUNK_SIZE = 1 << 18 # smallest number of characters lexed by a worker
+
+# Everything that changes the nesting of a program: complete string literals are
+# skipped as a whole, a lone quote starts an unterminated string literal
+STRUCTURE = re.compile(r"""'[^']*'|"[^"]*"|['"]|[{}\[\]()]|,""")
+
+def module_boundaries(source, depth=0):
+    """
+    Returns the offsets right after the top-level commas of a program.
+
+    A program is a brace-delimited list of modules separated by commas, so
+    the commas at nesting depth 1 (outside of string literals) separate the
+    modules. Nothing after an unterminated string literal is a boundary.
+
+    depth: Nesting depth at the start of source, 1 for a part of a program
+    that starts at a module boundary.
+    """
+    boundaries = []
+    for match in STRUCTURE.finditer(source):
+        char = match.group()
+        if char == ",":
+            if depth == 1:
+                boundaries.append(match.end())
+        elif char in ("{", "[", "("):
+            depth += 1
+        elif char in ("}", "]", ")"):
+            depth -= 1
+        elif char in ("'", '"'):
+            break
+    return boundaries
+
+def split_source(source, parts, min_chunk_size=MIN_CHUNK_SIZE):
+    """
+    Splits a program at module boundaries into about parts chunks.
+
+    Args:
+        source: The program.
+        parts: Number of chunks to aim for.
+        min_chunk_size: Smallest number of characters of a chunk (except for the last one).
+
+    Returns:
+        A list of (start, end) offsets of the chunks, covering the whole source.
+    """
+    size = max(min_chunk_size, -(-len(source) // parts), 1)
+    if len(source) < 2 * size:
+        return [(0, len(source))]
+    cuts = [0]
+    for boundary in module_boundaries(source):
+        if boundary - cuts[-1] >= size and len(source) - boundary >= min_chunk_size:
+            cuts.append(boundary)
+    cuts.append(len(source))
+    return list(zip(cuts, cuts[1:]))
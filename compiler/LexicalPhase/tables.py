@@ -0,0 +1,70 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from keyword import kwlist
+from .dfa import load_dfas
+from .scanner import Scanner
+
+# The tables of the combined DFA are built once and stored next to the package
+TABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scanner_tables.pickle")
+# Modules that define the DFAs and how they are combined
+SOURCES = ["dfa.py", "scanner.py"]
+
+_scanner = None
+
+def tables_version():
+    """Hash of the definitions the tables are built from, stored tables of a different version are rebuilt."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCES:
+        with open(os.path.join(directory, name), "rb") as file:
+            digest.update(file.read())
+    # the keywords depend on the version of Python
+    digest.update(repr(kwlist).encode())
+    return digest.hexdigest()
+
+def read_tables(path, version):
+    """Returns the tables stored in path or None if there are none of the given version."""
+    try:
+        with open(path, "rb") as file:
+            data = pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != version:
+        return None
+    return data["tables"]
+
+def write_tables(path, version, tables):
+    """Stores the tables, does nothing if path is not writable (e.g. an installed package)."""
+    try:
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            pickle.dump({"version": version, "tables": tables}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except OSError:
+        pass
+
+def load_scanner(path=TABLES_PATH):
+    """
+    Returns the scanner of all token DFAs, loaded once per process.
+
+    The tables are read from path. If they are missing or were built from a
+    different version of the DFAs, the DFAs are built and combined and the
+    tables are written to path for the next process.
+    """
+    global _scanner
+    if _scanner is None:
+        version = tables_version()
+        tables = read_tables(path, version)
+        if tables is None:
+            tables = Scanner(load_dfas()).tables()
+            write_tables(path, version, tables)
+        _scanner = Scanner.from_tables(tables)
+    return _scanner
+
+if __name__ == "__main__":
+    # python -m LexicalPhase.tables builds the tables ahead of time
+    write_tables(TABLES_PATH, tables_version(), Scanner(load_dfas()).tables())
+    print(f"Wrote {TABLES_PATH}")
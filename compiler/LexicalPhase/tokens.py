@@ -0,0 +1,44 @@
+from collections import namedtuple
+from enum import Enum
+from keyword import kwlist
+from .dfa import SYMBOLS, OPS
+
+# One kind for every token class recognized by the DFAs from load_dfas()
+TokenKind = Enum("TokenKind", [f"KW_{kw.upper()}" for kw in kwlist] + list(SYMBOLS) + list(OPS) + ["IDENTIFIER", "FLOAT", "LITERAL_STRING", "INVALID_TOKEN"])
+
+class Token(namedtuple("Token", ["kind", "lexeme", "start", "line", "column"])):
+    """
+    kind: TokenKind of the token.
+    lexeme: The matched input.
+    start: Offset of the first character of the token in the input.
+    line, column: Position of the first character of the token (starting at 1).
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        """Legacy string representation, e.g. <IDENTIFIER, foo>."""
+        return f"<{self.kind.name}, {self.lexeme}>"
+
+    @property
+    def value(self):
+        """The value of a FLOAT or LITERAL_STRING token (see decode_float), the lexeme for other kinds."""
+        if self.kind is TokenKind.FLOAT:
+            return decode_float(self.lexeme)
+        if self.kind is TokenKind.LITERAL_STRING:
+            return self.lexeme[1:-1]
+        return self.lexeme
+
+def decode_float(text):
+    """Returns the value of a FLOAT token, ints are kept as ints. The lexer also accepts -., which has no value (None)."""
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def legacy_token_stream(tokens):
+    """Converts tokens to the list of strings produced by Lexer.__call__."""
+    return [str(token) for token in tokens]
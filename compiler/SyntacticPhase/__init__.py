@@ -1,3 +1,4 @@
 from .parser import ll1_parse, parse_tree_to_ast
+from .ast_nodes import Node, Program, Module, Assign, Pass, If, While, Expression, List, Literal, Name, to_list, count_nodes
 # from .visualize import visualize_ast
 from .print_tree import print_tree
\ No newline at end of file
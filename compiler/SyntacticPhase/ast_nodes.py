@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+from keyword import kwlist
+from LexicalPhase.dfa import OPS
+from LexicalPhase.tokens import decode_float
+
+OPERATOR_NAMES = {op: name for name, op in OPS.items()}
+
+class Node:
+    """Base class of all AST nodes."""
+    __slots__ = ()
+
+@dataclass
+class Program(Node):
+    __slots__ = ("modules",)
+    modules: list
+
+@dataclass
+class Module(Node):
+    __slots__ = ("name", "body")
+    name: str
+    body: list
+
+@dataclass
+class Assign(Node):
+    __slots__ = ("target", "op", "value")
+    target: str
+    op: str
+    value: "Expression"
+
+@dataclass
+class Pass(Node):
+    __slots__ = ()
+
+@dataclass
+class If(Node):
+    __slots__ = ("branches", "orelse")
+    branches: list # (condition, body) for the if and every elif
+    orelse: list # body of the else branch or None
+
+@dataclass
+class While(Node):
+    __slots__ = ("condition", "body")
+    condition: "Expression"
+    body: list
+
+@dataclass
+class Expression(Node):
+    __slots__ = ("parts",)
+    parts: list # operands (Literal, Name, List) and operators (str) in the order of the input
+
+@dataclass
+class List(Node):
+    __slots__ = ("items",)
+    items: list
+
+@dataclass
+class Literal(Node):
+    __slots__ = ("value", "text")
+    value: object # int, float or str, None for a FLOAT token that is not a number, e.g. -.
+    text: str # the literal as written in the input
+
+@dataclass
+class Name(Node):
+    __slots__ = ("id",)
+    id: str
+
+def count_nodes(node):
+    """Number of AST nodes in the tree rooted at node."""
+    count = 0
+    stack = [node]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Node):
+            count += 1
+            stack.extend(getattr(value, name) for name in value.__slots__)
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return count
+
+def operator_tag(op):
+    if op in kwlist:
+        return f"<KW_{op.upper()}, {op}>"
+    return f"<{OPERATOR_NAMES[op]}, {op}>"
+
+def part_tags(part):
+    """Token strings of an operand or operator of an expression."""
+    if isinstance(part, str):
+        return [operator_tag(part)]
+    if isinstance(part, Name):
+        return [f"<IDENTIFIER, {part.id}>"]
+    if isinstance(part, Literal):
+        if isinstance(part.value, str):
+            return [f"<LITERAL_STRING, {part.text}>"]
+        return [f"<FLOAT, {part.text}>"]
+    tags = ["L", "<SYMBOL_LBRACKET, [>"]
+    for i, item in enumerate(part.items):
+        if i:
+            tags += ["L'", "<SYMBOL_COMMA, ,>"]
+        tags += part_tags(item)
+    return tags + ["L'", "<SYMBOL_RBRACKET, ]>"]
+
+def condition_to_list(condition):
+    return ["<CONDITION>"] + [[tag] for part in condition.parts for tag in part_tags(part)]
+
+def to_list(node):
+    """
+    Converts an AST to the nested list representation used by print_tree and
+    visualize_ast, e.g. [A [B [D]] [C]] for a root A with children B and C.
+    """
+    if isinstance(node, Program):
+        return ["Program"] + [to_list(module) for module in node.modules]
+    if isinstance(node, Module):
+        return [node.name] + [to_list(statement) for statement in node.body]
+    if isinstance(node, Assign):
+        expression = [tag for part in node.value.parts for tag in part_tags(part)]
+        return ["A", [f"<IDENTIFIER, {node.target}>"], [operator_tag(node.op)], ["<EXPRESSION>"] + expression, ["<SYMBOL_SEMICOLON, ;>"]]
+    if isinstance(node, Pass):
+        return ["A", ["<KW_PASS, pass>"], ["<SYMBOL_SEMICOLON, ;>"]]
+    if isinstance(node, While):
+        return ["A", ["<KW_WHILE, while>"], condition_to_list(node.condition)] + [to_list(statement) for statement in node.body]
+    if isinstance(node, If):
+        (condition, body), elifs = node.branches[0], node.branches[1:]
+        result = ["A", ["<KW_IF, if>"], condition_to_list(condition)] + [to_list(statement) for statement in body]
+        # every elif is nested in the previous one
+        nested = None
+        for condition, body in reversed(elifs):
+            branch = ["<KW_ELIF, elif>", condition_to_list(condition)] + [to_list(statement) for statement in body]
+            if nested is not None:
+                branch.append(nested)
+            nested = branch
+        if nested is not None:
+            result.append(nested)
+        if node.orelse is not None:
+            result.append(["<KW_ELSE, else>"] + [to_list(statement) for statement in node.orelse])
+        return result
+    raise ValueError(f"Unexpected AST node: {node}")
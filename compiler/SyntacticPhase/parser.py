@@ -1,6 +1,7 @@
-import re
-from LexicalPhase import Lexer
+from LexicalPhase import Lexer, Token
+from instrumentation import span, HighWaterList
 from .print_tree import print_tree
+from .ast_nodes import Program, Module, Assign, Pass, If, While, Expression, List, Literal, Name, decode_float, count_nodes
 
 PARSE_TABLE = {
     "S": {
@@ -81,462 +82,397 @@ PARSE_TABLE = {
 
 NONTERMINALS = ["S", "M", "M'", "A'", "A", "E", "E'", "L", "L'", "P", "P'", "C", "C'", "C''"]
 
+def lower_parse_table(parse_table, nonterminals):
+    """
+    Lowers the parse table to integer indexed lookup arrays.
+
+    Returns:
+        symbols: List of all grammar symbols, nonterminals first, then "$" and the other terminals.
+        productions: List of productions, each a tuple of symbol ids.
+        table: Flat list mapping nonterminal id * (len(symbols) + 1) + terminal id to the
+            index of the production to apply or -1 if there is no rule. The last column
+            is used for terminals that do not appear in the grammar.
+    """
+    terminals = ["$"]
+    for rules in parse_table.values():
+        for terminal, production in rules.items():
+            for symbol in [terminal] + production:
+                if symbol not in nonterminals and symbol not in terminals:
+                    terminals.append(symbol)
+    symbols = nonterminals + terminals
+    ids = {symbol: i for i, symbol in enumerate(symbols)}
+
+    productions = []
+    table = [-1] * (len(nonterminals) * (len(symbols) + 1))
+    for nonterminal, rules in parse_table.items():
+        for terminal, production in rules.items():
+            table[ids[nonterminal] * (len(symbols) + 1) + ids[terminal]] = len(productions)
+            productions.append(tuple(ids[symbol] for symbol in production))
+    return symbols, productions, table
+
+SYMBOLS, PRODUCTIONS, TABLE = lower_parse_table(PARSE_TABLE, NONTERMINALS)
+SYMBOL_IDS = {symbol: i for i, symbol in enumerate(SYMBOLS)}
+NUM_NONTERMINALS = len(NONTERMINALS)
+UNKNOWN = len(SYMBOLS) # id of terminals that do not appear in the grammar
+WIDTH = len(SYMBOLS) + 1 # length of a row in TABLE
+END = SYMBOL_IDS["$"]
+START = SYMBOL_IDS["S"]
+REDUCE = -1 # stack marker for a nonterminal whose children are complete
+SYM_M, SYM_A, SYM_L, SYM_P, SYM_P_PRIME, SYM_C = (SYMBOL_IDS[symbol] for symbol in ["M", "A", "L", "P", "P'", "C"])
+COMMA, LBRACE, RBRACE, LBRACKET, RBRACKET = (SYMBOL_IDS[symbol] for symbol in [",", "{", "}", "[", "]"])
+ID, FLOAT, STR, OP, AND, OR = (SYMBOL_IDS[symbol] for symbol in ["id", "float", "str", "op", "and", "or"])
+PASS, IF, WHILE, ELIF_KW, ELSE_KW = (SYMBOL_IDS[symbol] for symbol in ["pass", "if", "while", "elif", "else"])
+
+# Modes of a frame, they define how the children of a nonterminal are collected
+TREE = 0 # parse tree node
+ROOT = 1 # collects the AST
+PROGRAM = 2 # the program, collects the modules
+MODULE = 3 # a module, collects its name and its statements
+STATEMENT = 4 # an A node, collects the operands and operators of assignments or the condition and body of if and while
+CONDITION = 5 # the condition of if, elif and while, collects its operands and operators
+LIST = 6 # a list, collects its items
+ELIF = 7 # an elif branch
+ELSE = 8 # an else branch
+
+class Frame:
+    """Collects the children of a nonterminal while it is parsed."""
+    __slots__ = ("mode", "symbol", "kind", "children", "parent", "branches", "orelse")
+
+    def __init__(self, mode, symbol, kind, parent):
+        self.mode = mode
+        self.symbol = symbol
+        self.kind = kind # first terminal of the production, for modules the module name
+        self.children = []
+        self.parent = parent
+        self.branches = [] # (condition, body) of the elif branches
+        self.orelse = None # body of the else branch
+
+def split_tag(tag):
+    """Splits a token string like <IDENTIFIER, foo> into its token class and lexeme."""
+    token_class, _, token = tag[1:-1].partition(", ")
+    return token_class, token
+
 def get_non_terminal(tag):
+    """Returns the terminal of the grammar for a token string or a Token."""
     if (tag == "$"):
         return "$"
 
-    token_class = re.match(r"<([^_,]+)[_,]", tag)
-    token = re.match(r".*, ([^>]+)>", tag)
-
-    if token_class and token:
-        cl = token_class.group(1)
-        nt = token.group(1)
-        if (cl == "LITERAL"):
-            return "str"
-        elif (cl == "FLOAT"):
-            return "float"
-        elif (cl == "IDENTIFIER"):
-            return "id"
-        elif (cl == "OP"):
-            return "op"
-        else:
-            return nt
+    if isinstance(tag, Token):
+        cl, nt = tag.kind.name, tag.lexeme
     else:
-        raise ValueError("Invalid tag format")
+        cl, nt = split_tag(tag)
+        if not nt:
+            raise ValueError("Invalid tag format")
+
+    cl = cl.split("_")[0]
+    if (cl == "LITERAL"):
+        return "str"
+    elif (cl == "FLOAT"):
+        return "float"
+    elif (cl == "IDENTIFIER"):
+        return "id"
+    elif (cl == "OP"):
+        return "op"
+    else:
+        return nt
     
 def get_token(tag):
-    token = re.match(r".*, ([^>]+)>", tag)
+    if isinstance(tag, Token):
+        return tag.lexeme
+    token = split_tag(tag)[1]
     if token:
-        return token.group(1)
+        return token
     else:
         return None
 
-def ll1_parse(input_tokens):
-    stack = [("$", None), ("S", None)]
-    index = 0
+def classify_tokens(input_tokens):
+    """Returns the symbol id of the terminal for every token, computed once for the whole stream."""
+    return [SYMBOL_IDS.get(get_non_terminal(token), UNKNOWN) for token in input_tokens]
+
+def ll1_parse(input_tokens, diagnostics=None, build_ast=False):
+    """
+    Parses a list of tokens, either token strings as produced by Lexer.__call__
+    or Token records as produced by Lexer.iter_tokens.
+
+    If build_ast is set, the AST is built directly by semantic actions while
+    parsing (see child_mode, shift and reduce) and no parse tree is built. The
+    result is the same as parse_tree_to_ast applied to the parse tree.
 
-    root_node = None
+    Panic mode: if a syntax error is detected, the module that contains the
+    error is removed, the input is skipped up to the next module boundary and
+    parsing continues from there.
 
-    # Initialize variables for panic mode
-    current_module_index = None
-    current_module = None
+    Args:
+        input_tokens: The token stream.
+        diagnostics: Optional list, all error messages are appended to it.
+        build_ast: Return the AST instead of the parse tree.
+
+    Returns:
+        (True, parse_tree or ast) if the input was accepted, (False, None) otherwise.
+    """
+    root = Frame(ROOT if build_ast else TREE, None, None, None)
+    with span("parse", "parser") as args:
+        stack = [(END, None), (START, root)]
+        if args is not None:
+            stack = HighWaterList(stack)
+        valid, result = run_parser(input_tokens, diagnostics, root, stack)
+        if args is not None:
+            args["tokens"] = len(input_tokens)
+            args["max_stack"] = stack.max_length
+            if valid:
+                args["nodes"] = count_nodes(result) if build_ast else count_tree_nodes(result)
+    return valid, result
+
+def run_parser(input_tokens, diagnostics, root, stack):
+    """The parse loop of ll1_parse, root is the frame of the result and stack the initial stack."""
+    def report(message):
+        print(message)
+        if diagnostics is not None:
+            diagnostics.append(message)
+
+    terminals = classify_tokens(input_tokens)
+    index = 0
+
+    # Parser state at the start of the current module for panic mode:
+    # entries of the stack below low were not popped since the start of the
+    # module, the ones that were are saved in popped.
+    module = None
+    low = -1
+    popped = []
 
     while stack:
         
-        top_symbol, parent_node = stack.pop()
+        entry = stack.pop()
+        if len(stack) < low:
+            popped.append(entry)
+            low = len(stack)
+        top_symbol, frame = entry
 
-        if top_symbol == '$':
+        if top_symbol == END:
             print("Accept")
-            return True, root_node
+            return True, root.children[0]
+
+        if top_symbol == REDUCE:
+            reduce(frame)
+            continue
     
         if index >= len(input_tokens):
             # End of input reached unexpectedly
-            print("Error during Parsing: Unexpected end of input")
+            report("Error during Parsing: Unexpected end of input")
             return False, None
 
-        current_input = get_non_terminal(input_tokens[index])
+        current_input = terminals[index]
         
-        if is_terminal(top_symbol):
+        if top_symbol >= NUM_NONTERMINALS:
             if top_symbol == current_input:
                 # Match terminal
-                node = [input_tokens[index]]
-                if parent_node is not None:
-                    parent_node.append(node)
-                else:
-                    root_node = node
+                shift(frame, top_symbol, input_tokens[index])
                 index += 1
-            else:
-                # Error: terminal mismatch
-                print(f"Error during Parsing: Expected {top_symbol}, found {current_input} at position {index}")
-                # Error recovery: Remove the faulty module and restart parsing
-                if current_module_index is not None:
-                    input_tokens = remove_faulty_module(input_tokens, current_module_index)
-                    print(f"Ignoring module: \"{current_module}\"")
-                    return ll1_parse(input_tokens)  # Restart parsing
-                else:
-                    print("Reject")
-                    return False, None
-
-        elif top_symbol in PARSE_TABLE:
-            if current_input in PARSE_TABLE[top_symbol]:
-                # Update current module info for panic mode
-                if top_symbol == "M":
-                    current_module_index = index
-                    current_module = get_token(input_tokens[index])
-                production = PARSE_TABLE[top_symbol][current_input]
-                node = [top_symbol]
-                if parent_node is not None:
-                    parent_node.append(node)
+                continue
+            # Error: terminal mismatch
+            report(f"Error during Parsing: Expected {SYMBOLS[top_symbol]}, found {get_non_terminal(input_tokens[index])} at position {index}")
+
+        else:
+            if top_symbol == SYM_M:
+                module = (index, frame, len(frame.children))
+                low = len(stack)
+                popped = []
+            production = TABLE[top_symbol * WIDTH + current_input]
+            if production >= 0:
+                mode = child_mode(frame, top_symbol)
+                if mode is None:
+                    # spliced into the parent, no frame needed
+                    node = frame
                 else:
-                    root_node = node
-                for symbol in reversed(production):
+                    node = Frame(mode, top_symbol, current_input, frame)
+                    stack.append((REDUCE, node))
+                for symbol in reversed(PRODUCTIONS[production]):
                     stack.append((symbol, node))
-            else:
-                # Error detected
-                print(f"Error during Parsing: No rule for {top_symbol} with input {current_input}")
-                # Error recovery: Remove the faulty module and restart parsing
-                if current_module_index is not None:
-                    input_tokens = remove_faulty_module(input_tokens, current_module_index)
-                    print(f"Ignoring module: \"{current_module}\"")
-                    return ll1_parse(input_tokens)  # Restart parsing
-                else:
-                    print("Reject")
-                    return False, None
+                continue
+            # Error detected
+            report(f"Error during Parsing: No rule for {SYMBOLS[top_symbol]} with input {get_non_terminal(input_tokens[index])}")
 
-        else:
-            # Handle unexpected non-terminal symbols
-            print(f"Error during Parsing Phase: Unexpected non-terminal symbol '{top_symbol}' at position {index}")
-            print("Reject")
+        # Error recovery: Remove the faulty module and continue after it
+        if module is None:
+            report("Reject")
+            return False, None
+        module_index, frame, num_children = module
+        module = None
+        report(f"Ignoring module: \"{get_token(input_tokens[module_index])}\"")
+        del frame.children[num_children:]
+        del stack[low:]
+        stack.extend(reversed(popped))
+        low = -1
+        index = synchronize(terminals, module_index)
+        if index is None:
+            # The faulty module was the last one
+            report("Error during Parsing: Unexpected end of input")
             return False, None
+        stack.append((SYM_M, frame))
 
     # If we exit the loop without matching the end of input
     if index < len(input_tokens):
-        print("Error during Parsing: Input not fully consumed")
+        report("Error during Parsing: Input not fully consumed")
         return False, None
 
     print("Accept")
-    return True, root_node
-
-def remove_faulty_module(input_tokens, module_start_index):
-    # Copy input_tokens to avoid mutating the original list
-    tokens = input_tokens[:]
-    # Remove tokens from module_start_index to the next comma or closing brace
-    index = module_start_index
-    while index < len(tokens):
-        token = tokens[index]
-        if token == "<SYMBOL_COMMA, ,>" or token == "<SYMBOL_CLOSE_BRACE, }>":
-            index += 1
-            break
-        index += 1
-    # Remove tokens from module_start_index to index (inclusive)
-    del tokens[module_start_index:index]
-    return tokens
-
-def is_terminal(symbol):
-    return symbol not in NONTERMINALS
-
-def parse_tree_to_ast(node):
-    ast = unnest_modules(node)
-    index = 0
-    while index < len(ast):
-        module = ast[index]
-        # remove empty modules ([M'] or [M', ","])
-        if isinstance(module, list) and len(module) in [1, 2]:
-            ast.pop(index)
-        else:
-            fix_name(module)
-            remove_symbols(module)
-            remove_A_prime(module)
-            for node in module:
-                process_node(node)
-            index += 1
-
-    return ["Program"] + ast
-
-
-def process_node(node):
-    """
-    Processes any node by determining its type and acting accordingly.
-
-    Args:
-        node: The node to process.
-    """
-    if isinstance(node, list) and node:
-        node_type = node[0]
-
-        if node_type == 'A':
-            # Determine if the A node is a regular assignment or control flow
-            process_A_node(node)
-        elif node_type in ('P', "P'"):
-            process_control_flow(node)
-        else:
-            # Process child nodes recursively
-            for child in node[1:]:
-                process_node(child)
-        
-def process_A_node(node):
-    """
-    Processes an 'A' node, determining if it's a regular assignment or a control flow statement.
-
-    Args:
-        node: The 'A' node to process.
-    """
-    if len(node) < 2:
-        return  # Not enough elements to determine type
-
-    second_element = node[1]
-
-    if isinstance(second_element, list):
-        element_value = second_element[0]
-        if element_value.startswith('<IDENTIFIER'):
-            # Regular assignment
-            process_assignment(node)
-        elif element_value.startswith('<KW'):
-            # Control flow statement (if/elif/else)
-            process_control_flow(node)
-        else:
-            # Unknown structure, process child nodes
-            for child in node[1:]:
-                process_node(child)
-    else:
-        # Unexpected structure, process child nodes
-        for child in node[1:]:
-            process_node(child)
+    return True, root.children[0]
 
-def process_assignment(assignment_node):
-    """
-    Processes a regular assignment node ('A') to flatten its expressions.
-
-    Args:
-        assignment_node: The assignment node to process.
+def child_mode(frame, symbol):
     """
-    # Find the index of the semicolon
-    try:
-        semicolon_index = assignment_node.index(['<SYMBOL_SEMICOLON, ;>'])
-    except ValueError:
-        semicolon_index = len(assignment_node)
-
-    # Extract the expression nodes between the operator and semicolon
-    expression_nodes = assignment_node[3:semicolon_index]
-
-    # Flatten the expression nodes
-    flattened_expression = flatten_expression(expression_nodes)
-
-    # Replace the expression nodes with the flattened expression
-    assignment_node[3:semicolon_index] = [['<EXPRESSION>'] + flattened_expression]
-
-def process_control_flow(node):
+    Returns the mode of the frame for a nonterminal symbol that is expanded
+    within frame, or None if its children are collected by frame itself.
     """
-    Processes a control flow node representing if/elif/else structures.
-    Flattens conditions and recursively processes nested assignments.
-
-    Args:
-        node: The control flow node to process.
-    """
-    if len(node) < 2:
-        return  # Not enough elements
-
-    keyword_node = node[1]
-    if not (isinstance(keyword_node, list) and keyword_node[0].startswith('<KW')):
-        return  # Not a control flow node
-
-    # Extract keyword
-    keyword = keyword_node[0].split(',')[1].strip().rstrip('>')
-
-    idx = 2  # Start after the keyword
-
-    # Process condition for 'if' and 'elif'
-    if keyword in ['if', 'elif']:
-        # Expect '(' at node[idx]
-        if node[idx][0] == '<SYMBOL_LPAREN, (>':
-            del node[idx]  # Remove the '('
-            condition_node = node[idx]
-            if condition_node[0] == 'C':
-                # Flatten the condition
-                flattened_condition = flatten_condition(condition_node)
-                node[idx] = ['<CONDITION>'] + flattened_condition
-                idx += 1  # Move past the condition
-            else:
-                # Unexpected structure
-                return
-            # Expect ')' at node[idx]
-            if node[idx][0] != '<SYMBOL_RPAREN, )>':
-                # Unexpected structure
-                return
-            del node[idx]  # Remove the ')'
-        else:
-            # Unexpected structure
-            return
-
-    # Now, we expect '{' and then the block
-    if node[idx][0] == '<SYMBOL_LBRACE, {>':
-        del node[idx]  # Remove the '{'
-        # Process nodes inside the block until we find '}'
-        while idx < len(node):
-            child = node[idx]
-            if child[0] == '<SYMBOL_RBRACE, }>':
-                del node[idx]  # Remove the '}'
-                break
-            else:
-                process_node(child)
-                idx += 1
-    else:
-        # Unexpected structure
-        return
-
-    # Process any 'P' or "P'" nodes (elif/else clauses)
-    while idx < len(node):
-        child = node[idx] 
-        if isinstance(child, list) and child[0] in ('P', "P'"):
-            if len(child) < 2:
-                del node[idx]  # Remove the empty 'P' node
-            else:
-                process_control_flow(child)
+    mode = frame.mode
+    if mode == TREE:
+        return TREE
+    if mode == ROOT:
+        return PROGRAM
+    if symbol == SYM_L:
+        return LIST
+    if mode == PROGRAM:
+        return MODULE if symbol == SYM_M else None
+    if mode == CONDITION or mode == LIST or (mode == STATEMENT and frame.kind == ID):
+        return None
+    if symbol == SYM_A:
+        return STATEMENT
+    if symbol == SYM_C:
+        return CONDITION
+    if symbol == SYM_P:
+        return ELIF
+    if symbol == SYM_P_PRIME:
+        return ELSE
+    return None
+
+def leaf(symbol, token):
+    """Returns the AST node for an operand or operator, None for other terminals."""
+    if symbol == ID:
+        return Name(get_token(token))
+    if symbol == FLOAT or symbol == STR:
+        if isinstance(token, Token):
+            return Literal(token.value, token.lexeme)
+        # Token strings, e.g. the leaves of parse trees, are decoded from their text
+        text = get_token(token)
+        return Literal(decode_float(text) if symbol == FLOAT else text[1:-1], text)
+    if symbol == OP or symbol == AND or symbol == OR:
+        return get_token(token)
+    return None
+
+def shift(frame, symbol, token):
+    """Adds a matched terminal, a token string or a Token, to frame. The leaves of parse trees are token strings."""
+    mode = frame.mode
+    if mode == TREE:
+        frame.children.append([str(token)])
+    elif mode == MODULE:
+        if symbol == ID:
+            frame.kind = get_token(token)
+    elif mode == STATEMENT or mode == CONDITION or mode == LIST:
+        node = leaf(symbol, token)
+        if node is not None:
+            frame.children.append(node)
+
+def reduce(frame):
+    """Adds the node of a completely parsed nonterminal to its parent frame."""
+    mode = frame.mode
+    children = frame.children
+    parent = frame.parent
+    if mode == TREE:
+        parent.children.append([SYMBOLS[frame.symbol]] + children)
+    elif mode == PROGRAM:
+        parent.children.append(Program(children))
+    elif mode == MODULE:
+        parent.children.append(Module(frame.kind, children))
+    elif mode == STATEMENT:
+        kind = frame.kind
+        if kind == ID:
+            parent.children.append(Assign(children[0].id, children[1], Expression(children[2:])))
+        elif kind == PASS:
+            parent.children.append(Pass())
+        elif kind == WHILE:
+            parent.children.append(While(children[0], children[1:]))
         else:
-            # Other nodes, process recursively
-            process_node(child)
-        idx += 1
-    if node[0] in ['P', "P'"]:
-        del node[0]
-        node[0] = node[0][0]
-
-def flatten_condition(condition_node):
+            parent.children.append(If([(children[0], children[1:])] + frame.branches, frame.orelse))
+    elif mode == CONDITION:
+        parent.children.append(Expression(children))
+    elif mode == LIST:
+        parent.children.append(List(children))
+    elif mode == ELIF:
+        if frame.kind == ELIF_KW:
+            parent.branches.append((children[0], children[1:]))
+            parent.branches.extend(frame.branches)
+    elif mode == ELSE:
+        if frame.kind == ELSE_KW:
+            parent.orelse = children
+
+def synchronize(terminals, module_index):
     """
-    Flattens a nested logical condition 'C' node into a flat list of operands and operators.
-
-    Args:
-        condition_node (list): The 'C' node as a nested list.
+    Finds the end of the module starting at module_index, i.e. the next comma
+    that is not nested in braces or brackets of the module. Unmatched closing
+    braces or brackets, e.g. of a module that misses its opening brace, are
+    skipped.
 
     Returns:
-        list: A flattened list of operands and operators.
+        The index of the token after the comma or None if no other module follows.
     """
-    flattened = []
-
-    def traverse(node):
-        if not isinstance(node, list) or not node:
-            return
-        node_type = node[0]
-        if node_type == 'C':
-            # Traverse all children
-            for child in node[1:]:
-                traverse(child)
-        elif node_type in ("C'", "C''"):
-            for child in node[1:]:
-                traverse(child)
-        else:
-            # Append the node if it's an operand or operator
-            flattened.append(node)
-
-    traverse(condition_node)
-    return flattened
-
-def flatten_expression(expression_node):
-    """
-    Flattens a nested arithmetic expression 'E' node into a flat list of operands and operators.
-
-    Args:
-        expression_node: The expression node to flatten.
-
-    Returns:
-        list: A flattened list representing the expression.
-    """
-    flattened = []
-
-    def traverse(node):
-        if isinstance(node, list):
-            for child in node:
-                traverse(child)
-        elif(not node in ['E', "E'"]):
-            flattened.append(node)
-
-    traverse(expression_node)
-    return flattened
-
-def remove_symbols(module):
-    ind = 0
-    while ind < len(module):
-        if isinstance(module[ind], list) and module[ind][0].startswith("<SYMBOL"):
-            module.pop(ind)
-        else:
-            ind += 1
+    depth = 0
+    index = module_index
+    while index < len(terminals):
+        terminal = terminals[index]
+        if terminal == LBRACE or terminal == LBRACKET:
+            depth += 1
+        elif (terminal == RBRACE or terminal == RBRACKET) and depth > 0:
+            depth -= 1
+        elif terminal == COMMA and depth == 0:
+            return index + 1
+        index += 1
+    return None
 
-def fix_name(module):
-    if module[0] == "M":
-        module_name = module[1][0][13:-1]
-        module[0] = module_name
-        module.pop(1)
+def is_terminal(symbol):
+    return symbol not in NONTERMINALS
 
-def remove_A_prime(parse_tree):
-    """
-    Recursively removes all 'A'' expressions from the parse tree.
-    If an 'A'' node contains children (e.g., an 'A' and another 'A''), it replaces the 'A'' node with its children.
-    If an 'A'' node is empty or only contains an empty 'A'', it removes the 'A'' node.
-    """
-    if not isinstance(parse_tree, list):
-        return parse_tree  # Base case: not a list, return as is
-
-    i = 0
-    while i < len(parse_tree):
-        node = parse_tree[i]
-        if isinstance(node, list):
-            if node[0] == "A'":
-                # Process the 'A'' node
-                if len(node) > 1:
-                    # Recursively process the children before inserting
-                    remove_A_prime(node[1:])
-                    # Replace the 'A'' node with its children
-                    parse_tree[i:i+1] = node[1:]
-                    # Do not increment i, as we need to process the new elements at position i
-                else:
-                    # 'A'' node is empty, remove it
-                    del parse_tree[i]
-                    # Do not increment i
-            else:
-                # Recursively process the child node
-                remove_A_prime(node)
-                i += 1
-        else:
-            # Not a list, move to the next element
-            i += 1
-    return parse_tree
+def count_tree_nodes(node):
+    """Number of nodes of a parse tree, including the leaves."""
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node[1:])
+    return count
 
-def unnest_modules(parse_tree):
+def parse_tree_to_ast(node):
     """
-    Unnests a parse tree by extracting all sublists starting with 'M' or 'M''.
-    Nested modules are removed from their parent nodes to avoid duplicates.
-    The function modifies the parse tree in place.
-    
-    Args:
-        parse_tree: The original parse tree as a nested list.
-    
-    Returns:
-        A list of all modules ('M' and 'M'') extracted from the parse tree.
+    Converts a parse tree returned by ll1_parse to an AST by replaying the
+    semantic actions that ll1_parse(tokens, build_ast=True) runs while parsing.
     """
-    result = []
-
-    def recurse(node):
-        if not isinstance(node, list):
-            return node  # Base case: return the node as is
-
-        i = 0
-        while i < len(node):
-            child = node[i]
-            if isinstance(child, list) and child and child[0] in ('M', "M'"):
-                # Extract the module
-                extracted_module = child
-                # Remove nested modules from the extracted module
-                extracted_module = remove_nested_modules(extracted_module)
-                # Add the extracted module to the result
-                result.append(extracted_module)
-                # Remove the module from the current node
-                del node[i]
-                # Do not increment i since the list has shrunk
-            else:
-                # Recursively process the child node
-                recurse(child)
-                i += 1  # Increment i after processing
-
-    def remove_nested_modules(node):
-        """
-        Recursively removes nested modules from the node.
-        Returns the node with nested modules removed.
-        """
-        if not isinstance(node, list):
-            return node
-        cleaned_node = []
-        for child in node:
-            if isinstance(child, list) and child and child[0] in ('M', "M'"):
-                # Extract the nested module
-                nested_module = remove_nested_modules(child)
-                # Add the nested module to the result
-                result.append(nested_module)
-            else:
-                # Clean the child node
-                cleaned_child = remove_nested_modules(child)
-                cleaned_node.append(cleaned_child)
-        return cleaned_node
-
-    # Start the unnesting process
-    recurse(parse_tree)
-
+    with span("ast", "parser") as args:
+        result = replay_actions(node)
+        if args is not None:
+            args["nodes"] = count_nodes(result)
     return result
+
+def replay_actions(node):
+    """The conversion of parse_tree_to_ast."""
+    root = Frame(ROOT, None, None, None)
+    stack = [(node, root)]
+    while stack:
+        node, frame = stack.pop()
+        if node is None:
+            # all children of the frame are processed
+            reduce(frame)
+        elif node[0] in SYMBOL_IDS:
+            symbol = SYMBOL_IDS[node[0]]
+            mode = child_mode(frame, symbol)
+            if mode is not None:
+                # the first terminal of the production, if the first child is a terminal
+                kind = None
+                if len(node) > 1 and node[1][0] not in SYMBOL_IDS:
+                    kind = SYMBOL_IDS.get(get_non_terminal(node[1][0]), UNKNOWN)
+                frame = Frame(mode, symbol, kind, frame)
+                stack.append((None, frame))
+            for child in reversed(node[1:]):
+                stack.append((child, frame))
+        else:
+            token = node[0]
+            shift(frame, SYMBOL_IDS.get(get_non_terminal(token), UNKNOWN), token)
+    return root.children[0]
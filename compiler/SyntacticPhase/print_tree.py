@@ -1,4 +1,8 @@
+from .ast_nodes import Node, to_list
+
 def print_tree(linked_list, indent_level=0):
+    if isinstance(linked_list, Node):
+        linked_list = to_list(linked_list)
     base_indent = "    " 
     branch_indent = "│   " if indent_level > 0 else ""
     item_indent = "├── "
@@ -1,7 +1,10 @@
 from graphviz import Digraph
 from .parser import PARSE_TABLE
+from .ast_nodes import Node, to_list
 
 def visualize_ast(ast, filename='ast'):
+    if isinstance(ast, Node):
+        ast = to_list(ast)
     dot = Digraph(comment='Parse Tree')
     node_id = 0
 
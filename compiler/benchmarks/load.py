@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from benchmarks.specs import generate_spec
+from torchify.server import DEFAULT_PORT, percentile
+
+async def read_response(reader):
+    """
+    Reads an HTTP/1.1 response with a chunked or Content-Length body.
+
+    Returns:
+        (status, headers, body) with lower case header names.
+    """
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            data = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            body += data[:-2]
+    else:
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers, body
+
+async def request(reader, writer, method, path, payload=None, headers=None):
+    """Sends a request on an open connection and reads the response, see read_response."""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+    if payload is not None:
+        lines.append("Content-Type: application/json")
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    return await read_response(reader)
+
+def compile_lines(body):
+    """The JSON lines of the response to a compile request, one per phase."""
+    return [json.loads(line) for line in body.decode().splitlines()]
+
+async def client(host, port, payloads, latencies, errors):
+    """Sends the compile requests one after another over a single connection."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for payload in payloads:
+            start = time.perf_counter()
+            status, _, body = await request(reader, writer, "POST", "/compile", payload)
+            latencies.append(time.perf_counter() - start)
+            # only the last line, the diagnostics, reports errors
+            if status != 200 or "error" in json.loads(body[body.rindex(b"\n", 0, -1) + 1:]):
+                errors.append(status)
+    finally:
+        writer.close()
+
+async def run_load(host, port, source, requests=200, concurrency=8, unique=False, options=None):
+    """
+    Sends requests compile requests from concurrency connections at once.
+
+    Args:
+        source: The program that is compiled.
+        unique: Append a different number of newlines to the program of every
+            request, so that no request is answered by the compile cache.
+        options: Options of the compile requests.
+
+    Returns:
+        A dict of the number of requests, failed requests, the total time,
+        the requests per second and the latency percentiles in seconds.
+    """
+    payloads = [{"source": source + "\n" * index if unique else source, "options": options or {}} for index in range(requests)]
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, payloads[index::concurrency], latencies, errors) for index in range(concurrency)))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "failed": len(errors),
+        "seconds": seconds,
+        "requests_per_second": requests / seconds if seconds > 0 else float("inf"),
+        "p50": percentile(latencies, 0.5),
+        "p90": percentile(latencies, 0.9),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else None,
+    }
+
+def format_load(result):
+    lines = [f"{result['requests']} requests ({result['failed']} failed) in {result['seconds']:.2f} s, {result['requests_per_second']:.1f} requests/s"]
+    lines.append("latency " + ", ".join(f"{name} {result[name] * 1000:.2f}ms" for name in ("p50", "p90", "p99", "max") if result[name] is not None))
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-tests a running compile service (torchify serve).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="number of connections sending requests at the same time")
+    parser.add_argument("--program", help="the program to compile, a generated one by default")
+    parser.add_argument("--modules", type=int, default=50, help="number of layers of the generated program")
+    parser.add_argument("--unique", action="store_true", help="make every program unique to bypass the compile cache")
+    args = parser.parse_args(argv)
+
+    if args.program:
+        with open(args.program) as file:
+            source = file.read()
+    else:
+        source = generate_spec(modules=args.modules)
+    result = asyncio.run(run_load(args.host, args.port, source, args.requests, args.concurrency, args.unique))
+    print(format_load(result))
+    return 1 if result["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from LexicalPhase import Lexer
+from SyntacticPhase import ll1_parse, parse_tree_to_ast
+from CodeGenerationPhase import process_ast, generate_code
+from CodeGenerationPhase.codegenerator import CODE_PARAMS
+from CodeGenerationPhase.optimization import optimize
+from benchmarks.specs import generate_spec
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Every case scales one axis of the generated programs
+CASES = {
+    'modules': dict(modules=2000, statements=2),
+    'statements': dict(modules=20, statements=500),
+    'chain': dict(modules=4, chain=2000),
+    'nesting': dict(modules=100, nesting=40),
+    'strings': dict(modules=100, string_length=20000),
+}
+
+def scaled(params, scale):
+    return {name: max(1, int(value * scale)) if value else value for name, value in params.items()}
+
+def stages(source):
+    """
+    Returns the stages of the compiler for a program as (name, function, input,
+    unit, items) tuples, every function takes the result of its input stage
+    (None for the lexer).
+
+    parse times ll1_parse with build_ast=True as compile_source runs it, tree
+    and ast time the parse tree and its conversion by parse_tree_to_ast. The
+    optimizer and the code generator are left out for programs that cannot be
+    compiled to PyTorch code.
+    """
+    def lex(_):
+        lexer = Lexer()
+        lexer(source)
+        return lexer.token_stream
+
+    def parser(build_ast):
+        def parse(tokens):
+            valid, result = ll1_parse(tokens, build_ast=build_ast)
+            if not valid:
+                raise ValueError("the generated program is invalid")
+            return result
+        return parse
+
+    def optimize_code(ast):
+        layers = process_ast(ast)
+        code = [layer for layer in layers if layer['type'] == 'code']
+        optimize(dict(code[0]['assignments']), CODE_PARAMS)
+        return ast
+
+    with redirect_stdout(io.StringIO()):
+        tokens = lex(None)
+        ast = parser(True)(tokens)
+    layers = process_ast(ast)
+    result = [
+        ('lex', lex, None, 'chars', len(source)),
+        ('parse', parser(True), 'lex', 'tokens', len(tokens)),
+        ('tree', parser(False), 'lex', 'tokens', len(tokens)),
+        ('ast', parse_tree_to_ast, 'tree', 'tokens', len(tokens)),
+    ]
+    if layers is not None:
+        definitions = sum(len(layer['assignments']) for layer in layers if layer['type'] == 'code')
+        if definitions:
+            result.append(('optimize', optimize_code, 'parse', 'definitions', definitions))
+        result.append(('generate', generate_code, 'parse', 'modules', len(layers)))
+    return result
+
+def measure(source, repeat):
+    """
+    Runs every stage repeat times and measures its peak memory in an extra run.
+
+    Returns:
+        A dict mapping every stage to its fastest time in seconds, its peak
+        memory in bytes, the unit of its input and the number of input items.
+    """
+    results = {}
+    outputs = {None: None}
+    with redirect_stdout(io.StringIO()):
+        for name, function, input_stage, unit, items in stages(source):
+            value = outputs[input_stage]
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                output = function(value)
+                times.append(time.perf_counter() - start)
+            tracemalloc.start()
+            function(value)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = {'seconds': min(times), 'peak_bytes': peak, 'unit': unit, 'items': items}
+            outputs[name] = output
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the (case, stage, seconds, baseline seconds) of every stage that is
+    more than tolerance (e.g. 0.25 for 25%) slower than its baseline.
+    """
+    regressions = []
+    for case, stages_results in results.items():
+        if case not in baseline or baseline[case]['params'] != stages_results['params']:
+            continue
+        for stage, result in stages_results['stages'].items():
+            reference = baseline[case]['stages'].get(stage)
+            if reference is not None and result['seconds'] > reference['seconds'] * (1 + tolerance):
+                regressions.append((case, stage, result['seconds'], reference['seconds']))
+    return regressions
+
+def format_results(results, baseline):
+    lines = [f"{'case':<12}{'stage':<10}{'time':>12}{'throughput':>26}{'peak memory':>14}{'baseline':>10}"]
+    for case, case_results in results.items():
+        for stage, result in case_results['stages'].items():
+            seconds = result['seconds']
+            rate = f"{result['items'] / seconds:,.0f} {result['unit']}/s" if seconds > 0 else "-"
+            ratio = ""
+            reference = baseline.get(case, {}).get('stages', {}).get(stage)
+            if reference is not None and reference['seconds'] > 0 and baseline[case]['params'] == case_results['params']:
+                ratio = f"{seconds / reference['seconds']:.2f}x"
+            lines.append(f"{case:<12}{stage:<10}{seconds * 1000:>10.2f}ms{rate:>26}{result['peak_bytes'] / 2 ** 20:>11.2f}MiB{ratio:>10}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks every phase of the compiler on synthetic programs.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--scale", type=float, default=1.0, help="factor applied to the size of every case")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs, the fastest one counts")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON file with the baseline times")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown relative to the baseline")
+    parser.add_argument("--require-baseline", action="store_true", help="fail if there is no baseline, e.g. in CI")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for case in args.cases:
+        params = scaled(CASES[case], args.scale)
+        results[case] = {'params': params, 'stages': measure(generate_spec(**params), args.repeat)}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print(format_results(results, baseline))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump({**baseline, **results}, file, indent=2)
+        print(f"Saved the baseline to {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"No baseline in {args.baseline}, run with --save-baseline to create one")
+        return 1 if args.require_baseline else 0
+    regressions = compare(results, baseline, args.tolerance)
+    for case, stage, seconds, reference in regressions:
+        print(f"Regression in {case}/{stage}: {seconds * 1000:.2f}ms, baseline {reference * 1000:.2f}ms", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import random
+
+def chain_module(length):
+    """
+    A code module with a chain of length definitions, every one using the previous one.
+
+    The chain starts at the free variable n, so it is not folded to a constant
+    and every pass of the optimizer has to work on it. dim_in depends on the
+    whole chain.
+    """
+    lines = ["    code: {", "        v0 = n;"]
+    for i in range(1, length):
+        lines.append(f"        v{i} = v{i - 1} * 2 + {i % 7 + 1};")
+    lines.append(f"        dim_in = v{length - 1};")
+    lines.append("    }")
+    return "\n".join(lines)
+
+def nested_block(depth, indent):
+    """Alternately nested if and while statements around an assignment."""
+    if depth == 0:
+        return [f"{indent}x = x + 1;"]
+    keyword = "if" if depth % 2 else "while"
+    lines = [f"{indent}{keyword} (x < {depth}) {{"]
+    lines.extend(nested_block(depth - 1, indent + "    "))
+    lines.append(f"{indent}}}")
+    return lines
+
+def generate_spec(modules=10, statements=2, chain=0, nesting=0, string_length=0, seed=0):
+    """
+    Generates a synthetic Torchify program.
+
+    The program is a chain of linear and relu layers. Every axis scales one
+    part of the program independently of the others.
+
+    Args:
+        modules: Number of layers.
+        statements: Number of additional assignments in every linear layer.
+        chain: Length of the chain of dependent definitions in a code module, no code module if 0.
+        nesting: Depth of nested if and while statements in every layer. Programs
+            with control flow in layers are valid programs but cannot be compiled
+            to PyTorch code.
+        string_length: Length of a string literal assigned in every layer.
+        seed: Seed of the random sizes of the layers.
+
+    Returns:
+        The program as a string.
+    """
+    generator = random.Random(seed)
+    blocks = []
+    if chain:
+        blocks.append(chain_module(chain))
+    size = generator.randint(8, 512)
+    for i in range(modules):
+        if i % 2:
+            name = f"relu{i // 2}"
+            lines = []
+        else:
+            name = f"linear{i // 2}"
+            next_size = generator.randint(8, 512)
+            # the first layer takes dim_in from the code module
+            lines = [] if i == 0 and chain else [f"        dim_in = {size};"]
+            lines.append(f"        dim_out = {next_size};")
+            size = next_size
+            for j in range(statements):
+                lines.append(f"        s{j} = {j} * {generator.randint(1, 9)} + {generator.randint(1, 9)};")
+        if string_length:
+            lines.append(f'        name = "{"a" * string_length}";')
+        if nesting:
+            lines.extend(nested_block(nesting, "        "))
+        blocks.append(f"    {name}: {{\n" + "".join(line + "\n" for line in lines) + "    }")
+    return "{\n" + ",\n".join(blocks) + "\n}\n"
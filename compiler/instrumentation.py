@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Returned by span if profiling is disabled, entering it yields None
+DISABLED = nullcontext()
+
+_profiler = None
+
+class Profiler:
+    """
+    Records the spans of the compiler phases.
+
+    Every span has a name, a category (the phase), its start time and duration
+    in seconds relative to the creation of the profiler and a dictionary of
+    counters (e.g. tokens, nodes or changed definitions).
+
+    Attributes:
+        events: The recorded spans as dictionaries, in the order they ended.
+    """
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+
+    @contextmanager
+    def span(self, name, category):
+        """Records the time spent in the with block, yields the dictionary of counters of the span."""
+        args = {}
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, category, start, time.perf_counter() - start, args)
+
+    def add(self, name, category, start, duration, args=None):
+        """Records a span that started at start (a time.perf_counter() value)."""
+        self.events.append({
+            "name": name,
+            "category": category,
+            "start": start - self.origin,
+            "duration": duration,
+            "args": args or {},
+        })
+
+    def summary(self):
+        """Sums up the durations and the counters of all spans with the same name."""
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event["name"], {"category": event["category"], "calls": 0, "seconds": 0.0})
+            total["calls"] += 1
+            total["seconds"] += event["duration"]
+            for key, value in event["args"].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    total[key] = max(total.get(key, 0), value) if key.startswith("max_") else total.get(key, 0) + value
+        return totals
+
+    def format_summary(self):
+        lines = [f"{'span':<36}{'calls':>6}{'time':>12}  counters"]
+        for name, total in self.summary().items():
+            counters = ", ".join(f"{key} {value:,}" for key, value in total.items() if key not in ("category", "calls", "seconds"))
+            lines.append(f"{name:<36}{total['calls']:>6}{total['seconds'] * 1000:>10.3f}ms  {counters}")
+        return "\n".join(lines)
+
+    def to_json(self):
+        return {"events": self.events, "summary": self.summary()}
+
+    def to_chrome_trace(self):
+        """The spans as complete events of the Chrome trace event format (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        tid = threading.get_ident()
+        return {"traceEvents": [{
+            "name": event["name"],
+            "cat": event["category"],
+            "ph": "X",
+            "ts": event["start"] * 1e6,
+            "dur": event["duration"] * 1e6,
+            "pid": pid,
+            "tid": tid,
+            "args": event["args"],
+        } for event in self.events], "displayTimeUnit": "ms"}
+
+    def write_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_json(), file, indent=2)
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_chrome_trace(), file)
+
+def active():
+    """Returns the active profiler or None if profiling is disabled."""
+    return _profiler
+
+def span(name, category):
+    """
+    Records a span with the active profiler.
+
+    The phases of the compiler use it as
+
+        with span("lex", "lexer") as args:
+            ...
+            if args is not None:
+                args["tokens"] = ...
+
+    so that nothing is counted if profiling is disabled.
+    """
+    if _profiler is None:
+        return DISABLED
+    return _profiler.span(name, category)
+
+def enable(profiler=None):
+    """Enables profiling and returns the active profiler."""
+    global _profiler
+    _profiler = profiler or Profiler()
+    return _profiler
+
+def disable():
+    global _profiler
+    _profiler = None
+
+@contextmanager
+def profile():
+    """Enables profiling within the with block, yields the profiler."""
+    previous = _profiler
+    profiler = enable()
+    try:
+        yield profiler
+    finally:
+        if previous is not None:
+            enable(previous)
+        else:
+            disable()
+
+class HighWaterList(list):
+    """A list that remembers its maximum length, used as the stack of the parser while profiling."""
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.max_length = len(self)
+
+    def append(self, item):
+        super().append(item)
+        if len(self) > self.max_length:
+            self.max_length = len(self)
+
+    def extend(self, items):
+        super().extend(items)
+        if len(self) > self.max_length:
+            self.max_length = len(self)
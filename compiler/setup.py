@@ -3,7 +3,10 @@ from setuptools import setup, find_packages
 setup(
     name='torchify',
     version='0.1',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
+    py_modules=['instrumentation'],
     install_requires=[],
-    entry_points={},
+    entry_points={
+        'console_scripts': ['torchify=torchify.cli:main'],
+    },
 )
@@ -1,6 +1,9 @@
-from LexicalPhase import Lexer
-from SyntacticPhase import ll1_parse, parse_tree_to_ast, print_tree
-from CodeGenerationPhase.codegenerator import generate_code
+import sys
+from SyntacticPhase import print_tree
+from torchify.cache import CompileCache
+from torchify.pipeline import lex_stage, parse_stage, generate_stage
+# The programs are only cached with --cache
+cache = CompileCache() if "--cache" in sys.argv[1:] else None
 for i in range(17, 21):
     with open(f'compiler/tests/TestPrograms/prog{i}.txt', 'r') as file:
         file_contents = file.read()
@@ -8,18 +11,17 @@ for i in range(17, 21):
     print(f"===================================================INPUT STREAM {i}===================================================")
     print(file_contents)   
     print(f"===================================================TOKEN STREAM {i}===================================================")
-    lexer = Lexer(panic_mode=True)
-    lexer(file_contents)
-    print(lexer.token_stream)
-    valid, parse_tree = ll1_parse(lexer.token_stream)
+    # The stages run one by one so that the token stream is printed before the messages of the parser
+    tokens = lex_stage(file_contents, cache)
+    print(tokens)
+    valid, ast, _ = parse_stage(file_contents, tokens, cache)
     if valid:
-        # print(f"==================================================== PARSE TREE {i} =================================================")
-        # print_tree(parse_tree)
-        ast = parse_tree_to_ast(parse_tree)
         print(f"======================================================== AST {i} =====================================================")
         print_tree(ast)
         print(f"==================================================== GENERATED CODE {i} =================================================")
-        pytorch_code = generate_code(ast)
-        if pytorch_code is not None:
-            print(pytorch_code)
-    print("=========================================================END==========================================================")
\ No newline at end of file
+        code = generate_stage(file_contents, ast, cache)
+        if code is not None:
+            print(code)
+    print("=========================================================END==========================================================")
+if cache is not None:
+    print(cache.format_stats())
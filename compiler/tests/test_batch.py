@@ -0,0 +1,56 @@
+import os
+from torchify.batch import collect_sources, compile_files, format_summary
+from torchify.cli import main
+
+VALID = "{ linear0: { dim_in = 4; dim_out = 2; } }"
+INVALID = "{ linear0: { dim_in = ; } }"
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write(text)
+
+def test_collect_sources(tmp_path):
+    write(str(tmp_path / "specs" / "a.txt"), VALID)
+    write(str(tmp_path / "specs" / "sub" / "a.txt"), VALID)
+    write(str(tmp_path / "specs" / "notes.md"), "")
+    write(str(tmp_path / "b.txt"), VALID)
+    sources = collect_sources([str(tmp_path / "specs"), str(tmp_path / "b.txt")])
+    assert [name for _, name in sources] == ["a.txt", os.path.join("sub", "a.txt"), "b.txt"]
+
+def test_compile_files(tmp_path):
+    write(str(tmp_path / "specs" / "good.txt"), VALID)
+    write(str(tmp_path / "specs" / "bad.txt"), INVALID)
+    sources = collect_sources([str(tmp_path / "specs")]) + [(str(tmp_path / "missing.txt"), "missing.txt")]
+    output_dir = str(tmp_path / "out")
+    results = compile_files(sources, output_dir, jobs=2)
+    # the results are in the order of the sources and errors do not stop the other files
+    assert [os.path.basename(result.source) for result in results] == ["bad.txt", "good.txt", "missing.txt"]
+    assert results[0].error == "invalid program"
+    assert "Error during Parsing" in results[0].messages
+    assert results[1].error is None
+    assert results[2].error.startswith("FileNotFoundError")
+    with open(os.path.join(output_dir, "good.py")) as file:
+        assert "self.linear0 = nn.Linear(4, 2)" in file.read()
+    assert sorted(os.listdir(output_dir)) == ["good.py"]
+    assert "compiled 1 of 3 files" in format_summary(results, 1.0)
+
+def test_serial_and_parallel_outputs_match(tmp_path):
+    for i in range(6):
+        write(str(tmp_path / "specs" / f"s{i}.txt"), f"{{ linear0: {{ dim_in = {i + 1}; dim_out = 2; }}, relu0: {{ }} }}")
+    sources = collect_sources([str(tmp_path / "specs")])
+    compile_files(sources, str(tmp_path / "serial"), jobs=1)
+    compile_files(sources, str(tmp_path / "parallel"), jobs=3, cache_dir=str(tmp_path / "cache"), sequential=True)
+    for _, name in sources:
+        name = name.replace(".txt", ".py")
+        with open(tmp_path / "parallel" / name) as parallel:
+            assert "nn.Sequential" in parallel.read()
+    assert len(os.listdir(tmp_path / "serial")) == 6
+
+def test_compile_command(tmp_path, capsys):
+    write(str(tmp_path / "good.txt"), VALID)
+    write(str(tmp_path / "bad.txt"), INVALID)
+    output_dir = str(tmp_path / "out")
+    assert main(["compile", str(tmp_path / "good.txt"), "-o", output_dir, "--no-cache"]) == 0
+    assert main(["compile", str(tmp_path), "-o", output_dir, "--cache-dir", str(tmp_path / "cache"), "-j", "2"]) == 1
+    assert "compiled 1 of 2 files" in capsys.readouterr().err
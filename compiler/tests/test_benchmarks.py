@@ -0,0 +1,50 @@
+import json
+from benchmarks.specs import generate_spec
+from benchmarks.run import CASES, compare, main, measure, scaled
+from torchify.pipeline import compile_source
+
+def test_generated_specs_are_valid():
+    for params in CASES.values():
+        result = compile_source(generate_spec(**scaled(params, 0.01)), panic_mode=False)
+        assert result.valid
+        # layers with control flow cannot be compiled to PyTorch code
+        assert (result.code is None) == bool(params.get('nesting'))
+
+def test_generate_spec_axes():
+    assert generate_spec(modules=4) == generate_spec(modules=4)
+    assert generate_spec(modules=4).count(": {") == 4
+    assert "v9 = v8 * 2" in generate_spec(modules=2, chain=10)
+    assert generate_spec(modules=1, nesting=3).count("while") == 1
+    assert '"' + "a" * 100 + '"' in generate_spec(modules=1, string_length=100)
+
+def test_measure():
+    results = measure(generate_spec(modules=6, chain=5), repeat=1)
+    assert list(results) == ['lex', 'parse', 'tree', 'ast', 'optimize', 'generate']
+    assert results['optimize']['items'] == 6
+    assert all(result['seconds'] > 0 and result['peak_bytes'] > 0 for result in results.values())
+
+def test_compare():
+    baseline = {'chain': {'params': {'chain': 10}, 'stages': {'lex': {'seconds': 1.0}, 'parse': {'seconds': 1.0}}}}
+    results = {'chain': {'params': {'chain': 10}, 'stages': {'lex': {'seconds': 1.2}, 'parse': {'seconds': 1.5}}}}
+    assert compare(results, baseline, 0.25) == [('chain', 'parse', 1.5, 1.0)]
+    # baselines of a different size are ignored
+    results['chain']['params'] = {'chain': 20}
+    assert compare(results, baseline, 0.25) == []
+
+def test_baseline(tmp_path, capsys):
+    path = str(tmp_path / "baseline.json")
+    args = ["--cases", "modules", "--scale", "0.005", "--repeat", "1", "--baseline", path]
+    # without a baseline nothing is compared, unless one is required
+    assert main(args) == 0
+    assert main(args + ["--require-baseline"]) == 1
+    assert main(args + ["--save-baseline"]) == 0
+    with open(path) as file:
+        baseline = json.load(file)
+    assert set(baseline['modules']['stages']) == {'lex', 'parse', 'tree', 'ast', 'generate'}
+    # every stage is slower than a baseline of 0 seconds
+    for stage in baseline['modules']['stages'].values():
+        stage['seconds'] = 0.0
+    with open(path, "w") as file:
+        json.dump(baseline, file)
+    assert main(args) == 1
+    assert "Regression in modules/lex" in capsys.readouterr().err
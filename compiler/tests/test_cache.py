@@ -0,0 +1,75 @@
+import os
+from torchify.cache import CompileCache
+from torchify.pipeline import compile_source
+
+PROGRAM = "{ code: { dim_in = 4 * 4; }, linear0: { dim_out = 10; }, relu0: { } }"
+
+def test_compile_source():
+    result = compile_source(PROGRAM)
+    assert result.valid
+    assert result.tokens[0] == "<SYMBOL_LBRACE, {>"
+    assert "self.linear0 = nn.Linear(16, 10)" in result.code
+    assert result.diagnostics == []
+
+def test_cache_hits(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    first = compile_source(PROGRAM, cache)
+    assert cache.stats == {stage: {'hits': 0, 'misses': 1} for stage in ('tokens', 'ast', 'code')}
+    second = compile_source(PROGRAM, cache)
+    assert second == first
+    assert all(cache.stats[stage]['hits'] == 1 for stage in ('tokens', 'ast', 'code'))
+    # Different code generation options reuse the tokens and the AST
+    third = compile_source(PROGRAM, cache, sequential=True)
+    assert "nn.Sequential" in third.code
+    assert cache.stats['ast'] == {'hits': 2, 'misses': 1}
+    assert cache.stats['code'] == {'hits': 1, 'misses': 2}
+
+def test_cache_is_shared(tmp_path):
+    compile_source(PROGRAM, CompileCache(str(tmp_path)))
+    cache = CompileCache(str(tmp_path))
+    assert cache.size > 0
+    compile_source(PROGRAM, cache)
+    assert cache.stats['code'] == {'hits': 1, 'misses': 0}
+
+def test_invalid_program(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    for _ in range(2):
+        result = compile_source("{ linear0: { dim_in = ; } }", cache)
+        assert not result.valid and result.code is None
+        assert result.diagnostics
+    assert cache.stats['ast'] == {'hits': 1, 'misses': 1}
+    assert cache.stats['code'] == {'hits': 0, 'misses': 0}
+
+# The messages of the stages are printed on a hit as well
+def test_cached_messages(tmp_path, capsys):
+    cache = CompileCache(str(tmp_path))
+    outputs = []
+    for _ in range(2):
+        result = compile_source("{ linear0: { dim_out = 10 $; } }", cache)
+        assert result.code is None
+        outputs.append(capsys.readouterr().out)
+    assert 'invalid token "$"' in outputs[0]
+    assert "Missing parameter 'dim_in' for linear layer: linear0" in outputs[0]
+    assert outputs[1] == outputs[0]
+    assert all(cache.stats[stage]['hits'] == 1 for stage in ('tokens', 'ast', 'code'))
+
+def test_eviction(tmp_path):
+    cache = CompileCache(str(tmp_path), max_bytes=0)
+    cache.put("a", "x" * 100)
+    assert os.listdir(tmp_path) == []
+    cache = CompileCache(str(tmp_path), max_bytes=250)
+    cache.put("a", "a" * 100)
+    cache.put("b", "b" * 100)
+    os.utime(cache.path("a"), (0, 0))
+    os.utime(cache.path("b"), (1, 1))
+    # a was used least recently
+    assert cache.get('code', "a") == (True, "a" * 100)
+    cache.put("c", "c" * 100)
+    assert sorted(os.listdir(tmp_path)) == ["a.pickle", "c.pickle"]
+    assert cache.get('code', "b") == (False, None)
+
+def test_corrupt_entry(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    with open(cache.path("a"), "wb") as file:
+        file.write(b"not a pickle")
+    assert cache.get('tokens', "a") == (False, None)
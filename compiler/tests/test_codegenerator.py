@@ -0,0 +1,68 @@
+from LexicalPhase import Lexer
+from SyntacticPhase import ll1_parse
+from CodeGenerationPhase import generate_code, process_ast
+from CodeGenerationPhase.codegenerator import emit_layers
+
+def load_ast(source):
+    lexer = Lexer()
+    lexer(source)
+    valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    assert valid
+    return ast
+
+FFNN = """{
+    code: { dim_in = 28 * 28; },
+    flatten0: { },
+    linear0: { dim_out = 128; },
+    relu0: { },
+    linear1: { dim_in = 128; dim_out = 10; }
+}"""
+
+def test_sequential():
+    code = generate_code(load_ast(FFNN), sequential=True, inplace=True)
+    compile(code, "<generated>", "exec")
+    lines = code.splitlines()
+    assert "class Network(nn.Sequential):" in lines
+    # The variables of the code module are defined before the layers are created
+    assert lines.index("        dim_in = 784") < lines.index("        super(Network, self).__init__(OrderedDict([")
+    assert "            ('linear0', nn.Linear(784, 128))," in lines
+    assert "            ('relu0', nn.ReLU(inplace=True))," in lines
+    assert "def forward" not in code
+
+def test_sequential_shapes():
+    source = "{ input: { features = 784; }, linear0: { dim_out = 10; }, sigmoid0: { } }"
+    code = generate_code(load_ast(source), sequential=True)
+    assert "            ('linear0', nn.Linear(784, 10)), # (10)" in code.splitlines()
+
+def test_sequential_duplicate_names():
+    # nn.Sequential needs unique names, the forward is annotated instead
+    source = "{ linear0: { dim_in = 4; dim_out = 4; }, relu0: { }, linear0: { dim_in = 4; dim_out = 4; } }"
+    code = generate_code(load_ast(source), sequential=True)
+    compile(code, "<generated>", "exec")
+    assert "class Network(nn.Module):" in code
+    assert "    def forward(self, x: torch.Tensor) -> torch.Tensor:" in code
+
+def test_sequential_fused():
+    source = "{ linear0: { dim_in = 4; dim_out = 8; }, batchnorm1d0: { num_features = 8; }, relu0: { } }"
+    code = generate_code(load_ast(source), sequential=True, fuse=True)
+    compile(code, "<generated>", "exec")
+    assert "            ('relu0', nn.ReLU(inplace=True))," in code.splitlines()
+    # nn.Sequential calls the batchnorm until fuse deletes it
+    assert "def forward" not in code
+    assert "        del self.batchnorm1d0" in code.splitlines()
+
+def test_default_code():
+    code = generate_code(load_ast(FFNN))
+    assert "class Network(nn.Module):" in code
+    assert "inplace" not in code
+    assert "        x = self.linear0(x)" in code.splitlines()
+
+# A layer that occurs twice in the list, e.g. a module cached by a CompileSession, gets the shape of each position
+def test_repeated_layer_object():
+    source = "{ input: { channels = 4; height = 8; width = 8; }, batchnorm2d0: { }, conv2d0: { out_channels = 8; kernel_size = 1; }, batchnorm2d0: { } }"
+    layers = process_ast(load_ast(source))
+    layers[3] = layers[1]
+    code = emit_layers(layers)
+    assert code == generate_code(load_ast(source))
+    assert "        self.batchnorm2d0 = nn.BatchNorm2d(4)" in code.splitlines()
+    assert "        self.batchnorm2d0 = nn.BatchNorm2d(8)" in code.splitlines()
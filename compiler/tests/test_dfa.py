@@ -50,3 +50,17 @@ def test_immediate_rejection(sample_automaton):
     sample_automaton('x')  # Invalid transition from the start
     assert sample_automaton.current_state == 'rej'
     assert sample_automaton.status() == -1  # Reject immediately
+
+# Characters with the same transitions share one character class
+def test_char_classes():
+    dfa = DFA("digits", {'q0', 'q1'}, {('q0', '0123456789'): 'q1', ('q1', '0123456789'): 'q1'}, 'q0', {'q1'})
+    assert len({dfa.classes[ch] for ch in '0123456789'}) == 1
+    assert dfa.num_classes == 2
+    assert dfa('7') == 1
+    assert dfa('x') == -1
+
+# The compact representation still exposes the expanded transitions
+def test_transitions(sample_automaton):
+    assert sample_automaton.transitions == {('q0', 'a'): 'q1', ('q1', 'b'): 'q2', ('q2', 'c'): 'q3'}
+    assert sample_automaton.accept_states == {'q3'}
+    assert sample_automaton.states == {'q0', 'q1', 'q2', 'q3', 'rej'}
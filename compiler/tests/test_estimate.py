@@ -0,0 +1,54 @@
+import os
+import sys
+import pytest
+from CodeGenerationPhase import process_ast
+from CodeGenerationPhase.shapes import ShapeError
+from CodeGenerationPhase.estimate import estimate_cost, format_cost
+from torchify.cli import load_layers, main
+
+def program_path(i):
+    return os.path.join(os.path.dirname(__file__), "TestPrograms", f"prog{i}.txt")
+
+def test_alexnet_cost():
+    cost = estimate_cost(load_layers(program_path(12)), (3, 224, 224))
+    layers = {layer.name: layer for layer in cost.layers}
+    assert layers["conv2d0"].params == 64 * 3 * 11 * 11 + 64
+    assert layers["conv2d0"].macs == 64 * 55 * 55 * 3 * 11 * 11
+    assert layers["linear0"].params == 9216 * 4096 + 4096
+    assert layers["linear0"].flops == 2 * 9216 * 4096
+    assert layers["linear2"].activation_bytes == 10 * 4
+    assert cost.params == 57044810
+    assert cost.flops == 2 * cost.macs + sum(layer.flops for layer in cost.layers if layer.macs == 0)
+    # the input and the output of relu0
+    assert cost.peak_activation_bytes == 2 * 64 * 55 * 55 * 4
+
+def test_batch_size():
+    layers = load_layers(program_path(21))
+    single = estimate_cost(layers)
+    batch = estimate_cost(layers, batch_size=8, dtype_bytes=2)
+    assert batch.params == single.params
+    assert batch.macs == 8 * single.macs
+    assert batch.peak_activation_bytes == 8 * single.peak_activation_bytes // 2
+    layers = {layer.name: layer for layer in single.layers}
+    # the inferred parameters are counted
+    assert layers["batchnorm2d0"].params == 2 * 32
+    assert layers["linear0"].params == 32 * 14 * 14 * 10 + 10
+
+def test_unknown_input_shape():
+    assert estimate_cost(load_layers(program_path(11))) is None
+
+def test_symbolic_input_shape():
+    with pytest.raises(ShapeError, match="has to be constant"):
+        estimate_cost(load_layers(program_path(11)), ("size", 28, 28))
+
+def test_estimate_command(capsys):
+    assert main(["estimate", program_path(10), "--input-shape", "1,28,28", "--batch-size", "4"]) == 0
+    output = capsys.readouterr().out
+    assert "batch size 4" in output
+    assert "linear0" in output
+    assert main(["estimate", program_path(11)]) == 1
+    assert main(["estimate", program_path(11), "--input-shape", "1x32x32"]) == 1
+    assert "shape error in layer linear0" in capsys.readouterr().err
+
+def test_no_torch():
+    assert "torch" not in sys.modules
@@ -0,0 +1,73 @@
+from LexicalPhase import Lexer
+from SyntacticPhase import ll1_parse
+from CodeGenerationPhase import generate_code, process_ast
+from CodeGenerationPhase.fusion import find_fusions, inplace_activations
+from CodeGenerationPhase.shapes import infer_shapes
+
+def load_ast(source):
+    lexer = Lexer()
+    lexer(source)
+    valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    assert valid
+    return ast
+
+def modules_of(source):
+    return [layer for layer in process_ast(load_ast(source)) if layer['type'] not in ('code', 'input')]
+
+NETWORK = """{
+    conv2d0: { in_channels = 3; out_channels = 8; kernel_size = 3; },
+    batchnorm2d0: { num_features = 8; },
+    relu0: { },
+    flatten0: { },
+    linear0: { dim_in = 8 * 30 * 30; dim_out = 16; },
+    batchnorm1d0: { num_features = 16; },
+    relu1: { },
+    linear1: { dim_in = 16; dim_out = 10; }
+}"""
+
+def test_find_fusions():
+    assert find_fusions(modules_of(NETWORK)) == {
+        "batchnorm2d0": ("conv2d0", "fuse_conv_bn_eval"),
+        "batchnorm1d0": ("linear0", "fuse_linear_bn_eval"),
+    }
+    # A batchnorm that does not directly follow the layer is not fused
+    assert find_fusions(modules_of("{ conv2d0: { in_channels = 3; out_channels = 8; kernel_size = 3; }, relu0: { }, batchnorm2d0: { num_features = 8; } }")) == {}
+
+def test_linear_batchnorm_rank():
+    source = "{ input: { channels = 4; length = 8; }, linear0: { dim_out = 8; }, batchnorm1d0: { num_features = 4; } }"
+    layers = process_ast(load_ast(source))
+    modules = [layer for layer in layers if layer['type'] != 'input']
+    assert find_fusions(modules, infer_shapes(layers)) == {}
+
+def test_inplace_activations():
+    # The first ReLU would overwrite the input of the network, the one after flatten a view of it
+    source = "{ relu0: { }, flatten0: { }, relu1: { }, linear0: { dim_in = 4; dim_out = 4; }, dropout0: { }, relu2: { }, relu3: { inplace = 1; } }"
+    assert inplace_activations(modules_of(source)) == {"relu2"}
+    # The outputs of sigmoid and relu are needed by their backward pass
+    source = "{ linear0: { dim_in = 4; dim_out = 4; }, sigmoid0: { }, relu0: { }, linear1: { dim_in = 4; dim_out = 4; }, relu1: { }, relu2: { } }"
+    assert inplace_activations(modules_of(source)) == {"relu1"}
+    source = "{ flatten0: { }, relu0: { }, linear0: { dim_in = 4; dim_out = 4; }, relu1: { } }"
+    assert inplace_activations(modules_of(source)) == {"relu1"}
+
+def test_fused_code():
+    code = generate_code(load_ast(NETWORK), fuse=True)
+    compile(code, "<generated>", "exec")
+    assert "from torch.nn.utils.fusion import fuse_conv_bn_eval, fuse_linear_bn_eval" in code
+    # The layers of the unfused network are kept so that its state dict can be loaded
+    assert "self.batchnorm2d0 = nn.BatchNorm2d(8)" in code
+    assert "self.relu0 = nn.ReLU(inplace=True)" in code
+    assert "self.conv2d0 = fuse_conv_bn_eval(self.conv2d0, self.batchnorm2d0)" in code
+    assert "self.linear0 = fuse_linear_bn_eval(self.linear0, self.batchnorm1d0)" in code
+    # The forward pass never fuses the network, until fuse is called it runs all layers, e.g. for training
+    assert "self.fuse()" not in code
+    unfused, fused = code.split("def forward(self, x):")[1].split("            return x\n")
+    assert unfused.splitlines()[1] == "        if not self.fused:"
+    assert "            x = self.batchnorm2d0(x)" in unfused
+    assert "self.batchnorm2d0" not in fused
+    assert "x = self.conv2d0(x) # fused with batchnorm2d0" in fused
+
+def test_unfused_code():
+    code = generate_code(load_ast(NETWORK))
+    assert "fuse" not in code
+    assert "inplace" not in code
+    assert "x = self.batchnorm2d0(x)" in code
@@ -0,0 +1,121 @@
+import os
+import pytest
+from torchify.incremental import CompileSession
+from torchify.pipeline import compile_source
+from benchmarks.specs import generate_spec
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(__file__), "TestPrograms")
+
+PROGRAM = '{\n  code: { dim_in = 4 * 4; },\n  linear0: { dim_out = 10; },\n  relu0: { },\n  linear1: { dim_in = 10; dim_out = 2; }\n}\n'
+
+def check(session, result, **options):
+    """The result of the session must be the same as that of compile_source."""
+    assert result == compile_source(session.source, **options)
+
+def edit(session, old, new):
+    start = session.source.index(old)
+    return session.edit(start, start + len(old), new)
+
+@pytest.mark.parametrize("name", sorted(name for name in os.listdir(PROGRAMS_DIR) if name.endswith(".txt")))
+def test_programs(name):
+    with open(os.path.join(PROGRAMS_DIR, name)) as file:
+        source = file.read()
+    session = CompileSession()
+    check(session, session.update(source))
+
+def test_options():
+    session = CompileSession(input_shape=(16,), sequential=True)
+    check(session, session.update(PROGRAM), input_shape=(16,), sequential=True)
+    check(session, edit(session, "dim_out = 10;", "dim_out = 12;"), input_shape=(16,), sequential=True)
+
+def test_edit_module():
+    session = CompileSession()
+    session.update(PROGRAM)
+    assert session.stats == {"relexed": 4, "reparsed": 4, "optimized": 1, "fallbacks": 0}
+    result = edit(session, "dim_out = 10;", "dim_out = 12;")
+    assert session.stats == {"relexed": 1, "reparsed": 1, "optimized": 0, "fallbacks": 0}
+    assert "self.linear0 = nn.Linear(16, 12)" in result.code
+    check(session, result)
+
+def test_edit_code_module():
+    session = CompileSession()
+    session.update(PROGRAM)
+    result = edit(session, "4 * 4", "4 * 8")
+    assert session.stats["optimized"] == 1
+    assert "self.linear0 = nn.Linear(32, 10)" in result.code
+    check(session, result)
+
+# Only the whitespace of a module changed, its tokens are still parsed
+def test_edit_whitespace():
+    session = CompileSession()
+    session.update(PROGRAM)
+    check(session, edit(session, "relu0: { }", "relu0: {\n\n}"))
+    assert session.stats["relexed"] == 1
+    assert session.stats["reparsed"] == 0
+
+def test_add_and_remove_modules():
+    session = CompileSession()
+    session.update(PROGRAM)
+    check(session, edit(session, "relu0: { },", "relu0: { }, flatten0: { }, relu1: { },"))
+    assert len(session.segments) == 6
+    # the text of the segment of relu0 did not change
+    assert session.stats["relexed"] == 2
+    check(session, edit(session, "\n  linear0: { dim_out = 10; },", ""))
+    assert len(session.segments) == 5
+    check(session, edit(session, "{\n  code", "{ relu2: { },\n  code"))
+
+@pytest.mark.parametrize("old, new", [
+    # syntax errors
+    ("dim_out = 10;", "dim_out = ;"),
+    ("relu0: { }", "relu0: { } }"),
+    # the edit changes the nesting of the following modules
+    ("relu0: { },", "relu0: {"),
+    ("relu0: { },", "relu0: { s = 'x, },"),
+    # the boundary of the next segment is removed
+    ("relu0: { },", "relu0: { }"),
+    # invalid tokens
+    ("relu0: { }", "relu0: { $ }"),
+])
+def test_invalid_edits(old, new):
+    session = CompileSession()
+    session.update(PROGRAM)
+    check(session, edit(session, old, new))
+    # the session recovers when the edit is undone
+    result = edit(session, new, old)
+    check(session, result)
+    assert result.code is not None
+    assert session.stats["fallbacks"] == 0
+
+def test_non_panic_mode():
+    session = CompileSession(panic_mode=False)
+    session.update(PROGRAM)
+    result = edit(session, "relu0: { }", "relu0: { $ }")
+    assert session.stats["fallbacks"] == 1
+    assert not result.valid
+    check(session, result, panic_mode=False)
+
+# Identical modules share their cached layer but not their inferred shapes
+def test_repeated_modules():
+    source = "{ input: { channels = 4; height = 8; width = 8; }, batchnorm2d: { }, conv2d0: { out_channels = 8; kernel_size = 1; }, batchnorm2d: { }, relu0: { } }"
+    session = CompileSession()
+    result = session.update(source)
+    check(session, result)
+    # the second batchnorm2d segment is read from the cache
+    assert session.stats["relexed"] == 4
+    assert "nn.BatchNorm2d(8)" in result.code
+    check(session, edit(session, "out_channels = 8", "out_channels = 6"))
+
+def test_control_flow():
+    session = CompileSession()
+    source = "{ linear0: { dim_in = 1; dim_out = 2; }, relu0: { if (x) { y = 1; } } }"
+    result = session.update(source)
+    assert result.valid and result.code is None
+    check(session, result)
+
+def test_generated_spec():
+    session = CompileSession()
+    source = generate_spec(modules=40, statements=2, chain=5, string_length=8)
+    check(session, session.update(source))
+    start = source.index("dim_out = ", len(source) // 2) + len("dim_out = ")
+    check(session, session.edit(start, start, "1"))
+    assert session.stats == {"relexed": 1, "reparsed": 1, "optimized": 0, "fallbacks": 0}
@@ -0,0 +1,83 @@
+import json
+import instrumentation
+from instrumentation import HighWaterList, Profiler, profile, span
+from LexicalPhase import Lexer
+from SyntacticPhase import ll1_parse, parse_tree_to_ast, count_nodes
+from CodeGenerationPhase import generate_code
+import torchify
+from torchify.cli import main
+
+PROGRAM = "{ code: { a = 2; dim_in = a * 8; }, linear0: { dim_out = 4; }, relu0: { } }"
+
+def compile_program():
+    lexer = Lexer()
+    lexer(PROGRAM)
+    valid, tree = ll1_parse(lexer.token_stream)
+    ast = parse_tree_to_ast(tree)
+    return lexer.token_stream, ast, generate_code(ast)
+
+def test_disabled():
+    assert instrumentation.active() is None
+    with span("lex", "lexer") as args:
+        assert args is None
+    compile_program()
+
+def test_phases():
+    with profile() as profiler:
+        tokens, ast, code = compile_program()
+    assert instrumentation.active() is None
+    events = {event["name"]: event for event in profiler.events}
+    assert [event["name"] for event in profiler.events] == [
+        "lex", "parse", "ast", "constant propagation", "copy propagation", "algebraic optimizations",
+        "common subexpression elimination", "dead code elimination", "optimize", "generate_code",
+    ]
+    assert events["lex"]["args"] == {"tokens": len(tokens), "token_chars": len(PROGRAM.replace(" ", ""))}
+    assert events["parse"]["args"]["tokens"] == len(tokens)
+    assert events["parse"]["args"]["max_stack"] > 2
+    assert events["ast"]["args"]["nodes"] == count_nodes(ast)
+    assert events["optimize"]["args"] == {"definitions": 2, "iterations": 2, "rewrites": 2, "remaining": 1}
+    assert events["constant propagation"]["args"] == {"pending": 2, "changes": 1}
+    assert events["generate_code"]["args"]["modules"] == 3
+    # spans are nested in time
+    optimize, generate = events["optimize"], events["generate_code"]
+    assert generate["start"] <= optimize["start"]
+    assert optimize["start"] + optimize["duration"] <= generate["start"] + generate["duration"]
+
+def test_build_ast_nodes():
+    lexer = Lexer()
+    lexer(PROGRAM)
+    with profile() as profiler:
+        valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    assert profiler.events[0]["args"]["nodes"] == count_nodes(ast)
+
+def test_summary_and_export(tmp_path):
+    profiler = Profiler()
+    profiler.add("parse", "parser", profiler.origin, 0.5, {"tokens": 10, "max_stack": 3})
+    profiler.add("parse", "parser", profiler.origin + 1, 0.25, {"tokens": 5, "max_stack": 7})
+    assert profiler.summary() == {"parse": {"category": "parser", "calls": 2, "seconds": 0.75, "tokens": 15, "max_stack": 7}}
+    trace = profiler.to_chrome_trace()["traceEvents"]
+    assert trace[1]["ph"] == "X" and trace[1]["ts"] == 1e6 and trace[1]["dur"] == 0.25e6
+    profiler.write_json(str(tmp_path / "profile.json"))
+    with open(tmp_path / "profile.json") as file:
+        assert json.load(file)["summary"]["parse"]["calls"] == 2
+
+def test_high_water_list():
+    stack = HighWaterList([1, 2])
+    stack.append(3)
+    stack.pop()
+    stack.pop()
+    stack.extend([4, 5, 6])
+    assert stack.max_length == 4
+
+def test_profile_command(tmp_path, capsys):
+    path = tmp_path / "program.txt"
+    path.write_text(PROGRAM)
+    trace = str(tmp_path / "trace.json")
+    assert main(["profile", str(path), "--trace", trace]) == 0
+    assert "dead code elimination" in capsys.readouterr().out
+    with open(trace) as file:
+        assert json.load(file)["traceEvents"][0]["name"] == "lex"
+
+# torchify re-exports the profiler that the phases report to
+def test_reexport():
+    assert torchify.instrumentation is instrumentation
@@ -1,5 +1,7 @@
+import io
 import pytest
-from LexicalPhase import Lexer
+from LexicalPhase import Lexer, Token, TokenKind, legacy_token_stream
+from LexicalPhase.split import module_boundaries, split_source
 from keyword import kwlist
 
 @pytest.fixture
@@ -393,6 +395,74 @@ def test_panic_mode(lexer):
     lexer("\'var    another")
     assert lexer.token_stream == []
 
+def test_iter_tokens(lexer):
+    tokens = list(lexer.iter_tokens("x = 1;\n  if (x)"))
+    assert tokens == [
+        Token(TokenKind.IDENTIFIER, "x", 0, 1, 1),
+        Token(TokenKind.OP_EQUAL, "=", 2, 1, 3),
+        Token(TokenKind.FLOAT, "1", 4, 1, 5),
+        Token(TokenKind.SYMBOL_SEMICOLON, ";", 5, 1, 6),
+        Token(TokenKind.KW_IF, "if", 9, 2, 3),
+        Token(TokenKind.SYMBOL_LPAREN, "(", 12, 2, 6),
+        Token(TokenKind.IDENTIFIER, "x", 13, 2, 7),
+        Token(TokenKind.SYMBOL_RPAREN, ")", 14, 2, 8),
+    ]
+
+# Tokens spanning several chunks are recognized as a whole
+def test_iter_tokens_chunks(lexer):
+    source = 'name = "Layer 0";\ndim_in = 12.5e-3;'
+    expected = list(lexer.iter_tokens(source))
+    assert list(lexer.iter_tokens(io.StringIO(source), chunk_size=3)) == expected
+    assert list(lexer.iter_tokens(iter(source))) == expected
+
+# FLOAT and LITERAL_STRING tokens are decoded, -. is a FLOAT without a value
+def test_token_values(lexer):
+    tokens = lexer.iter_tokens('x = 1.5 * 2 + "a b" - -.;')
+    assert [token.value for token in tokens] == ["x", "=", 1.5, "*", 2, "+", "a b", "-", None, ";"]
+
+def test_iter_tokens_invalid(lexer):
+    assert [str(token) for token in lexer.iter_tokens("False $ x")] == ["<KW_FALSE, False>", "<INVALID_TOKEN, $>"]
+
+def test_legacy_token_stream(lexer):
+    source = "{ linear0: { dim_in = 784; } }"
+    lexer(source)
+    assert legacy_token_stream(lexer.iter_tokens(source)) == lexer.token_stream
+
+SPLIT_PROGRAM = '{\n  a: { x = 1; },\n  b: { s = "x, {y}"; },\n  c: { z = [1, 2]; }, d: { }\n}\n'
+
+def test_module_boundaries():
+    boundaries = module_boundaries(SPLIT_PROGRAM)
+    assert [SPLIT_PROGRAM[boundary - 1] for boundary in boundaries] == [",", ",", ","]
+    assert SPLIT_PROGRAM[boundaries[1]:].startswith("\n  c:")
+    # nothing after an unterminated string is a boundary
+    assert module_boundaries('{ a: { s = "x; }, b: { } }') == []
+
+def test_split_source():
+    chunks = split_source(SPLIT_PROGRAM, 4, min_chunk_size=1)
+    assert len(chunks) > 1
+    assert "".join(SPLIT_PROGRAM[start:end] for start, end in chunks) == SPLIT_PROGRAM
+    assert split_source(SPLIT_PROGRAM, 4) == [(0, len(SPLIT_PROGRAM))]
+
+@pytest.mark.parametrize("panic_mode", [False, True])
+@pytest.mark.parametrize("source", [
+    SPLIT_PROGRAM * 3,
+    # invalid tokens and a comma that is swallowed by an invalid token
+    SPLIT_PROGRAM.replace("x = 1;", "x = $1;").replace("},\n  b", "} 1e,\n  b"),
+    # an unterminated string, the program is not split after it
+    SPLIT_PROGRAM.replace("b: {", "b: { 'q") * 2,
+])
+def test_parallel_tokens(panic_mode, source, capsys):
+    expected = list(Lexer(panic_mode).iter_tokens(source))
+    serial_output = capsys.readouterr().out
+    assert Lexer(panic_mode, jobs=2, min_chunk_size=1).parallel_tokens(source) == expected
+    assert capsys.readouterr().out == serial_output
+
+def test_parallel_call(lexer):
+    lexer(SPLIT_PROGRAM)
+    parallel = Lexer(jobs=2, min_chunk_size=1)
+    parallel(SPLIT_PROGRAM)
+    assert parallel.token_stream == lexer.token_stream
+
 if __name__ == "__main__":
     lexer = Lexer()
     test_invalid_tokens(lexer)
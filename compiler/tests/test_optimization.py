@@ -0,0 +1,158 @@
+import ast
+from CodeGenerationPhase.optimization import optimize, parse_expr, propagate_constants, replace_name, topological_order
+from CodeGenerationPhase import optimization
+from CodeGenerationPhase.optimization import common_subexpression_elimination, eliminate_dead_code, DependencyGraph, CommonSubexpressions
+from CodeGenerationPhase.optimization import copy_propagation, resolve_copies
+
+def test_optimize():
+    definitions = {
+        "test": "3",
+        "test2": "test",
+        "in_channels": "64 * 2 * test2 * test",
+        "unused_var": "in_channels * 10",
+    }
+    assert optimize(definitions, ["in_channels"]) == {"in_channels": "1152"}
+
+def test_optimize_partially_constant():
+    definitions = {"a": "copyprop", "b": "4", "dim_in": "( a * b ) + ( 2 + 3 )"}
+    assert optimize(definitions, ["dim_in"]) == {"dim_in": "(copyprop << 2) + 5"}
+
+# Passes return the same node if nothing changed and never modify nodes in place
+def test_replace_name_is_persistent():
+    node = parse_expr("a * (b + c)")
+    assert replace_name(node, "d", "e") is node
+    new_node = replace_name(node, "b", "e")
+    assert ast.unparse(new_node) == "a * (e + c)"
+    assert ast.unparse(node) == "a * (b + c)"
+    assert new_node.left is node.left
+
+def test_propagate_constants_keeps_unchanged_nodes():
+    definitions = {"a": parse_expr("x + 1"), "b": parse_expr("a * 2")}
+    nodes = dict(definitions)
+    propagate_constants(definitions)
+    assert definitions == nodes
+
+# Definitions may use variables that are defined after them
+def test_propagate_constants_chain():
+    n = 500
+    definitions = {f"d{i}": parse_expr(f"d{i + 1} + 1") for i in range(n)}
+    definitions[f"d{n}"] = parse_expr("0")
+    propagate_constants(definitions)
+    assert all(definitions[f"d{i}"].value == n - i for i in range(n))
+
+def test_propagate_constants_cycle():
+    definitions = {k: parse_expr(v) for k, v in {"a": "b + c", "b": "a * 2", "c": "4 - 1"}.items()}
+    propagate_constants(definitions)
+    assert {k: ast.unparse(v) for k, v in definitions.items()} == {"a": "b + 3", "b": "a * 2", "c": "3"}
+
+def test_topological_order():
+    graph = {"a": {"b", "c"}, "b": {"c"}, "c": set(), "d": {"d"}, "e": {"d"}}
+    assert topological_order(graph) == ["c", "b", "a", "d", "e"]
+
+def count_operations(definitions):
+    return sum(isinstance(node, ast.BinOp) for expression in definitions.values() for node in ast.walk(parse_expr(expression)))
+
+# Repeated operations are computed once, reusing the variable that computes them first
+def test_common_subexpression_elimination():
+    definitions = {
+        "dim_in": "channels * width * width",
+        "dim_out": "channels * width * width // 3",
+        "hidden": "( channels * width * width + 1 ) * 5",
+    }
+    optimized = optimize(dict(definitions), ["dim_in", "dim_out", "hidden"])
+    assert optimized == {"dim_in": "channels * width * width", "dim_out": "dim_in // 3", "hidden": "(dim_in + 1) * 5"}
+    assert count_operations(definitions) == 9
+    assert count_operations(optimized) == 5
+
+def test_common_subexpression_elimination_temporaries():
+    definitions = {
+        "cse0": "x",
+        "a": "( x + y ) * ( x + y ) * 3",
+        "b": "( x + y ) * ( x + y ) - 1",
+        "c": "( x + y ) * ( x + y ) * 3",
+    }
+    optimized = common_subexpression_elimination({k: parse_expr(v) for k, v in definitions.items()})
+    assert {k: ast.unparse(v) for k, v in optimized.items()} == {
+        "cse0": "x",
+        "cse1": "x + y",
+        "cse2": "cse1 * cse1",
+        "a": "cse2 * 3",
+        "b": "cse2 - 1",
+        "c": "a",
+    }
+
+def parse_definitions(definitions):
+    return {k: parse_expr(v) for k, v in definitions.items()}
+
+# Only the changed definitions and the definitions that share an operation with them are visited again
+def test_common_subexpressions_dirty(monkeypatch):
+    eliminate = CommonSubexpressions()
+    definitions = eliminate(parse_definitions({"a": "x * y + 1", "b": "z * 2", "c": "w - 1"}))
+    visited = []
+    def recording(definitions, *args):
+        visited.append(list(definitions))
+        return common_subexpression_elimination(definitions, *args)
+    monkeypatch.setattr(optimization, "common_subexpression_elimination", recording)
+    definitions["d"] = parse_expr("x * y * 3")
+    definitions = eliminate(definitions, {"d"})
+    assert visited == [["a", "d"]]
+    assert {k: ast.unparse(v) for k, v in definitions.items()} == {"cse0": "x * y", "a": "cse0 + 1", "b": "z * 2", "c": "w - 1", "d": "cse0 * 3"}
+    # the temporary must not use the name of a definition that is not visited
+    definitions = eliminate(parse_definitions({"cse0": "1", "a": "p + q"}))
+    definitions["b"] = parse_expr("(x * y) * (x * y)")
+    definitions = eliminate(definitions, {"b"})
+    assert visited[-1] == ["b"]
+    assert {k: ast.unparse(v) for k, v in definitions.items()} == {"cse0": "1", "a": "p + q", "cse1": "x * y", "b": "cse1 * cse1"}
+
+# The graph only changes the liveness of the variables affected by a rewritten definition
+def test_dependency_graph_update():
+    definitions = parse_definitions({"a": "b + c", "b": "c * 2", "c": "x", "d": "a + 1"})
+    graph = DependencyGraph(definitions, ["a"])
+    assert graph.dead == {"d"}
+
+    definitions["a"] = parse_expr("c + 1")
+    graph.update(definitions)
+    assert graph.dead == {"b", "d"}
+    assert graph.users["c"] == {"a", "b"}
+
+    definitions["a"] = parse_expr("d")
+    graph.update(definitions)
+    assert graph.dead == {"b", "c"}
+    assert {"a", "d"} <= graph.live
+
+def test_eliminate_dead_code():
+    definitions = parse_definitions({"a": "b + c", "b": "c * 2", "c": "x", "d": "a + 1", "e": "e + 1"})
+    graph = DependencyGraph(definitions, ["a"])
+    assert list(eliminate_dead_code(definitions, ["a"], graph)) == ["a", "b", "c"]
+    assert graph.dead == set()
+    assert list(eliminate_dead_code(parse_definitions({"a": "b", "b": "1", "c": "a"}), ["b"])) == ["b"]
+
+# Passes are repeated until the definitions do not change anymore
+def test_optimize_fixed_point():
+    definitions = {"a": "x * y", "b": "x * y", "dim_in": "b + 1"}
+    stats = {}
+    assert optimize(dict(definitions), ["dim_in"], stats=stats) == {"a": "x * y", "dim_in": "a + 1"}
+    # the copy b = a introduced by CSE is propagated in the second iteration
+    assert stats["copy propagation"]["runs"] == 2
+    assert stats["copy propagation"]["changes"] == 1
+    assert stats["common subexpression elimination"]["changes"] == 1
+    assert stats["dead code elimination"]["changes"] == 1
+    assert optimize(dict(definitions), ["dim_in"], max_iterations=1) == {"a": "x * y", "b": "a", "dim_in": "b + 1"}
+
+# Needed variables are kept even if they are copies
+def test_optimize_keeps_needed_copies():
+    assert optimize({"dim_in": "channels", "dim_out": "dim_in"}, ["dim_in", "dim_out"]) == {"dim_in": "channels", "dim_out": "channels"}
+
+def test_resolve_copies():
+    definitions = parse_definitions({"a": "b", "b": "c", "c": "x + 1", "d": "e", "e": "f", "f": "e", "g": "d", "h": "y"})
+    assert resolve_copies(definitions) == {"a": "c", "b": "c", "d": "e", "g": "e", "h": "y"}
+
+def test_copy_propagation():
+    n = 1000
+    definitions = parse_definitions({f"c{i}": f"c{i + 1}" for i in range(n)})
+    definitions[f"c{n}"] = parse_expr("x")
+    definitions["dim_in"] = parse_expr("c0 * c1")
+    graph = DependencyGraph(definitions, ["dim_in"])
+    copy_propagation(definitions, graph=graph)
+    assert ast.unparse(definitions["dim_in"]) == "x * x"
+    assert all(ast.unparse(definitions[f"c{i}"]) == "x" for i in range(n))
@@ -0,0 +1,168 @@
+import os
+import pytest
+from LexicalPhase import Lexer, Token
+from SyntacticPhase import ll1_parse, parse_tree_to_ast, to_list
+from SyntacticPhase import Program, Module, Assign, Pass, If, Expression, List, Literal, Name
+from SyntacticPhase.parser import PARSE_TABLE, PRODUCTIONS, SYMBOLS, SYMBOL_IDS, TABLE, WIDTH, get_non_terminal
+
+PROGRAM = """
+{
+    linear0: {
+        name = "Layer 0";
+        dim_in = 784;
+        dim_out = 128;
+    },
+    linear1: {
+        if (name == "Layer 0") {
+            dim_in = 512;
+        } elif (dim_out > 12) {
+            dim_in = 256;
+        } else {
+            pass;
+        }
+    }
+}
+"""
+
+@pytest.fixture
+def lexer():
+    return Lexer()
+
+# The integer table contains exactly the rules of PARSE_TABLE
+def test_lowered_parse_table():
+    for nonterminal, rules in PARSE_TABLE.items():
+        for terminal, production in rules.items():
+            index = TABLE[SYMBOL_IDS[nonterminal] * WIDTH + SYMBOL_IDS[terminal]]
+            assert [SYMBOLS[symbol] for symbol in PRODUCTIONS[index]] == production
+    assert sum(index >= 0 for index in TABLE) == sum(len(rules) for rules in PARSE_TABLE.values())
+
+@pytest.mark.parametrize("tag, expected", [
+    ("<IDENTIFIER, foo>", "id"),
+    ("<FLOAT, 1.5>", "float"),
+    ('<LITERAL_STRING, "a, b">', "str"),
+    ("<OP_GREATER_THAN, >>", "op"),
+    ("<KW_ELIF, elif>", "elif"),
+    ("<SYMBOL_COMMA, ,>", ","),
+    ("$", "$"),
+])
+def test_get_non_terminal(tag, expected):
+    assert get_non_terminal(tag) == expected
+
+# Token records and token strings produce the same parse tree
+def test_parse_tokens(lexer):
+    lexer(PROGRAM)
+    valid, tree = ll1_parse(lexer.token_stream)
+    assert valid
+    assert ll1_parse(list(lexer.iter_tokens(PROGRAM))) == (True, tree)
+
+# The AST is built from Token records without converting them to token strings
+def test_build_ast_tokens(lexer, monkeypatch):
+    lexer(PROGRAM)
+    expected = ll1_parse(lexer.token_stream, build_ast=True)
+    def fail(token):
+        raise AssertionError(f"{token!r} converted to a string")
+    monkeypatch.setattr(Token, "__str__", fail)
+    assert ll1_parse(list(lexer.iter_tokens(PROGRAM)), build_ast=True) == expected
+
+# The AST built while parsing is the same as the one converted from the parse tree
+@pytest.mark.parametrize("i", range(5, 21))
+def test_build_ast(lexer, i):
+    with open(os.path.join(os.path.dirname(__file__), "TestPrograms", f"prog{i}.txt")) as file:
+        lexer(file.read())
+    valid, tree = ll1_parse(lexer.token_stream)
+    assert ll1_parse(lexer.token_stream, build_ast=True) == (valid, parse_tree_to_ast(tree) if valid else None)
+
+def test_build_ast_control_flow(lexer):
+    lexer(PROGRAM)
+    valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    assert ast == parse_tree_to_ast(ll1_parse(lexer.token_stream)[1])
+    assert ast.modules[1] == Module("linear1", [If(
+        [
+            (Expression([Name("name"), "==", Literal("Layer 0", '"Layer 0"')]), [Assign("dim_in", "=", Expression([Literal(512, "512")]))]),
+            (Expression([Name("dim_out"), ">", Literal(12, "12")]), [Assign("dim_in", "=", Expression([Literal(256, "256")]))]),
+        ],
+        [Pass()],
+    )])
+
+def test_build_ast_nodes(lexer):
+    lexer("{ conv0: { kernel_size = [3, 3]; lr = 0.5 * 2; act = relu; } }")
+    valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    assert valid
+    assert ast == Program([Module("conv0", [
+        Assign("kernel_size", "=", Expression([List([Literal(3, "3"), Literal(3, "3")])])),
+        Assign("lr", "=", Expression([Literal(0.5, "0.5"), "*", Literal(2, "2")])),
+        Assign("act", "=", Expression([Name("relu")])),
+    ])])
+
+# The lexer accepts -. as a FLOAT, its literal has no value but keeps its text
+def test_build_ast_invalid_float(lexer):
+    lexer("{ linear0: { dim_in = -.; } }")
+    valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    assert valid
+    assert ast.modules[0].body[0].value == Expression([Literal(None, "-.")])
+    assert parse_tree_to_ast(ll1_parse(lexer.token_stream)[1]) == ast
+    assert to_list(ast)[1][1][3] == ["<EXPRESSION>", "<FLOAT, -.>"]
+
+# to_list produces the nested list format expected by print_tree and visualize_ast
+def test_to_list(lexer):
+    lexer(PROGRAM)
+    valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    tree = to_list(ast)
+    assert tree[0] == "Program"
+    assert tree[1][0] == "linear0"
+    assert tree[1][1] == ["A", ["<IDENTIFIER, name>"], ["<OP_EQUAL, =>"], ["<EXPRESSION>", '<LITERAL_STRING, "Layer 0">'], ["<SYMBOL_SEMICOLON, ;>"]]
+    if_statement = tree[2][1]
+    assert if_statement[2] == ["<CONDITION>", ["<IDENTIFIER, name>"], ["<OP_EQUAL_EQUAL, ==>"], ['<LITERAL_STRING, "Layer 0">']]
+    assert if_statement[4][0] == "<KW_ELIF, elif>"
+    assert if_statement[5] == ["<KW_ELSE, else>", ["A", ["<KW_PASS, pass>"], ["<SYMBOL_SEMICOLON, ;>"]]]
+
+def test_reject(lexer):
+    lexer("{ linear0 { dim_in = 784; } }")
+    assert ll1_parse(lexer.token_stream) == (False, None)
+
+def module(name, valid=True):
+    return f"{name}: {{ dim_in = [1, 2]; dim_out = {'4' if valid else ''}; }}"
+
+# Faulty modules are dropped and the remaining modules are parsed as if the faulty ones never existed
+def test_panic_mode(lexer):
+    names = [f"linear{i}" for i in range(5)]
+    lexer("{" + ", ".join(module(name, i % 2 == 0) for i, name in enumerate(names)) + "}")
+    diagnostics = []
+    valid, tree = ll1_parse(lexer.token_stream, diagnostics)
+    assert valid
+    assert [message for message in diagnostics if message.startswith("Ignoring")] == [
+        'Ignoring module: "linear1"', 'Ignoring module: "linear3"'
+    ]
+
+    expected_lexer = Lexer()
+    expected_lexer("{" + ", ".join(module(name) for name in names[0:5:2]) + "}")
+    assert tree == ll1_parse(expected_lexer.token_stream)[1]
+
+# Panic mode can not recover if the last module is faulty
+def test_panic_mode_last_module(lexer):
+    lexer("{" + module("linear0") + ", " + module("linear1", False) + "}")
+    assert ll1_parse(lexer.token_stream) == (False, None)
+
+# Unmatched closing braces of a faulty module are skipped up to the next module
+@pytest.mark.parametrize("source, expected", [
+    # missing opening brace
+    ("{ flatten0: }, linear0: { dim_in = 1; } }", "{ linear0: { dim_in = 1; } }"),
+    ("{ relu0: { }, flatten0: } }, linear0: { dim_in = 1; } }", "{ relu0: { }, linear0: { dim_in = 1; } }"),
+    # extra closing brace
+    ("{ linear0: { dim_out = } 1; }, relu0: { } }", "{ relu0: { } }"),
+])
+def test_panic_mode_unmatched_brace(lexer, source, expected):
+    lexer(source)
+    valid, tree = ll1_parse(lexer.token_stream)
+    assert valid
+    expected_lexer = Lexer()
+    expected_lexer(expected)
+    assert tree == ll1_parse(expected_lexer.token_stream)[1]
+
+# Recovery does not recurse, so many faulty modules do not hit the recursion limit
+def test_panic_mode_many_modules(lexer):
+    lexer("{" + ", ".join(module(f"linear{i}", i == 2999) for i in range(3000)) + "}")
+    diagnostics = []
+    valid, tree = ll1_parse(lexer.token_stream, diagnostics)
+    assert valid
+    assert len([message for message in diagnostics if message.startswith("Ignoring")]) == 2999
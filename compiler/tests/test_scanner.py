@@ -0,0 +1,51 @@
+import pytest
+from LexicalPhase import Scanner, load_dfas
+from LexicalPhase.scanner import DEAD, START
+
+@pytest.fixture(scope="module")
+def dfas():
+    return load_dfas()
+
+@pytest.fixture(scope="module")
+def scanner(dfas):
+    return Scanner(dfas)
+
+def run_dfas(dfas, string):
+    for dfa in dfas:
+        dfa.reset()
+    status = [0 for _ in dfas]
+    for char in string:
+        status = [dfa(char) for dfa in dfas]
+    if max(status) == -1:
+        return "dead"
+    return dfas[status.index(1)].name if 1 in status else None
+
+def run_scanner(scanner, string):
+    state = START
+    for char in string:
+        state = scanner.step(state, char)
+    if state == DEAD:
+        return "dead"
+    return scanner.accept[state]
+
+# The combined DFA has to agree with running all DFAs in lockstep
+@pytest.mark.parametrize("string", [
+    "if", "ifn", "elif", "while", "and", "or", "not", "None", "_x1",
+    "1", "-1", "1.", ".5", "1e", "1e-5", "12.34E+10", "-", "--",
+    "*", "**", "**=", "/", "//", "//=", "<", "<<", "<=", "!", "!=",
+    "'str'", '"str ing"', "'str", "'mixed\"", "$", "a$", ":", ";",
+])
+def test_same_as_dfas(dfas, scanner, string):
+    assert run_scanner(scanner, string) == run_dfas(dfas, string)
+
+def test_unknown_char(scanner):
+    assert scanner.step(START, "$") == DEAD
+    assert scanner.step(DEAD, "a") == DEAD
+
+def test_minimized(dfas, scanner):
+    # all identifiers that are not a prefix of a keyword end up in the same state
+    assert run_scanner(scanner, "xyz") == run_scanner(scanner, "q")
+    state_xyz = START
+    for char in "xyz":
+        state_xyz = scanner.step(state_xyz, char)
+    assert state_xyz == scanner.step(START, "q")
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import pytest
+from torchify.server import CompileService, HTTPError, parse_compile_request
+from torchify.pipeline import compile_source
+from SyntacticPhase import to_list
+from benchmarks.load import request, compile_lines, run_load, format_load
+
+PROGRAM = "{ code: { dim_in = 4 * 4; }, linear0: { dim_out = 10; }, relu0: { } }"
+
+def serve(scenario, **options):
+    """Runs scenario(service, reader, writer) against a service on a free port."""
+    async def run():
+        service = CompileService(port=0, jobs=1, cache_dir=options.pop("cache_dir", None), **options)
+        await service.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+        try:
+            return await scenario(service, reader, writer)
+        finally:
+            writer.close()
+            await service.close()
+    return asyncio.run(run())
+
+def compile_request(source, options=None, **service_options):
+    async def scenario(service, reader, writer):
+        return await request(reader, writer, "POST", "/compile", {"source": source, "options": options or {}})
+    status, headers, body = serve(scenario, **service_options)
+    assert status == 200
+    assert headers["transfer-encoding"] == "chunked"
+    return compile_lines(body)
+
+def test_compile(tmp_path):
+    lines = compile_request(PROGRAM, cache_dir=str(tmp_path))
+    assert [line["phase"] for line in lines] == ["tokens", "ast", "code", "diagnostics"]
+    expected = compile_source(PROGRAM)
+    assert lines[0]["tokens"] == expected.tokens
+    assert lines[1]["valid"] and lines[1]["ast"] == to_list(expected.ast)
+    assert lines[2]["code"] == expected.code
+    assert lines[3]["valid"] and lines[3]["diagnostics"] == []
+    assert "Accept" in lines[3]["messages"]
+
+def test_options():
+    source = "{ linear0: { dim_out = 10; }, relu0: { } }"
+    lines = compile_request(source, {"input_shape": [4], "sequential": True})
+    assert lines[2]["code"] == compile_source(source, input_shape=(4,), sequential=True).code
+
+def test_invalid_program():
+    source = "{ linear0: { dim_out = ; } }"
+    lines = compile_request(source)
+    expected = compile_source(source)
+    assert not lines[1]["valid"] and lines[1]["ast"] is None
+    assert lines[2]["code"] is None
+    assert not lines[3]["valid"]
+    assert lines[3]["diagnostics"] == expected.diagnostics != []
+
+def test_code_generation_error(tmp_path):
+    # the second request is answered by the cache
+    for _ in range(2):
+        lines = compile_request("{ linear0: { dim_out = 10; } }", cache_dir=str(tmp_path))
+        assert lines[2]["code"] is None
+        assert "Missing parameter 'dim_in' for linear layer: linear0" in lines[3]["messages"]
+
+def test_concurrent_requests_are_batched():
+    async def scenario(service, reader, writer):
+        result = await run_load("127.0.0.1", service.port, PROGRAM, requests=40, concurrency=20, unique=True)
+        return result, service.stats()
+    result, stats = serve(scenario, batch_delay=0.01)
+    assert result["failed"] == 0
+    assert "40 requests (0 failed)" in format_load(result)
+    assert stats["requests"] == 40
+    assert stats["batches"]["tokens"]["jobs"] == 40
+    assert stats["batches"]["tokens"]["batches"] < 40
+    assert stats["latency_ms"]["p50"] <= stats["latency_ms"]["max"]
+
+def test_endpoints():
+    async def scenario(service, reader, writer):
+        responses = []
+        for method, path, payload in [
+            ("GET", "/health", None),
+            ("GET", "/compile", None),
+            ("GET", "/missing", None),
+            ("POST", "/compile", {"program": PROGRAM}),
+            # the connection is still usable after an error
+            ("GET", "/stats", None),
+        ]:
+            status, _, body = await request(reader, writer, method, path, payload)
+            responses.append((status, json.loads(body)))
+        return responses
+    health, wrong_method, missing, invalid, stats = serve(scenario)
+    assert health[0] == 200 and health[1]["status"] == "ok" and health[1]["workers"] == 1
+    assert wrong_method[0] == 405
+    assert missing[0] == 404
+    assert invalid[0] == 400 and "source" in invalid[1]["error"]
+    assert stats[0] == 200 and stats[1]["requests"] == 0
+
+def test_cors():
+    async def scenario(service, reader, writer):
+        local = await request(reader, writer, "OPTIONS", "/compile", headers={"Origin": "http://localhost:3000"})
+        remote = await request(reader, writer, "GET", "/health", headers={"Origin": "http://example.com"})
+        return local, remote
+    (status, local, _), (_, remote, _) = serve(scenario)
+    assert status == 204
+    assert local["access-control-allow-origin"] == "http://localhost:3000"
+    assert "access-control-allow-origin" not in remote
+
+def test_localhost_only():
+    with pytest.raises(ValueError):
+        CompileService(host="0.0.0.0")
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b'["source"]',
+    b'{"source": 1}',
+    b'{"source": "{}", "options": {"optimize": true}}',
+    b'{"source": "{}", "options": {"input_shape": [3, -1]}}',
+])
+def test_invalid_requests(body):
+    with pytest.raises(HTTPError) as error:
+        parse_compile_request(body)
+    assert error.value.status == 400
+
+def test_parse_compile_request():
+    source, options = parse_compile_request(b'{"source": "{}", "options": {"input_shape": [3, 8, 8], "fuse": true}}')
+    assert source == "{}"
+    assert options == {"panic_mode": True, "input_shape": (3, 8, 8), "fuse": True, "inplace": False, "sequential": False}
@@ -0,0 +1,76 @@
+import os
+import pytest
+from LexicalPhase import Lexer
+from SyntacticPhase import ll1_parse
+from CodeGenerationPhase import generate_code, process_ast
+from CodeGenerationPhase.shapes import ShapeError, UnknownShapeError, infer_shapes, format_shapes
+
+def load_layers(source):
+    lexer = Lexer()
+    lexer(source)
+    valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    assert valid
+    return ast
+
+def load_program(i):
+    with open(os.path.join(os.path.dirname(__file__), "TestPrograms", f"prog{i}.txt")) as file:
+        return load_layers(file.read())
+
+# AlexNet: the hand computed 256 * 6 * 6 matches the inferred input of linear0
+def test_infer_shapes():
+    shapes = infer_shapes(process_ast(load_program(12)), (3, 224, 224))
+    output_shapes = {layer.name: layer.output_shape for layer in shapes}
+    assert output_shapes["conv2d0"] == (64, 55, 55)
+    assert output_shapes["maxpool2d0"] == (64, 27, 27)
+    assert output_shapes["maxpool2d2"] == (256, 6, 6)
+    assert output_shapes["flatten0"] == (9216,)
+    assert shapes[-1].output_shape == (10,)
+    assert all(layer.inferred == {} for layer in shapes)
+
+def test_infer_parameters():
+    shapes = infer_shapes(process_ast(load_program(21)))
+    assert [(layer.name, layer.inferred) for layer in shapes if layer.inferred] == [
+        ("conv2d0", {"in_channels": 1}), ("batchnorm2d0", {"num_features": 32}), ("linear0", {"dim_in": 32 * 14 * 14})
+    ]
+    code = generate_code(load_program(21))
+    assert "self.conv2d0 = nn.Conv2d(1, 32, 3, padding=1)" in code
+    assert "self.batchnorm2d0 = nn.BatchNorm2d(32)" in code
+    assert "self.linear0 = nn.Linear(6272, 10)" in code
+    assert "x = self.maxpool2d0(x) # (32, 14, 14)" in code
+
+def test_shape_mismatch(capsys):
+    ast = load_program(11)
+    with pytest.raises(ShapeError, match="linear0: dim_in is 3136 but the input has 4096"):
+        infer_shapes(process_ast(ast), (1, 32, 32))
+    assert generate_code(ast, (1, 32, 32)) is None
+    assert "Shape error in layer linear0" in capsys.readouterr().out
+
+def test_unknown_shapes(capsys):
+    # Parameters that are not numbers leave the shapes unknown, the code is generated without them
+    for source, line in [
+        ("{ linear0: { dim_in = 4; dim_out = 2 / 0; } }", "self.linear0 = nn.Linear(4, 2 / 0)"),
+        ('{ conv2d0: { in_channels = 3; out_channels = 8; kernel_size = 3; padding = "same"; } }', 'self.conv2d0 = nn.Conv2d(3, 8, 3, padding="same")'),
+    ]:
+        ast = load_layers(source)
+        with pytest.raises(UnknownShapeError):
+            infer_shapes(process_ast(ast), (3, 32, 32))
+        code = generate_code(ast, (3, 32, 32))
+        assert line in code
+        assert "#" not in code.split("def forward")[1]
+        assert "Warning: the shapes are not known" in capsys.readouterr().out
+
+def test_code_module_values():
+    ast = load_layers("{ code: { c = 2 * 8; }, input: { features = c * c; }, linear0: { dim_in = c * 16; dim_out = c; } }")
+    shapes = infer_shapes(process_ast(ast))
+    assert shapes[0].output_shape == (16,)
+
+def test_symbolic_shapes():
+    shapes = infer_shapes(process_ast(load_program(11)), ("size", "size", 28))
+    assert shapes[0].output_shape == (32, "(size + 2 - 3) // 1 + 1", 28)
+
+def test_without_input_shape():
+    assert infer_shapes(process_ast(load_program(11))) is None
+
+def test_format_shapes():
+    table = format_shapes(infer_shapes(process_ast(load_program(10)), (1, 28, 28)))
+    assert table.splitlines()[1].split() == ["flatten0", "(784)", "784"]
@@ -0,0 +1,40 @@
+import pickle
+from LexicalPhase import Lexer, Scanner, load_dfas
+from LexicalPhase import tables
+from LexicalPhase.tables import load_scanner, read_tables, write_tables, tables_version
+
+def test_tables_round_trip(tmp_path):
+    scanner = Scanner(load_dfas())
+    path = str(tmp_path / "tables.pickle")
+    write_tables(path, "v1", scanner.tables())
+    loaded = Scanner.from_tables(read_tables(path, "v1"))
+    assert loaded.tables() == scanner.tables()
+    assert loaded.step(1, "i") == scanner.step(1, "i")
+
+def test_version_mismatch(tmp_path):
+    path = str(tmp_path / "tables.pickle")
+    write_tables(path, "old", {"table": []})
+    assert read_tables(path, "new") is None
+    assert read_tables(str(tmp_path / "missing.pickle"), "new") is None
+    with open(path, "wb") as file:
+        file.write(b"garbage")
+    assert read_tables(path, "old") is None
+
+def test_load_scanner_builds_missing_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(tables, "_scanner", None)
+    path = str(tmp_path / "tables.pickle")
+    scanner = load_scanner(path)
+    assert scanner.tables() == Scanner(load_dfas()).tables()
+    with open(path, "rb") as file:
+        assert pickle.load(file)["version"] == tables_version()
+    # the scanner is loaded once per process
+    assert load_scanner(path) is scanner
+
+def test_lexers_share_the_scanner():
+    first, second = Lexer(), Lexer(panic_mode=True)
+    assert first.scanner is second.scanner
+    # the DFAs are only built on access
+    assert first._dfas is None
+    assert len(first.dfas) == len(load_dfas())
+    first("{ linear0: { dim_in = 2; } }")
+    assert first.token_stream[:3] == ["<SYMBOL_LBRACE, {>", "<IDENTIFIER, linear0>", "<SYMBOL_COLON, :>"]
@@ -0,0 +1,2 @@
+# The profiler is a module of its own, so that the packages of the phases can report to it without depending on torchify
+import instrumentation
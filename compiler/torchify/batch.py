@@ -0,0 +1,115 @@
+import io
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from .cache import CompileCache
+from .pipeline import compile_source
+
+# Result of compiling one file. output is the path of the generated code or None if
+# the file could not be compiled, messages is everything the compiler printed.
+FileResult = namedtuple("FileResult", ["source", "output", "error", "messages", "seconds"])
+
+# Cache of the current worker process
+_cache = None
+
+def collect_sources(inputs, pattern=".txt"):
+    """
+    Expands the input paths into (source, output name) pairs.
+
+    Files are taken as they are, directories are searched recursively for
+    files ending with pattern. The output name of a file in a directory is its
+    path relative to the directory, so files with the same name in different
+    subdirectories do not overwrite each other.
+    """
+    sources = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, directories, files in os.walk(path):
+                directories.sort()
+                for name in sorted(files):
+                    if name.endswith(pattern):
+                        source = os.path.join(root, name)
+                        sources.append((source, os.path.relpath(source, path)))
+        else:
+            sources.append((path, os.path.basename(path)))
+    return sources
+
+def output_path(output_dir, name):
+    return os.path.join(output_dir, os.path.splitext(name)[0] + ".py")
+
+def compile_file(job):
+    """
+    Compiles a single file and writes the generated code, never raises.
+
+    Args:
+        job: Tuple of the source path, the output path, the cache directory
+            (or None) and the options of compile_source.
+
+    Returns:
+        A FileResult.
+    """
+    global _cache
+    source, output, cache_dir, options = job
+    start = time.perf_counter()
+    messages = io.StringIO()
+    try:
+        if cache_dir is not None and (_cache is None or _cache.directory != cache_dir):
+            _cache = CompileCache(cache_dir)
+        with open(source, "r") as file:
+            text = file.read()
+        # The phases report errors by printing them
+        with redirect_stdout(messages):
+            result = compile_source(text, _cache if cache_dir is not None else None, **options)
+        if not result.valid:
+            error = "invalid program"
+        elif result.code is None:
+            error = "code generation failed"
+        else:
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            with open(output, "w") as file:
+                file.write(result.code)
+            return FileResult(source, output, None, messages.getvalue(), time.perf_counter() - start)
+    except Exception as exception:
+        error = f"{type(exception).__name__}: {exception}"
+    return FileResult(source, None, error, messages.getvalue(), time.perf_counter() - start)
+
+def compile_files(sources, output_dir, jobs=None, cache_dir=None, **options):
+    """
+    Compiles many files in parallel.
+
+    Every file is compiled independently, an error in one file is reported in
+    its result and does not stop the others. The files are distributed to the
+    worker processes in chunks to keep the overhead per file low.
+
+    Args:
+        sources: List of (source path, output name) pairs as returned by collect_sources.
+        output_dir: Directory the generated code is written to.
+        jobs: Number of worker processes, os.cpu_count() if None. With 1 the
+            files are compiled in the current process.
+        cache_dir: Directory of a CompileCache shared by the workers or None.
+        options: Options of compile_source.
+
+    Returns:
+        The list of FileResults in the order of sources.
+    """
+    work = [(source, output_path(output_dir, name), cache_dir, options) for source, name in sources]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(work) <= 1:
+        return [compile_file(job) for job in work]
+    chunksize = max(1, len(work) // (4 * jobs))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(compile_file, work, chunksize=chunksize))
+
+def format_summary(results, seconds):
+    """Formats the failed files and the throughput of a batch."""
+    lines = []
+    failed = [result for result in results if result.error is not None]
+    for result in failed:
+        lines.append(f"{result.source}: {result.error}")
+        for message in result.messages.splitlines():
+            lines.append(f"    {message}")
+    rate = len(results) / seconds if seconds > 0 else float("inf")
+    lines.append(f"compiled {len(results) - len(failed)} of {len(results)} files in {seconds:.2f} s ({rate:.1f} files/s)")
+    return "\n".join(lines)
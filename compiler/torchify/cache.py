@@ -0,0 +1,135 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# Packages and modules whose source determines the output of the compiler and what is cached
+COMPILER_PACKAGES = ['LexicalPhase', 'SyntacticPhase', 'CodeGenerationPhase']
+COMPILER_MODULES = [os.path.join('torchify', 'pipeline.py')]
+DEFAULT_DIRECTORY = os.environ.get('TORCHIFY_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'torchify'))
+DEFAULT_MAX_BYTES = 64 << 20
+STAGES = ['tokens', 'ast', 'code']
+
+_compiler_version = None
+
+def compiler_version():
+    """
+    Hash of the source files of the compiler, computed once per process.
+
+    Entries of the cache that were written by a different version of the
+    compiler are never read.
+    """
+    global _compiler_version
+    if _compiler_version is None:
+        digest = hashlib.sha256()
+        # The directory that contains the torchify package and the packages of the phases
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        paths = [os.path.join(root, name) for name in COMPILER_MODULES]
+        for package in COMPILER_PACKAGES:
+            directory = os.path.join(root, package)
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.py'))
+        for path in paths:
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+        _compiler_version = digest.hexdigest()
+    return _compiler_version
+
+class CompileCache:
+    """
+    On-disk content addressed cache of the results of the compiler stages.
+
+    Every entry is a pickle file named after the hash of the compiler version,
+    the stage, the options of the stage and the source. The least recently used
+    entries are removed when the total size exceeds max_bytes. Entries are
+    written to a temporary file and renamed, so several processes can share a
+    cache directory.
+
+    Attributes:
+        directory: Directory of the cache files.
+        max_bytes: Maximum total size of the cache files.
+        stats: Number of hits and misses of every stage.
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {stage: {'hits': 0, 'misses': 0} for stage in STAGES}
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self.entries())
+
+    def entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.pickle')]
+
+    def key(self, stage, source, options=()):
+        digest = hashlib.sha256()
+        digest.update(compiler_version().encode())
+        digest.update(stage.encode())
+        digest.update(repr(options).encode())
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.pickle')
+
+    def get(self, stage, key):
+        """
+        Returns (True, value) if the cache has an entry for key, (False, None) otherwise.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.stats[stage]['misses'] += 1
+            return False, None
+        # The modification time orders the entries by their last use
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats[stage]['hits'] += 1
+        return True, value
+
+    def put(self, key, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, self.path(key))
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is smaller than max_bytes."""
+        entries = []
+        for entry in self.entries():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+
+    def clear(self):
+        for entry in self.entries():
+            os.remove(entry.path)
+        self.size = 0
+
+    def format_stats(self):
+        lines = []
+        for stage in STAGES:
+            hits, misses = self.stats[stage]['hits'], self.stats[stage]['misses']
+            total = hits + misses
+            rate = f'{100 * hits / total:.1f}%' if total else '-'
+            lines.append(f'{stage:<8}{hits:>8} hits{misses:>8} misses{rate:>9}')
+        return '\n'.join(lines)
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import sys
+import time
+from LexicalPhase import Lexer
+from SyntacticPhase import ll1_parse
+from CodeGenerationPhase import process_ast
+from CodeGenerationPhase.shapes import ShapeError
+from CodeGenerationPhase.estimate import estimate_cost, format_cost
+from .cache import DEFAULT_DIRECTORY
+from .batch import collect_sources, compile_files, format_summary
+from .pipeline import compile_source
+from .server import CompileService, DEFAULT_PORT
+import instrumentation
+
+def parse_shape(text):
+    """Parses an input shape like 3,224,224 or 3x224x224."""
+    try:
+        return tuple(int(size) for size in text.replace("x", ",").split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shape {text!r}, expected e.g. 3,224,224")
+
+def load_layers(path):
+    """Lexes and parses a program and returns its layers as returned by process_ast or None."""
+    with open(path, 'r') as file:
+        source = file.read()
+    lexer = Lexer(panic_mode=True)
+    lexer(source)
+    valid, ast = ll1_parse(lexer.token_stream, build_ast=True)
+    if not valid:
+        return None
+    return process_ast(ast)
+
+def estimate(args):
+    layers = load_layers(args.file)
+    if layers is None:
+        print(f"{args.file}: invalid program", file=sys.stderr)
+        return 1
+    try:
+        cost = estimate_cost(layers, args.input_shape, args.batch_size, args.dtype_bytes)
+    except ShapeError as error:
+        print(f"{args.file}: shape error in layer {error}", file=sys.stderr)
+        return 1
+    if cost is None:
+        print(f"{args.file}: the input shape is not known, pass --input-shape or add an input module", file=sys.stderr)
+        return 1
+    print(format_cost(cost))
+    return 0
+
+def compile_command(args):
+    sources = collect_sources(args.inputs, args.pattern)
+    if not sources:
+        print("no input files", file=sys.stderr)
+        return 1
+    options = {"input_shape": args.input_shape, "fuse": args.fuse, "inplace": args.inplace, "sequential": args.sequential}
+    cache_dir = None if args.no_cache else args.cache_dir
+    start = time.perf_counter()
+    results = compile_files(sources, args.output_dir, args.jobs, cache_dir, **options)
+    print(format_summary(results, time.perf_counter() - start), file=sys.stderr)
+    return 1 if any(result.error is not None for result in results) else 0
+
+def profile_command(args):
+    with open(args.file, 'r') as file:
+        source = file.read()
+    with instrumentation.profile() as profiler:
+        result = compile_source(source, input_shape=args.input_shape)
+    print(profiler.format_summary())
+    if args.json:
+        profiler.write_json(args.json)
+    if args.trace:
+        profiler.write_chrome_trace(args.trace)
+    return 0 if result.code is not None else 1
+
+def serve_command(args):
+    try:
+        service = CompileService(args.host, args.port, args.jobs, None if args.no_cache else args.cache_dir, args.batch_size, args.batch_delay / 1000)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    async def serve():
+        await service.start()
+        print(f"Compile service listening on http://{args.host}:{service.port} with {service.workers} workers", file=sys.stderr)
+        try:
+            await service.server.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="torchify", description="Compiles Torchify programs to PyTorch.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    estimate_parser = commands.add_parser("estimate", help="estimate parameters, FLOPs and activation memory of a network")
+    estimate_parser.add_argument("file", help="the Torchify program")
+    estimate_parser.add_argument("--input-shape", type=parse_shape, help="shape of a single input without the batch dimension, e.g. 3,224,224")
+    estimate_parser.add_argument("--batch-size", type=int, default=1)
+    estimate_parser.add_argument("--dtype-bytes", type=int, default=4, help="size of an activation element in bytes")
+    estimate_parser.set_defaults(function=estimate)
+
+    compile_parser = commands.add_parser("compile", help="compile many programs in parallel")
+    compile_parser.add_argument("inputs", nargs="+", help="programs or directories of programs")
+    compile_parser.add_argument("-o", "--output-dir", default=".", help="directory the generated code is written to")
+    compile_parser.add_argument("-j", "--jobs", type=int, help="number of worker processes, all cores by default")
+    compile_parser.add_argument("--pattern", default=".txt", help="suffix of the programs in input directories")
+    compile_parser.add_argument("--cache-dir", default=DEFAULT_DIRECTORY, help="directory of the compile cache")
+    compile_parser.add_argument("--no-cache", action="store_true", help="do not use the compile cache")
+    compile_parser.add_argument("--input-shape", type=parse_shape, help="shape of a single input without the batch dimension")
+    compile_parser.add_argument("--fuse", action="store_true", help="generate fused inference networks")
+    compile_parser.add_argument("--inplace", action="store_true", help="run activations in place where possible")
+    compile_parser.add_argument("--sequential", action="store_true", help="generate nn.Sequential networks")
+    compile_parser.set_defaults(function=compile_command)
+
+    profile_parser = commands.add_parser("profile", help="compile a program and report the time and counters of every phase")
+    profile_parser.add_argument("file", help="the Torchify program")
+    profile_parser.add_argument("--input-shape", type=parse_shape, help="shape of a single input without the batch dimension")
+    profile_parser.add_argument("--json", help="write the spans and their summary as JSON")
+    profile_parser.add_argument("--trace", help="write the spans as Chrome trace events")
+    profile_parser.set_defaults(function=profile_command)
+
+    serve_parser = commands.add_parser("serve", help="run the HTTP/JSON compile service on localhost")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="loopback address to listen on")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("-j", "--jobs", type=int, help="number of worker processes, all cores by default")
+    serve_parser.add_argument("--cache-dir", default=DEFAULT_DIRECTORY, help="directory of the compile cache")
+    serve_parser.add_argument("--no-cache", action="store_true", help="do not use the compile cache")
+    serve_parser.add_argument("--batch-size", type=int, default=32, help="largest number of requests sent to a worker at once")
+    serve_parser.add_argument("--batch-delay", type=float, default=1.0, help="longest wait in milliseconds for a batch to fill up")
+    serve_parser.set_defaults(function=serve_command)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
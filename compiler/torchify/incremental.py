@@ -0,0 +1,178 @@
+import io
+from bisect import bisect_right
+from collections import namedtuple
+from contextlib import redirect_stdout
+from itertools import chain
+from instrumentation import span
+from LexicalPhase import Lexer, TokenKind
+from LexicalPhase.split import module_boundaries
+from SyntacticPhase import ll1_parse, Program
+from CodeGenerationPhase.codegenerator import CODE_PARAMS, process_module, emit_layers
+from CodeGenerationPhase.optimization import optimize
+from .pipeline import CompileResult, compile_source
+
+LBRACE = "<SYMBOL_LBRACE, {>"
+RBRACE = "<SYMBOL_RBRACE, }>"
+
+# A segment of a program, the text from one module boundary to the next. tokens: the token
+# stream of the segment, module and layer: the AST and the layer of its module (None if the
+# segment is invalid), opens: the first token is the opening brace of the program, closes:
+# the last token is the closing brace, otherwise it is the comma at the end of the segment.
+Segment = namedtuple("Segment", ["tokens", "module", "layer", "opens", "closes"])
+
+class CompileSession:
+    """
+    Recompiles a program incrementally, one module at a time.
+
+    The program is split into segments at its top-level commas, every segment
+    holds one module. The tokens of every segment are cached by its text, the
+    AST and the layer of every module by its tokens and the optimized code
+    module by its assignments. After an edit only the segments whose text
+    changed are lexed and parsed again and the code module is only optimized
+    again if it changed, since the parameters it can define are fixed
+    (CODE_PARAMS). The code is generated from the cached layers.
+
+    The result is always the same as that of compile_source: a segment is only
+    used if it ends with its comma token and every module is parsed on its own
+    as the program { module }. If that fails, e.g. for programs with syntax
+    errors, the whole program is compiled by compile_source.
+
+    Attributes:
+        source: The current program.
+        stats: Counters of the last compilation: relexed segments, reparsed
+            modules, optimized code modules and fallbacks to compile_source.
+    """
+    def __init__(self, panic_mode=True, input_shape=None, fuse=False, inplace=False, sequential=False):
+        self.panic_mode = panic_mode
+        self.options = (input_shape, fuse, inplace, sequential)
+        self.lexer = Lexer(panic_mode=panic_mode)
+        self.source = ""
+        self.offsets = [0] # start of every segment in source
+        self.segments = [""]
+        self.lexed = {} # segment text -> Segment
+        self.parsed = {} # tokens of a module -> (module AST, layer), used if only the whitespace of a segment changed
+        self.optimized = {} # assignments of the code module -> optimized assignments
+        self.stats = {}
+
+    def update(self, source):
+        """Replaces the program and compiles it, returns a CompileResult."""
+        self.source = source
+        self.offsets = [0] + module_boundaries(source)
+        self.segments = [source[start:end] for start, end in zip(self.offsets, self.offsets[1:] + [len(source)])]
+        return self.compile()
+
+    def edit(self, start, end, text):
+        """
+        Replaces source[start:end] with text and compiles the program, returns a CompileResult.
+
+        Only the segments that overlap the edit are split again, the program
+        is split from scratch if the edit moved their boundaries.
+        """
+        source = self.source[:start] + text + self.source[end:]
+        first = bisect_right(self.offsets, start) - 1
+        if first > 0 and start == self.offsets[first]:
+            # the edit might extend the previous segment
+            first -= 1
+        last = bisect_right(self.offsets, end) - 1
+        delta = len(text) - (end - start)
+        region_start = self.offsets[first]
+        region_end = (self.offsets[last + 1] if last + 1 < len(self.offsets) else len(self.source)) + delta
+        region = source[region_start:region_end]
+
+        boundaries = module_boundaries(region, 1 if first else 0)
+        if last + 1 < len(self.offsets):
+            # the region has to end at the boundary of the next segment
+            if not boundaries or boundaries[-1] != len(region):
+                return self.update(source)
+            boundaries.pop()
+        cuts = [0] + boundaries
+        self.segments[first:last + 1] = [region[cut:next_cut] for cut, next_cut in zip(cuts, cuts[1:] + [len(region)])]
+        following = self.offsets[last + 1:]
+        self.offsets[first:] = [region_start + cut for cut in cuts] + [offset + delta for offset in following]
+        self.source = source
+        return self.compile()
+
+    def compile(self):
+        """Compiles the current program from the cached segments and modules, returns a CompileResult."""
+        self.stats = {"relexed": 0, "reparsed": 0, "optimized": 0, "fallbacks": 0}
+        with span("incremental_compile", "session") as args:
+            result = self.compile_segments()
+            if args is not None:
+                args.update(self.stats)
+        self.prune()
+        return result
+
+    def compile_segments(self):
+        modules = []
+        layers = []
+        tokens = []
+        for index, text in enumerate(self.segments):
+            segment = self.lexed.get(text)
+            if segment is None:
+                segment = self.lexed[text] = self.lex_segment(text)
+            last = index == len(self.segments) - 1
+            if segment.module is None or segment.opens != (index == 0) or segment.closes != last:
+                return self.fallback()
+            modules.append(segment.module)
+            # Segments with the same text share their cached layer, every segment gets a copy of its own
+            layers.append(dict(segment.layer) if segment.layer is not None else None)
+            tokens.extend(segment.tokens)
+
+        code = None
+        # Control flow is not supported in modules
+        if all(layer is not None for layer in layers):
+            code = emit_layers(layers, *self.options, optimize_code=self.optimize_code)
+        return CompileResult(tokens, True, Program(modules), code, [])
+
+    def lex_segment(self, text):
+        """Lexes a segment and parses its module."""
+        self.stats["relexed"] += 1
+        tokens = list(self.lexer.iter_tokens(text))
+        token_stream = [str(token) for token in tokens]
+        if not tokens or tokens[-1].kind is TokenKind.INVALID_TOKEN:
+            return Segment(token_stream, None, None, False, False)
+        opens = tokens[0].kind is TokenKind.SYMBOL_LBRACE
+        closes = tokens[-1].kind is TokenKind.SYMBOL_RBRACE
+        separator = tokens[-1].kind is TokenKind.SYMBOL_COMMA and tokens[-1].start == len(text) - 1
+        if not closes and not separator:
+            return Segment(token_stream, None, None, opens, closes)
+        # the tokens of the module without the braces of the program and the separator
+        key = tuple(token_stream[1 if opens else 0:-1])
+        parsed = self.parsed.get(key)
+        if parsed is None:
+            parsed = self.parsed[key] = self.parse_module(key)
+            self.stats["reparsed"] += 1
+        return Segment(token_stream, *parsed, opens, closes)
+
+    def parse_module(self, tokens):
+        """Parses the tokens of a module, returns its AST and its layer or (None, None) if it is not a valid module."""
+        diagnostics = []
+        # The parser prints Accept for every module
+        with redirect_stdout(io.StringIO()):
+            valid, program = ll1_parse([LBRACE, *tokens, RBRACE], diagnostics, build_ast=True)
+        if not valid or diagnostics or len(program.modules) != 1:
+            return None, None
+        module = program.modules[0]
+        return module, process_module(module)
+
+    def optimize_code(self, assignments):
+        key = tuple(assignments.items())
+        optimized = self.optimized.get(key)
+        if optimized is None:
+            optimized = optimize(assignments, CODE_PARAMS)
+            self.optimized[key] = optimized
+            self.stats["optimized"] += 1
+        return optimized
+
+    def fallback(self):
+        self.stats["fallbacks"] += 1
+        return compile_source(self.source, None, self.panic_mode, *self.options)
+
+    def prune(self):
+        """Drops the cached segments and modules that are no longer part of the program."""
+        if len(self.lexed) > 2 * len(self.segments) + 16:
+            self.lexed = {text: self.lexed[text] for text in self.segments if text in self.lexed}
+        if len(self.parsed) > 2 * len(self.segments) + 16:
+            self.parsed = {}
+        if len(self.optimized) > 16:
+            self.optimized = {}
@@ -0,0 +1,85 @@
+import io
+from collections import namedtuple
+from contextlib import redirect_stdout
+from LexicalPhase import Lexer
+from SyntacticPhase import ll1_parse
+from CodeGenerationPhase import generate_code
+
+# Results of all stages of the compiler. valid is False if the program was rejected by
+# the parser, then ast and code are None. diagnostics are the error messages of the parser.
+CompileResult = namedtuple("CompileResult", ["tokens", "valid", "ast", "code", "diagnostics"])
+
+# Lexers are expensive to build, one is kept per panic mode
+_lexers = {}
+
+def lex(source, panic_mode=True):
+    """Returns the token stream of source as produced by Lexer.__call__."""
+    if panic_mode not in _lexers:
+        _lexers[panic_mode] = Lexer(panic_mode=panic_mode)
+    lexer = _lexers[panic_mode]
+    lexer.token_stream = []
+    lexer(source)
+    return lexer.token_stream
+
+def cached(cache, name, source, options, function):
+    """
+    Returns the result of a stage from the cache, or runs function and stores its result if there is none.
+
+    Everything the stage printed, e.g. the warnings of the lexer or the errors
+    of the code generator, is stored with its result and printed again on a hit.
+    """
+    if cache is None:
+        return function()
+    key = cache.key(name, source, options)
+    hit, entry = cache.get(name, key)
+    if hit:
+        value, messages = entry
+    else:
+        output = io.StringIO()
+        with redirect_stdout(output):
+            value = function()
+        messages = output.getvalue()
+        cache.put(key, (value, messages))
+    print(messages, end="")
+    return value
+
+def lex_stage(source, cache=None, panic_mode=True):
+    """Returns the token stream of source."""
+    return cached(cache, 'tokens', source, (panic_mode,), lambda: lex(source, panic_mode))
+
+def parse_stage(source, tokens, cache=None, panic_mode=True):
+    """Parses the token stream of source, returns (valid, ast, diagnostics)."""
+    def parse():
+        diagnostics = []
+        valid, ast = ll1_parse(tokens, diagnostics, build_ast=True)
+        return valid, ast, diagnostics
+    return cached(cache, 'ast', source, (panic_mode,), parse)
+
+def generate_stage(source, ast, cache=None, panic_mode=True, input_shape=None, fuse=False, inplace=False, sequential=False):
+    """Returns the code generated from the AST of source or None."""
+    options = (panic_mode, input_shape and tuple(input_shape), fuse, inplace, sequential)
+    return cached(cache, 'code', source, options, lambda: generate_code(ast, input_shape, fuse, inplace, sequential))
+
+def compile_source(source, cache=None, panic_mode=True, input_shape=None, fuse=False, inplace=False, sequential=False):
+    """
+    Runs the lexer, the parser and the code generator on a program.
+
+    If a cache is given, the result of every stage is looked up in the cache
+    first and stored in it otherwise, so the stages only run for programs that
+    were not compiled before by the same version of the compiler.
+
+    Args:
+        source: The program.
+        cache: Optional CompileCache.
+        panic_mode: Panic mode of the lexer.
+        input_shape, fuse, inplace, sequential: Options of generate_code.
+
+    Returns:
+        A CompileResult.
+    """
+    tokens = lex_stage(source, cache, panic_mode)
+    valid, ast, diagnostics = parse_stage(source, tokens, cache, panic_mode)
+    code = None
+    if valid:
+        code = generate_stage(source, ast, cache, panic_mode, input_shape, fuse, inplace, sequential)
+    return CompileResult(tokens, valid, ast, code, diagnostics)
@@ -0,0 +1,376 @@
+import asyncio
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from urllib.parse import urlsplit
+from .cache import CompileCache, DEFAULT_DIRECTORY, compiler_version
+from .pipeline import compile_source, lex_stage, parse_stage, generate_stage
+from SyntacticPhase import to_list
+
+DEFAULT_PORT = 8765
+# The service is only reachable from the local machine
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+MAX_BODY_BYTES = 16 << 20
+# Options of a compile request and their defaults, see compile_source
+OPTIONS = {"panic_mode": True, "input_shape": None, "fuse": False, "inplace": False, "sequential": False}
+# Method of every endpoint
+ENDPOINTS = {"/compile": "POST", "/health": "GET", "/stats": "GET"}
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+WARM_UP_PROGRAM = "{ code: { dim_in = 2 * 2; }, linear0: { dim_out = 1; }, relu0: { } }"
+
+# Cache of the current worker process
+_cache = None
+
+def init_worker(cache_dir):
+    """Opens the compile cache of a worker process and loads the lexer and parser tables by compiling a small program."""
+    global _cache
+    _cache = CompileCache(cache_dir) if cache_dir is not None else None
+    with redirect_stdout(io.StringIO()):
+        compile_source(WARM_UP_PROGRAM)
+
+def lex_job(source, options, _):
+    tokens = lex_stage(source, _cache, options["panic_mode"])
+    return tokens, {"tokens": tokens}
+
+def parse_job(source, options, tokens):
+    valid, ast, diagnostics = parse_stage(source, tokens, _cache, options["panic_mode"])
+    return (valid, ast, diagnostics), {"valid": valid, "ast": to_list(ast) if ast is not None else None}
+
+def generate_job(source, options, ast):
+    code = generate_stage(source, ast, _cache, **options)
+    return code, {"code": code}
+
+# The stages of a compile request in the order they run, every stage takes the result of the previous one
+STAGES = {"tokens": lex_job, "ast": parse_job, "code": generate_job}
+
+def json_line(payload):
+    return (json.dumps(payload) + "\n").encode()
+
+def run_batch(stage, jobs):
+    """
+    Runs a stage of the compiler for a batch of requests in a worker process.
+
+    Args:
+        stage: Name of the stage in STAGES.
+        jobs: List of (source, options, result of the previous stage) tuples.
+
+    Returns:
+        For every job a tuple of the result of the stage, its JSON line, the
+        text the stage printed and an error message or None.
+    """
+    function = STAGES[stage]
+    results = []
+    for source, options, value in jobs:
+        messages = io.StringIO()
+        error = None
+        try:
+            with redirect_stdout(messages):
+                value, payload = function(source, options, value)
+        except Exception as exception:
+            value = None
+            error = f"{type(exception).__name__}: {exception}"
+            payload = {"error": error}
+        results.append((value, json_line({"phase": stage, **payload}), messages.getvalue(), error))
+    return results
+
+def percentile(values, fraction):
+    """The value below which fraction of the sorted values lie, None if there are none."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+async def read_request(reader):
+    """
+    Reads an HTTP/1.1 request with an optional Content-Length body.
+
+    Returns:
+        (method, path, headers, body) with lower case header names or None if
+        the client closed the connection.
+    """
+    try:
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise HTTPError(400, "malformed request line")
+        method, target, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+    except ValueError:
+        # a line longer than the limit of the reader
+        raise HTTPError(400, "request line or header too long") from None
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "invalid Content-Length") from None
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"request body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length > 0 else b""
+    return method, urlsplit(target).path, headers, body
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}"] + [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+def chunk(data):
+    """Encodes data as a chunk of a response with Transfer-Encoding: chunked."""
+    return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+def cors_headers(headers):
+    """Allows pages served from localhost, e.g. the webapp, to call the service."""
+    origin = headers.get("origin")
+    if origin is None or urlsplit(origin).hostname not in LOOPBACK_HOSTS:
+        return {}
+    return {
+        "Access-Control-Allow-Origin": origin,
+        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type",
+        "Vary": "Origin",
+    }
+
+def parse_compile_request(body):
+    """Returns the source and the options of a compile request, raises HTTPError for invalid requests."""
+    try:
+        request = json.loads(body)
+    except ValueError as error:
+        raise HTTPError(400, f"invalid JSON: {error}") from None
+    if not isinstance(request, dict) or not isinstance(request.get("source"), str):
+        raise HTTPError(400, "expected a JSON object with the program as \"source\"")
+    options = request.get("options", {})
+    if not isinstance(options, dict) or not set(options) <= set(OPTIONS):
+        raise HTTPError(400, f"\"options\" has to be an object with the keys {', '.join(OPTIONS)}")
+    options = {**OPTIONS, **options}
+    shape = options["input_shape"]
+    if shape is not None:
+        if not isinstance(shape, list) or not all(isinstance(size, int) and size > 0 for size in shape):
+            raise HTTPError(400, "\"input_shape\" has to be a list of positive integers")
+        options["input_shape"] = tuple(shape)
+    return request["source"], options
+
+class Batcher:
+    """
+    Runs one stage of concurrent requests in batches on the worker pool.
+
+    A batch starts as soon as max_size jobs are waiting or max_delay seconds
+    after its first job arrived, so requests that arrive at about the same
+    time share the cost of sending work to a worker process.
+    """
+    def __init__(self, stage, executor, max_size=32, max_delay=0.001):
+        self.stage = stage
+        self.executor = executor
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        self.jobs = 0
+
+    def submit(self, job):
+        """Returns a future of the result of the job, see run_batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((job, future))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.jobs += len(batch)
+        done = asyncio.get_running_loop().run_in_executor(self.executor, run_batch, self.stage, [job for job, _ in batch])
+        done.add_done_callback(lambda done: self.resolve(batch, done))
+
+    def resolve(self, batch, done):
+        error = done.exception() if not done.cancelled() else asyncio.CancelledError()
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                # the request was cancelled, e.g. because its client disconnected
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[index])
+
+class CompileService:
+    """
+    HTTP/JSON compile service for the webapp and other local clients.
+
+    The worker processes stay alive between requests, so the lexer and parser
+    tables are only loaded once and the compile cache of every worker stays
+    warm. The stages of concurrent requests are batched (see Batcher).
+
+    Endpoints:
+        POST /compile: Compiles {"source": ..., "options": {...}} (see OPTIONS)
+            and streams one JSON line per phase as soon as it is done: the
+            tokens, the AST, the code and the diagnostics (the errors of the
+            parser, everything the compiler printed and the time it took).
+        GET /health: Status and version of the compiler.
+        GET /stats: Number of requests, batches and the latency percentiles of the last 1000 requests.
+
+    Args:
+        host: Address to bind to, only loopback addresses are allowed.
+        port: Port to bind to, 0 for any free port.
+        jobs: Number of worker processes, os.cpu_count() if None.
+        cache_dir: Directory of the compile cache or None.
+        batch_size, batch_delay: Largest batch and longest wait for a batch to fill up in seconds.
+    """
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, jobs=None, cache_dir=DEFAULT_DIRECTORY, batch_size=32, batch_delay=0.001):
+        if host not in LOOPBACK_HOSTS:
+            raise ValueError(f"the compile service only listens on localhost, not on {host}")
+        self.host = host
+        self.port = port
+        self.workers = jobs or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.executor = None
+        self.batchers = {}
+        self.server = None
+        self.requests = 0
+        self.failed = 0
+        self.active = 0
+        self.latencies = deque(maxlen=1000)
+
+    async def start(self):
+        """Starts the worker processes and listens for requests."""
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self.cache_dir,))
+        # Workers are started on demand, keep all of them busy once so the first requests do not wait for them
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, time.sleep, 0.01) for _ in range(self.workers)))
+        self.batchers = {stage: Batcher(stage, self.executor, self.batch_size, self.batch_delay) for stage in STAGES}
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        """Serves the requests of a connection, which is kept alive unless the client asks to close it."""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    await self.route(writer, method, path, headers, body)
+                except HTTPError as error:
+                    await self.respond(writer, error.status, {"error": error.message}, {"Connection": "close"})
+                    break
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, method, path, headers, body):
+        cors = cors_headers(headers)
+        try:
+            if method == "OPTIONS":
+                await self.respond(writer, 204, None, cors)
+            elif path not in ENDPOINTS:
+                raise HTTPError(404, f"no such endpoint: {path}")
+            elif method != ENDPOINTS[path]:
+                raise HTTPError(405, f"{method} is not allowed for {path}")
+            elif path == "/compile":
+                await self.compile(writer, body, cors)
+            elif path == "/health":
+                await self.respond(writer, 200, {"status": "ok", "version": compiler_version(), "workers": self.workers}, cors)
+            else:
+                await self.respond(writer, 200, self.stats(), cors)
+        except HTTPError as error:
+            # the request was read completely, the connection can be reused
+            await self.respond(writer, error.status, {"error": error.message}, cors)
+
+    async def respond(self, writer, status, payload, headers):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        head = {"Content-Length": len(body), **headers}
+        if payload is not None:
+            head["Content-Type"] = "application/json"
+        writer.write(response_head(status, head) + body)
+        await writer.drain()
+
+    async def compile(self, writer, body, cors):
+        """Runs the stages of a compile request on the worker pool and streams their results."""
+        start = time.perf_counter()
+        source, options = parse_compile_request(body)
+        self.requests += 1
+        self.active += 1
+        try:
+            writer.write(response_head(200, {"Content-Type": "application/x-ndjson", "Transfer-Encoding": "chunked", **cors}))
+            valid = False
+            diagnostics = []
+            messages = []
+            error = None
+            value = None
+            for stage in STAGES:
+                if stage == "code" and not valid:
+                    line = json_line({"phase": stage, "code": None})
+                else:
+                    try:
+                        value, line, printed, error = await self.batchers[stage].submit((source, options, value))
+                    except Exception as exception:
+                        # the worker pool failed, e.g. a worker was killed
+                        error = f"{type(exception).__name__}: {exception}"
+                        line = json_line({"phase": stage, "error": error})
+                        printed = ""
+                    messages.extend(printed.splitlines())
+                writer.write(chunk(line))
+                await writer.drain()
+                if error is not None:
+                    break
+                if stage == "ast":
+                    valid, value, diagnostics = value
+
+            seconds = time.perf_counter() - start
+            result = {"phase": "diagnostics", "valid": valid, "diagnostics": diagnostics, "messages": messages, "seconds": seconds}
+            if error is not None:
+                result["error"] = error
+                self.failed += 1
+            writer.write(chunk(json_line(result)) + b"0\r\n\r\n")
+            await writer.drain()
+            self.latencies.append(seconds)
+        finally:
+            self.active -= 1
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "failed": self.failed,
+            "active": self.active,
+            "batches": {stage: {"batches": batcher.batches, "jobs": batcher.jobs} for stage, batcher in self.batchers.items()},
+            "latency_ms": {name: value * 1000 if value is not None else None for name, value in (
+                ("p50", percentile(latencies, 0.5)),
+                ("p90", percentile(latencies, 0.9)),
+                ("p99", percentile(latencies, 0.99)),
+                ("max", latencies[-1] if latencies else None),
+            )},
+        }
@@ -1,5 +1,7 @@
 const sectionsContainer = document.getElementById('sections-container');
 const addSectionButton = document.getElementById('add-section');
+const compileButton = document.getElementById('compile');
+const compileOutput = document.getElementById('compile-output');
 let sectionCount = 0;
 
 // Define the options for the dropdown in a data structure
@@ -11,6 +13,18 @@ const dropdownOptions = [
   "Dropout"
 ];
 
+// Address of the compile service started with `torchify serve`
+const compileUrl = 'http://localhost:8765/compile';
+
+// Module type of the compiler for every option of the dropdown
+const moduleTypes = {
+  "Linear": "linear",
+  "Softmax": "softmax",
+  "ReLU": "relu",
+  "Batch Norm": "batchnorm1d",
+  "Dropout": "dropout"
+};
+
 // Function to create a section with a remove button, editable title, and dropdown
 function createSectionElement(layerText) {
   const sectionContainer = document.createElement('div');
@@ -136,3 +150,81 @@ addSectionButton.addEventListener('click', () => {
   const newSection = createSectionElement(`Layer ${sectionCount}`);
   sectionsContainer.appendChild(newSection);
 });
+
+// Builds the program of the sections, e.g. { linear0: { dim_in = 784; dim_out = 10; }, relu0: { } }
+function buildProgram() {
+  const counts = {};
+  const modules = [];
+  let features = null; // dim_out of the last linear layer, the num_features of a batch norm after it
+  sectionsContainer.querySelectorAll('.section').forEach(section => {
+    const type = moduleTypes[section.querySelector('.dropdown').value];
+    const index = counts[type] || 0;
+    counts[type] = index + 1;
+    const assignments = [];
+    if (type === 'linear') {
+      const [dimIn, dimOut] = section.querySelectorAll('.inputs-container input');
+      if (dimIn.value) {
+        assignments.push(`dim_in = ${dimIn.value};`);
+      }
+      if (dimOut.value) {
+        assignments.push(`dim_out = ${dimOut.value};`);
+      }
+      features = dimOut.value || null;
+    } else if (type === 'batchnorm1d' && features) {
+      assignments.push(`num_features = ${features};`);
+    }
+    modules.push(`${type}${index}: { ${assignments.map(assignment => assignment + ' ').join('')}}`);
+  });
+  return `{ ${modules.join(', ')} }`;
+}
+
+// Shows a phase of the response of the compile service, one JSON line per phase
+function showPhase(result) {
+  if (result.phase === 'code' && result.code) {
+    compileOutput.textContent = result.code;
+  } else if (result.phase === 'diagnostics') {
+    const messages = result.diagnostics.concat(result.messages).filter(message => message !== 'Accept');
+    if (result.error) {
+      messages.push(result.error);
+    }
+    if (messages.length) {
+      compileOutput.textContent += `\n${messages.join('\n')}`;
+    }
+  }
+}
+
+// Sends the program to the compile service and shows the code as soon as it is generated
+async function compileProgram() {
+  compileOutput.textContent = '';
+  let response;
+  try {
+    response = await fetch(compileUrl, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ source: buildProgram() })
+    });
+  } catch (error) {
+    compileOutput.textContent = 'The compile service is not running, start it with: torchify serve';
+    return;
+  }
+  if (!response.ok) {
+    compileOutput.textContent = (await response.json()).error;
+    return;
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    // The last line is not complete yet
+    buffer = lines.pop();
+    lines.filter(line => line).forEach(line => showPhase(JSON.parse(line)));
+  }
+}
+
+compileButton.addEventListener('click', compileProgram);